@@ -1,12 +1,69 @@
+import array
+import hashlib
+import mmap
 import os
 import json
+import queue
+import random
+import re
 import requests
+import sqlite3
 import sys
+import threading
 import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock; cache runs unlocked
+    fcntl = None
 
 # Default timeout for HTTP requests in seconds
 DEFAULT_TIMEOUT = 10
 
+# Default number of in-flight requests against the qBittorrent WebUI
+DEFAULT_QBIT_CONCURRENCY = 16
+
+# Default number of torrents fetched per torrents/info page
+DEFAULT_PAGE_SIZE = 500
+
+# .torrent files at least this large are memory-mapped instead of read
+TORRENT_MMAP_THRESHOLD = 1024 * 1024
+
+# Upper bounds for one multipart torrents/add request (qBittorrent rejects bodies over 64 MiB)
+TORRENT_BATCH_MAX_BYTES = 32 * 1024 * 1024
+TORRENT_BATCH_MAX_FILES = 100
+
+# Directories with at least this many .torrent files are hashed in a process pool
+TORRENT_POOL_THRESHOLD = 256
+
+# Seconds a stored tracker status is trusted before torrents/trackers is queried again
+TRACKER_HEALTH_TTL = 900
+
+# Seconds a cached torrents/files list is reused (file lists only change on rename)
+TORRENT_FILES_MAX_AGE = 7 * 24 * 3600
+
+# Seconds a recorded provisioning run is trusted before a service is reconciled again anyway
+PROVISIONING_STATE_MAX_AGE = 24 * 3600
+
+# Default number of threads listing directories on disk
+DEFAULT_SCAN_WORKERS = 16
+
+# Extra attempts an ArrClient makes after a 5xx or 429 response, and the base backoff in seconds
+ARR_RETRIES = 2
+ARR_RETRY_BACKOFF = 0.5
+
+# Longest Retry-After an ArrClient honours before giving up on a 429
+ARR_MAX_RETRY_AFTER = 30
+
+# First readiness poll delay; later delays double up to wait_for_service's retry_delay
+READINESS_INITIAL_DELAY = 0.25
+
+# Seconds a cached qBittorrent SID is reused after its last use (WebUI default timeout is 3600)
+SESSION_CACHE_MAX_AGE = 3000
+
 def load_env():
     """Load environment variables from .env file in the repository root."""
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -73,25 +130,175 @@ def get_headers(api_key, header_name="X-Api-Key"):
     """Get standard headers for API requests."""
     return {header_name: api_key, "Content-Type": "application/json"}
 
+class ArrClient:
+    """Pooled, instrumented HTTP client for one *arr service.
+
+    One keep-alive requests.Session carries the API key header, so repeated
+    calls reuse the connection instead of opening a new one each time. Paths
+    are relative to ``/api/<api_version>/`` unless they start with ``/``.
+    5xx and 429 responses are retried with exponential backoff (429 honours
+    Retry-After); POSTs are only retried on 429 since they are not idempotent.
+    Call counts and latency per endpoint are kept in ``stats``.
+    """
+
+    def __init__(self, url, api_key, api_version="v3", header_name="X-Api-Key",
+                 timeout=DEFAULT_TIMEOUT, retries=ARR_RETRIES, pool_size=DEFAULT_QBIT_CONCURRENCY):
+        self.url = url.rstrip("/")
+        self.api_url = f"{self.url}/api/{api_version}"
+        self.header_name = header_name
+        self.timeout = timeout
+        self.retries = retries
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(get_headers(api_key, header_name))
+        self.stats = {}  # "METHOD path" -> [calls, total seconds, max seconds]
+        self.lock = threading.Lock()
+
+    def endpoint_url(self, path):
+        if path.startswith("/"):
+            return f"{self.url}{path}"
+        return f"{self.api_url}/{path}"
+
+    @staticmethod
+    def _endpoint(method, path):
+        # Collapse ids so /command/123 and /command/456 share one counter
+        return f"{method} " + re.sub(r"/\d+(?=/|$)", "/{id}", path.split("?", 1)[0])
+
+    def _record(self, endpoint, elapsed):
+        with self.lock:
+            entry = self.stats.setdefault(endpoint, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+
+    def request(self, method, path, retries=None, **kwargs):
+        """Send a request and return the final response; the caller checks the status."""
+        method = method.upper()
+        kwargs.setdefault("timeout", self.timeout)
+        retries = self.retries if retries is None else retries
+        endpoint = self._endpoint(method, path)
+        url = self.endpoint_url(path)
+
+        for attempt in range(retries + 1):
+            start = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            finally:
+                self._record(endpoint, time.monotonic() - start)
+            retryable = response.status_code == 429 or (response.status_code >= 500 and method != "POST")
+            if not retryable or attempt == retries:
+                return response
+            delay = ARR_RETRY_BACKOFF * 2 ** attempt
+            if response.status_code == 429:
+                try:
+                    delay = float(response.headers.get("Retry-After", delay))
+                except ValueError:
+                    pass
+                if delay > ARR_MAX_RETRY_AFTER:
+                    return response
+            time.sleep(delay)
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def get_json(self, path, **kwargs):
+        response = self.get(path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def format_stats(self, limit=None):
+        """One line per endpoint, slowest total first: 'GET rootfolder: 2 calls, avg X ms, max Y ms'."""
+        with self.lock:
+            entries = sorted(self.stats.items(), key=lambda item: item[1][1], reverse=True)
+        lines = [
+            f"{endpoint}: {calls} calls, avg {total / calls * 1000:.0f} ms, max {worst * 1000:.0f} ms"
+            for endpoint, (calls, total, worst) in entries
+        ]
+        return lines[:limit] if limit else lines
+
+_ARR_CLIENTS = {}
+_ARR_CLIENTS_LOCK = threading.Lock()
+
+def arr_client(url, api_key, api_version="v3", header_name="X-Api-Key"):
+    """Return the shared ArrClient for a service, creating it on first use."""
+    key = (url.rstrip("/"), api_key, api_version, header_name)
+    with _ARR_CLIENTS_LOCK:
+        client = _ARR_CLIENTS.get(key)
+        if client is None:
+            client = _ARR_CLIENTS[key] = ArrClient(url, api_key, api_version, header_name)
+        return client
+
+def readiness_delays(max_delay, initial_delay=READINESS_INITIAL_DELAY):
+    """Yield sleep times for readiness polling: fast first, then doubling with jitter."""
+    delay = min(initial_delay, max_delay)
+    while True:
+        # Jitter keeps services restarted together from polling in lockstep
+        yield random.uniform(delay / 2, delay)
+        delay = min(delay * 2, max_delay)
+
 def wait_for_service(
     url,
     api_key,
     service_name,
-    endpoint="/api/v3/system/status",
+    endpoint="system/status",
     header_name="X-Api-Key",
     max_retries=30,
     retry_delay=2,
+    ping_endpoints=(),
+    api_version="v3",
 ):
-    """Wait for a service to become available with detailed error reporting."""
+    """Wait for a service to become available with detailed error reporting.
+
+    Polls start sub-second and back off exponentially up to ``retry_delay``.
+    The fast start adds attempts without shortening the wait: polling goes on
+    until at least ``max_retries`` attempts were made and ``max_retries *
+    retry_delay`` seconds have passed. ``ping_endpoints`` are unauthenticated probes (e.g. ``/ping``) tried before
+    ``endpoint``; any HTTP response, even a 404 from a service without that
+    route, shows the process is up, and later attempts go straight to ``endpoint``.
+    Requests go through the pooled ``arr_client`` for ``api_version``, so
+    they show up in the same stats as the calls made after readiness.
+    """
     log(f"Waiting for {service_name} API...", "INFO")
-    headers = get_headers(api_key, header_name)
+    client = arr_client(url, api_key, api_version, header_name)
+    # Pings are unauthenticated; a None header value drops the session's API key
+    no_auth = {header_name: None}
     last_error = None
+    start = time.monotonic()
+    deadline = start + max_retries * retry_delay
+    delays = readiness_delays(retry_delay)
+    pinged = not ping_endpoints
+    attempt = 0
 
-    for attempt in range(1, max_retries + 1):
+    while True:
+        attempt += 1
         try:
-            response = requests.get(f"{url}{endpoint}", headers=headers, timeout=DEFAULT_TIMEOUT)
-            response.raise_for_status()
-            log(f"{service_name} API is ready", "SUCCESS")
+            if not pinged:
+                for ping in ping_endpoints:
+                    try:
+                        # Only the status call below decides readiness
+                        client.get(ping, headers=no_auth, retries=0)
+                        pinged = True
+                        break
+                    except requests.exceptions.RequestException as e:
+                        last_error = e
+                if not pinged:
+                    raise last_error
+            # This loop is the retry policy, so the client must not add its own
+            client.get(endpoint, retries=0).raise_for_status()
+            elapsed = time.monotonic() - start
+            log(f"{service_name} API is ready after {elapsed:.1f}s (attempt {attempt})", "SUCCESS")
             return True
         except requests.exceptions.Timeout as e:
             last_error = f"Timeout after {DEFAULT_TIMEOUT}s: {str(e)}"
@@ -105,15 +312,19 @@ def wait_for_service(
         except Exception as e:
             last_error = f"Unexpected error: {str(e)}"
 
+        if attempt >= max_retries and time.monotonic() >= deadline:
+            break
         if attempt % 5 == 0:
             log(
-                f"Still waiting for {service_name} (attempt {attempt}/{max_retries}): {last_error}",
+                f"Still waiting for {service_name} (attempt {attempt}, "
+                f"{time.monotonic() - start:.0f}s of {max_retries * retry_delay}s): {last_error}",
                 "WARNING",
             )
-        time.sleep(retry_delay)
+        time.sleep(next(delays))
 
     log(
-        f"{service_name} not reachable after {max_retries} attempts. Last error: {last_error}",
+        f"{service_name} not reachable after {attempt} attempts in {time.monotonic() - start:.0f}s. "
+        f"Last error: {last_error}",
         "ERROR",
     )
     sys.exit(1)
@@ -121,13 +332,10 @@ def wait_for_service(
 def disable_analytics(url, api_key, service_name, api_version="v3", header_name="X-Api-Key"):
     """Disable analytics for *arr services."""
     log("Checking analytics settings...", "INFO")
-    headers = get_headers(api_key, header_name)
-    config_url = f"{url}/api/{api_version}/config/host"
+    client = arr_client(url, api_key, api_version, header_name)
 
     try:
-        resp = requests.get(config_url, headers=headers, timeout=DEFAULT_TIMEOUT)
-        resp.raise_for_status()
-        config = resp.json()
+        config = client.get_json("config/host")
 
         if config.get("analyticsEnabled") is False:
             log("Analytics already disabled", "SUCCESS")
@@ -136,8 +344,7 @@ def disable_analytics(url, api_key, service_name, api_version="v3", header_name=
         log("Disabling analytics...", "INFO")
         config["analyticsEnabled"] = False
 
-        resp = requests.put(config_url, headers=headers, json=config, timeout=DEFAULT_TIMEOUT)
-        resp.raise_for_status()
+        client.put("config/host", json=config).raise_for_status()
         log("Analytics disabled", "SUCCESS")
 
     except requests.exceptions.RequestException as e:
@@ -148,16 +355,13 @@ def configure_config_endpoint(
 ):
     """Generic function to configure a config endpoint (media management, naming, etc.)."""
     log(f"Configuring {config_name}...", "INFO")
-    headers = get_headers(api_key, header_name)
-    config_url = f"{url}/api/{api_version}/config/{endpoint}"
+    client = arr_client(url, api_key, api_version, header_name)
 
     if not target_config:
         return
 
     try:
-        resp = requests.get(config_url, headers=headers, timeout=DEFAULT_TIMEOUT)
-        resp.raise_for_status()
-        current_config = resp.json()
+        current_config = client.get_json(f"config/{endpoint}")
 
         needs_update = False
         for key, value in target_config.items():
@@ -166,8 +370,7 @@ def configure_config_endpoint(
                 needs_update = True
 
         if needs_update:
-            resp = requests.put(config_url, headers=headers, json=current_config, timeout=DEFAULT_TIMEOUT)
-            resp.raise_for_status()
+            client.put(f"config/{endpoint}", json=current_config).raise_for_status()
             log(f"{config_name} configuration updated", "SUCCESS")
         else:
             log(f"{config_name} configuration already up to date", "SUCCESS")
@@ -178,13 +381,10 @@ def configure_config_endpoint(
 def configure_root_folders(url, api_key, root_folders, api_version="v3", header_name="X-Api-Key"):
     """Configure root folders for *arr services."""
     log("Configuring Root Folders...", "INFO")
-    headers = get_headers(api_key, header_name)
-    rootfolder_url = f"{url}/api/{api_version}/rootfolder"
+    client = arr_client(url, api_key, api_version, header_name)
 
     try:
-        response = requests.get(rootfolder_url, headers=headers, timeout=DEFAULT_TIMEOUT)
-        response.raise_for_status()
-        existing_folders = response.json()
+        existing_folders = client.get_json("rootfolder")
         existing_paths = {f["path"]: f for f in existing_folders}
     except requests.exceptions.RequestException as e:
         log(f"Failed to get root folders: {e}", "ERROR")
@@ -204,25 +404,59 @@ def configure_root_folders(url, api_key, root_folders, api_version="v3", header_
         payload = {"path": path}
 
         try:
-            response = requests.post(rootfolder_url, headers=headers, json=payload, timeout=DEFAULT_TIMEOUT)
-            response.raise_for_status()
+            client.post("rootfolder", json=payload).raise_for_status()
             log(f"Root folder {path} created", "SUCCESS")
         except requests.exceptions.RequestException as e:
             error_msg = e.response.text if hasattr(e, "response") and e.response else str(e)
             log(f"Failed to create root folder {path}: {error_msg}", "ERROR")
 
+def download_client_payload(client_config):
+    """Build a downloadclient payload, resolving "env" fields from the environment."""
+    name = client_config.get("name", "Unknown")
+    fields = []
+    missing_env_vars = []
+
+    for field in client_config.get("fields", []):
+        value = field.get("value")
+        if "env" in field:
+            env_val = os.environ.get(field["env"])
+            if env_val:
+                value = env_val
+            else:
+                missing_env_vars.append(field["env"])
+                log(
+                    f"Environment variable {field['env']} not found for field {field['name']}",
+                    "WARNING",
+                )
+
+        fields.append({"name": field["name"], "value": value})
+
+    if missing_env_vars:
+        log(
+            f"Download client {name} has missing environment variables: {', '.join(missing_env_vars)}",
+            "WARNING",
+        )
+
+    return {
+        "enable": True,
+        "protocol": client_config["protocol"],
+        "priority": client_config.get("priority", 1),
+        "name": name,
+        "implementation": client_config["implementation"],
+        "implementationName": client_config["implementation"],
+        "configContract": f"{client_config['implementation']}Settings",
+        "fields": fields,
+    }
+
 def configure_download_clients(
     url, api_key, download_clients, api_version="v3", header_name="X-Api-Key"
 ):
     """Configure download clients for *arr services with improved error handling."""
     log("Configuring Download Clients...", "INFO")
-    headers = get_headers(api_key, header_name)
-    downloadclient_url = f"{url}/api/{api_version}/downloadclient"
+    client = arr_client(url, api_key, api_version, header_name)
 
     try:
-        response = requests.get(downloadclient_url, headers=headers, timeout=DEFAULT_TIMEOUT)
-        response.raise_for_status()
-        existing_clients = response.json()
+        existing_clients = client.get_json("downloadclient")
         existing_map = {c["name"]: c for c in existing_clients}
     except requests.exceptions.RequestException as e:
         log(f"Failed to get download clients: {e}", "ERROR")
@@ -237,78 +471,1024 @@ def configure_download_clients(
             log(f"Download client {name} missing required configuration fields", "ERROR")
             continue
 
-        fields = []
-        missing_env_vars = []
-
-        for field in client_config.get("fields", []):
-            value = field.get("value")
-            if "env" in field:
-                env_val = os.environ.get(field["env"])
-                if env_val:
-                    value = env_val
-                else:
-                    missing_env_vars.append(field["env"])
-                    log(
-                        f"Environment variable {field['env']} not found for field {field['name']}",
-                        "WARNING",
-                    )
-
-            fields.append({"name": field["name"], "value": value})
-
-        if missing_env_vars:
-            log(
-                f"Download client {name} has missing environment variables: {', '.join(missing_env_vars)}",
-                "WARNING",
-            )
-
-        payload = {
-            "enable": True,
-            "protocol": client_config["protocol"],
-            "priority": client_config.get("priority", 1),
-            "name": name,
-            "implementation": client_config["implementation"],
-            "implementationName": client_config["implementation"],
-            "configContract": f"{client_config['implementation']}Settings",
-            "fields": fields,
-        }
+        payload = download_client_payload(client_config)
 
         if name in existing_map:
             payload["id"] = existing_map[name]["id"]
             try:
-                response = requests.put(
-                    f"{downloadclient_url}/{payload['id']}",
-                    headers=headers,
-                    json=payload,
-                    timeout=DEFAULT_TIMEOUT,
-                )
-                response.raise_for_status()
+                client.put(f"downloadclient/{payload['id']}", json=payload).raise_for_status()
                 log(f"Download client {name} updated", "SUCCESS")
             except requests.exceptions.RequestException as e:
                 error_msg = e.response.text if hasattr(e, "response") and e.response else str(e)
                 log(f"Failed to update {name}: {error_msg}", "ERROR")
         else:
             try:
-                response = requests.post(
-                    downloadclient_url, headers=headers, json=payload, timeout=DEFAULT_TIMEOUT
-                )
-                response.raise_for_status()
+                client.post("downloadclient", json=payload).raise_for_status()
                 log(f"Download client {name} created", "SUCCESS")
             except requests.exceptions.RequestException as e:
                 error_msg = e.response.text if hasattr(e, "response") and e.response else str(e)
                 log(f"Failed to create {name}: {error_msg}", "ERROR")
 
+# *arr APIs mask secret fields with this placeholder on GET
+MASKED_FIELD_VALUE = "********"
+
+# Default number of concurrent requests against one *arr service while reconciling
+DEFAULT_RECONCILE_WORKERS = 4
+
+class ArrReconciler:
+    """Converge one *arr service on the settings from setup.config.json.
+
+    ``fetch`` reads every resource the desired settings mention exactly once
+    (concurrently), ``plan`` diffs them into a list of writes and ``apply``
+    sends those writes in parallel. Each change is a dict with ``method``,
+    ``path`` (relative to /api/<version>/), ``payload`` and ``summary``.
+    A converged service plans no changes, so a re-run costs only the GETs.
+
+    Desired settings use the same keys as the bootstrap config:
+    ``disable_analytics``, ``config`` (endpoint -> values), ``root_folders``
+    and ``download_clients``. Root folders and download clients missing from
+    the config are left alone.
+
+    Secret fields come back masked, so they are compared against
+    ``applied_secrets``: the secret_hashes() of the last run that converged.
+    A download client whose secret hash changed, is unknown or is forced
+    with ``force`` gets its values sent again.
+    """
+
+    def __init__(self, url, api_key, service_name, api_version="v3", header_name="X-Api-Key",
+                 workers=DEFAULT_RECONCILE_WORKERS, applied_secrets=None, force=False):
+        self.client = arr_client(url, api_key, api_version, header_name)
+        self.service_name = service_name
+        self.workers = workers
+        self.applied_secrets = applied_secrets or {}
+        self.force = force
+        self.changes = []
+
+    @staticmethod
+    def desired_config(desired):
+        """Config endpoint targets, with disable_analytics folded into config/host."""
+        config = {endpoint: dict(target) for endpoint, target in desired.get("config", {}).items() if target}
+        if desired.get("disable_analytics"):
+            config.setdefault("host", {})["analyticsEnabled"] = False
+        return config
+
+    def resources(self, desired):
+        paths = [f"config/{endpoint}" for endpoint in self.desired_config(desired)]
+        if desired.get("root_folders"):
+            paths.append("rootfolder")
+        if desired.get("download_clients"):
+            paths.append("downloadclient")
+        return paths
+
+    def fetch(self, desired):
+        """GET each resource the desired settings touch; ``{path: json}``, None on failure."""
+        paths = self.resources(desired)
+        current = {}
+        if not paths:
+            return current
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(paths))) as executor:
+            futures = {executor.submit(self.client.get_json, path): path for path in paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    current[path] = future.result()
+                except requests.exceptions.RequestException as e:
+                    log(f"Failed to get {self.service_name} {path}: {e}", "ERROR")
+                    current[path] = None
+        return current
+
+    @staticmethod
+    def _secret_hash(client_name, field_name, value):
+        return hashlib.sha256(json.dumps([client_name, field_name, value]).encode()).hexdigest()
+
+    def secret_hashes(self, desired):
+        """``{"<client>/<field>": hash}`` of the desired download client field values."""
+        hashes = {}
+        for client_config in desired.get("download_clients", []):
+            if not all(key in client_config for key in ["protocol", "implementation"]):
+                continue
+            payload = download_client_payload(client_config)
+            for field in payload["fields"]:
+                hashes[f"{payload['name']}/{field['name']}"] = self._secret_hash(
+                    payload["name"], field["name"], field["value"]
+                )
+        return hashes
+
+    def _client_differs(self, existing, payload):
+        for key in ("enable", "protocol", "priority", "implementation"):
+            if existing.get(key) != payload[key]:
+                return True
+        existing_fields = {f.get("name"): f.get("value") for f in existing.get("fields", [])}
+        for field in payload["fields"]:
+            current = existing_fields.get(field["name"])
+            if current == MASKED_FIELD_VALUE:
+                # Secrets come back masked; compare with what the last converged run sent
+                applied = self.applied_secrets.get(f"{payload['name']}/{field['name']}")
+                if self.force or applied != self._secret_hash(payload["name"], field["name"], field["value"]):
+                    return True
+                continue
+            if current != field["value"]:
+                return True
+        return False
+
+    def plan(self, desired, current):
+        """Diff desired settings against fetched state and return the writes needed."""
+        changes = []
+
+        for endpoint, target in self.desired_config(desired).items():
+            state = current.get(f"config/{endpoint}")
+            if state is None:
+                continue
+            updated = dict(state)
+            differing = [key for key, value in target.items() if key in state and state[key] != value]
+            if differing:
+                updated.update({key: target[key] for key in differing})
+                changes.append({
+                    "method": "PUT",
+                    "path": f"config/{endpoint}",
+                    "payload": updated,
+                    "summary": f"update config/{endpoint}: {', '.join(sorted(differing))}",
+                })
+
+        folders = current.get("rootfolder")
+        if desired.get("root_folders") and folders is not None:
+            existing_paths = {f.get("path") for f in folders}
+            for folder in desired["root_folders"]:
+                path = folder.get("path", "")
+                if not path:
+                    log("Root folder configuration missing path", "ERROR")
+                elif path not in existing_paths:
+                    changes.append({
+                        "method": "POST",
+                        "path": "rootfolder",
+                        "payload": {"path": path},
+                        "summary": f"add root folder {path}",
+                    })
+                    existing_paths.add(path)
+
+        clients = current.get("downloadclient")
+        if desired.get("download_clients") and clients is not None:
+            existing_map = {c.get("name"): c for c in clients}
+            for client_config in desired["download_clients"]:
+                name = client_config.get("name", "Unknown")
+                if not all(key in client_config for key in ["protocol", "implementation"]):
+                    log(f"Download client {name} missing required configuration fields", "ERROR")
+                    continue
+                payload = download_client_payload(client_config)
+                existing = existing_map.get(name)
+                if existing is None:
+                    changes.append({
+                        "method": "POST",
+                        "path": "downloadclient",
+                        "payload": payload,
+                        "summary": f"add download client {name}",
+                    })
+                elif self._client_differs(existing, payload):
+                    # Start from the stored client so settings the config does not mention survive
+                    updated = dict(existing)
+                    values = {f["name"]: f["value"] for f in payload["fields"]}
+                    updated.update({k: v for k, v in payload.items() if k != "fields"})
+                    updated["id"] = existing["id"]
+                    updated["fields"] = [
+                        dict(f, value=values[f["name"]]) if f.get("name") in values else f
+                        for f in existing.get("fields", [])
+                    ]
+                    known = {f.get("name") for f in existing.get("fields", [])}
+                    updated["fields"] += [f for f in payload["fields"] if f["name"] not in known]
+                    changes.append({
+                        "method": "PUT",
+                        "path": f"downloadclient/{existing['id']}",
+                        "payload": updated,
+                        "summary": f"update download client {name}",
+                    })
+
+        return changes
+
+    def print_plan(self, changes):
+        if not changes:
+            log(f"{self.service_name} is up to date", "SUCCESS")
+            return
+        log(f"{self.service_name}: {len(changes)} change(s) planned", "INFO")
+        for change in changes:
+            print(f"  {change['method']:<5} {change['path']:<28} {change['summary']}")
+
+    def _send(self, change):
+        self.client.request(change["method"], change["path"], json=change["payload"]).raise_for_status()
+
+    def apply(self, changes):
+        """Send the planned writes concurrently; returns the number that failed."""
+        failed = 0
+        if not changes:
+            return failed
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(changes))) as executor:
+            futures = {executor.submit(self._send, change): change for change in changes}
+            for future in as_completed(futures):
+                change = futures[future]
+                try:
+                    future.result()
+                    log(f"{self.service_name}: {change['summary']}", "SUCCESS")
+                except requests.exceptions.RequestException as e:
+                    error_msg = e.response.text if getattr(e, "response", None) is not None else str(e)
+                    log(f"{self.service_name}: failed to {change['summary']}: {error_msg}", "ERROR")
+                    failed += 1
+        return failed
+
+    def reconcile(self, desired, dry_run=False, current=None):
+        """Fetch, plan, print and (unless dry_run) apply; returns the number of failures.
+
+        Pass ``current`` to reuse a fetch() result. The planned writes are kept
+        in ``changes``.
+        """
+        if current is None:
+            current = self.fetch(desired)
+        failed = sum(1 for state in current.values() if state is None)
+        changes = self.changes = self.plan(desired, current)
+        self.print_plan(changes)
+        if not dry_run:
+            failed += self.apply(changes)
+        return failed
+
+def torrent_query_params(filter_by=None, category=None, tag=None, hashes=None):
+    """Build torrents/info query parameters; ``category=""`` selects uncategorized torrents."""
+    params = {}
+    if filter_by:
+        params["filter"] = filter_by
+    if category is not None:
+        params["category"] = category
+    if tag is not None:
+        params["tag"] = tag
+    if hashes:
+        params["hashes"] = "|".join(hashes) if isinstance(hashes, (list, tuple, set)) else hashes
+    return params
+
+class SessionCache:
+    """On-disk qBittorrent session cookies shared between CLI invocations.
+
+    Entries are keyed by ``base_url|username`` and expire ``max_age`` seconds
+    after their last use, which keeps them inside qBittorrent's default one-hour
+    WebUI session timeout. All reads and writes happen under an exclusive
+    ``flock`` on a sibling ``.lock`` file.
+    """
+
+    def __init__(self, path, max_age=SESSION_CACHE_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+
+    @contextmanager
+    def locked(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, entries):
+        tmp_path = f"{self.path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+
+    def load(self, key):
+        """Return cached cookies for ``key`` or None if missing or expired."""
+        entry = self._read().get(key)
+        if not entry or time.time() - entry.get("used_at", 0) > self.max_age:
+            return None
+        return entry.get("cookies") or None
+
+    def store(self, key, cookies):
+        entries = self._read()
+        entries[key] = {"cookies": cookies, "used_at": time.time()}
+        self._write(entries)
+
+    def invalidate(self, key):
+        entries = self._read()
+        if entries.pop(key, None) is not None:
+            self._write(entries)
+
+class SQLiteStore:
+    """Base for the small SQLite caches kept under ~/.cache/torrent-services.
+
+    The database is opened and its ``SCHEMA`` applied on first use; if that
+    fails the store reports it once and behaves as empty for the rest of the run.
+    """
+
+    SCHEMA = ""
+    LABEL = "SQLite store"
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._disabled = False
+
+    def _connect(self):
+        if self._conn is None and not self._disabled:
+            try:
+                if self.path != ":memory:":
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._conn = sqlite3.connect(self.path)
+                self._conn.executescript(self.SCHEMA)
+            except (OSError, sqlite3.Error) as e:
+                print(f"{self.LABEL} unavailable ({self.path}): {e}")
+                self._conn = None
+                self._disabled = True
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+class TrackerHealthStore(SQLiteStore):
+    """SQLite history of tracker status per torrent, shared between runs.
+
+    Rows are keyed by ``(hash, url)`` and keep the last status, message and
+    peer counts, plus ``failing_since``: when the tracker last stopped
+    reporting working (status 2). A torrent whose rows are newer than ``ttl``
+    is served from the store; only stale torrents hit the API.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS torrents (
+            hash TEXT PRIMARY KEY,
+            checked_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS trackers (
+            hash TEXT NOT NULL,
+            url TEXT NOT NULL,
+            status INTEGER,
+            msg TEXT,
+            num_peers INTEGER,
+            num_seeds INTEGER,
+            num_leeches INTEGER,
+            checked_at REAL NOT NULL,
+            failing_since REAL,
+            PRIMARY KEY (hash, url)
+        );
+    """
+
+    LABEL = "Tracker health store"
+
+    def __init__(self, path, ttl=TRACKER_HEALTH_TTL):
+        super().__init__(path)
+        self.ttl = ttl
+
+    def fresh(self, hashes, now=None):
+        """Return ``{hash: trackers}`` for hashes checked within ``ttl``."""
+        conn = self._connect()
+        if conn is None or self.ttl <= 0:
+            return {}
+        cutoff = (now or time.time()) - self.ttl
+        result = {}
+        hashes = list(hashes)
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            for (hash_val,) in conn.execute(
+                f"SELECT hash FROM torrents WHERE checked_at >= ? AND hash IN ({marks})",
+                [cutoff, *chunk],
+            ):
+                result[hash_val] = []
+            for row in conn.execute(
+                f"SELECT hash, url, status, msg, num_peers, num_seeds, num_leeches "
+                f"FROM trackers WHERE hash IN ({marks}) ORDER BY rowid",
+                chunk,
+            ):
+                if row[0] in result:
+                    result[row[0]].append({
+                        "url": row[1], "status": row[2], "msg": row[3],
+                        "num_peers": row[4], "num_seeds": row[5], "num_leeches": row[6],
+                    })
+        return result
+
+    def record(self, trackers_by_hash, now=None):
+        """Store a fresh torrents/trackers result for each hash."""
+        conn = self._connect()
+        if conn is None:
+            return
+        now = now or time.time()
+        try:
+            with conn:
+                for hash_val, trackers in trackers_by_hash.items():
+                    previous = dict(conn.execute(
+                        "SELECT url, failing_since FROM trackers WHERE hash = ?", (hash_val,)
+                    ))
+                    conn.execute("DELETE FROM trackers WHERE hash = ?", (hash_val,))
+                    for tr in trackers:
+                        url = tr.get("url", "")
+                        failing_since = None
+                        if tr.get("status") != 2:
+                            failing_since = previous.get(url) or now
+                        conn.execute(
+                            "INSERT OR REPLACE INTO trackers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (hash_val, url, tr.get("status"), tr.get("msg"), tr.get("num_peers"),
+                             tr.get("num_seeds"), tr.get("num_leeches"), now, failing_since),
+                        )
+                    conn.execute(
+                        "INSERT OR REPLACE INTO torrents VALUES (?, ?)", (hash_val, now)
+                    )
+        except sqlite3.Error as e:
+            print(f"Error recording tracker health: {e}")
+
+    def dead_for(self, hash_val, now=None):
+        """Seconds since no tracker of ``hash_val`` has worked, or None.
+
+        None means a tracker is working or the hash was never recorded.
+        """
+        conn = self._connect()
+        if conn is None:
+            return None
+        rows = conn.execute(
+            "SELECT failing_since FROM trackers WHERE hash = ?", (hash_val,)
+        ).fetchall()
+        if not rows or any(since is None for (since,) in rows):
+            return None
+        # Dead since the most recent tracker stopped working
+        return (now or time.time()) - max(since for (since,) in rows)
+
+class TorrentFilesCache(SQLiteStore):
+    """SQLite cache of torrents/files results keyed by hash.
+
+    A torrent's file list only changes when files are renamed, so entries are
+    reused for ``max_age`` seconds. Lists are stored as compact JSON.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            hash TEXT PRIMARY KEY,
+            files TEXT NOT NULL,
+            cached_at REAL NOT NULL
+        );
+    """
+    LABEL = "Torrent file cache"
+
+    def __init__(self, path, max_age=TORRENT_FILES_MAX_AGE):
+        super().__init__(path)
+        self.max_age = max_age
+
+    def get_many(self, hashes, now=None):
+        """Return ``{hash: files}`` for hashes cached within ``max_age``."""
+        conn = self._connect()
+        if conn is None or self.max_age <= 0:
+            return {}
+        cutoff = (now or time.time()) - self.max_age
+        result = {}
+        hashes = list(hashes)
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            for hash_val, files in conn.execute(
+                f"SELECT hash, files FROM files WHERE cached_at >= ? AND hash IN ({marks})",
+                [cutoff, *chunk],
+            ):
+                result[hash_val] = json.loads(files)
+        return result
+
+    def store(self, files_by_hash, now=None):
+        conn = self._connect()
+        if conn is None:
+            return
+        now = now or time.time()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                    [(h, json.dumps(files, separators=(",", ":")), now) for h, files in files_by_hash.items()],
+                )
+        except sqlite3.Error as e:
+            print(f"Error caching torrent files: {e}")
+
+class DirectoryCache(SQLiteStore):
+    """SQLite cache of directory listings keyed by path and ``st_mtime_ns``.
+
+    Adding, removing or renaming an entry changes its directory's mtime, so
+    a directory whose mtime is unchanged can reuse its stored listing without
+    a scandir. Sizes of files rewritten in place may be stale until their
+    directory changes.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS dirs (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            entries TEXT NOT NULL
+        );
+    """
+    LABEL = "Directory cache"
+
+    def get_many(self, paths):
+        """Return ``{path: (mtime_ns, entries)}`` for cached paths."""
+        conn = self._connect()
+        if conn is None:
+            return {}
+        result = {}
+        paths = list(paths)
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            for path, mtime_ns, entries in conn.execute(
+                f"SELECT path, mtime_ns, entries FROM dirs WHERE path IN ({marks})", chunk
+            ):
+                result[path] = (mtime_ns, json.loads(entries))
+        return result
+
+    def store(self, listings):
+        """Save ``{path: (mtime_ns, entries)}``."""
+        conn = self._connect()
+        if conn is None or not listings:
+            return
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)",
+                    [(path, mtime_ns, json.dumps(entries, separators=(",", ":")))
+                     for path, (mtime_ns, entries) in listings.items()],
+                )
+        except sqlite3.Error as e:
+            print(f"Error caching directory listings: {e}")
+
+class ProvisioningStateStore(SQLiteStore):
+    """SQLite record of the last successful provisioning run per service.
+
+    Each row holds a hash of the effective config that was applied and a
+    fingerprint of the resources the service was reconciled against. ``load`` reads
+    all rows at once so worker threads compare against a plain dict and the
+    connection stays on the thread that opened it.
+
+    The ``secrets`` table keeps ArrReconciler.secret_hashes() of the values
+    last sent to each service. It does not expire with ``max_age``: masked
+    secrets can only ever be compared against it.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS services (
+            name TEXT PRIMARY KEY,
+            config_hash TEXT NOT NULL,
+            remote_hash TEXT NOT NULL,
+            applied_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS secrets (
+            service TEXT NOT NULL,
+            key TEXT NOT NULL,
+            secret_hash TEXT NOT NULL,
+            PRIMARY KEY (service, key)
+        );
+    """
+    LABEL = "Provisioning state cache"
+
+    def __init__(self, path, max_age=PROVISIONING_STATE_MAX_AGE):
+        super().__init__(path)
+        self.max_age = max_age
+
+    def load(self, now=None):
+        """Return ``{name: (config_hash, remote_hash)}`` for runs within ``max_age``."""
+        conn = self._connect()
+        if conn is None or self.max_age <= 0:
+            return {}
+        cutoff = (now or time.time()) - self.max_age
+        return {
+            name: (config_hash, remote_hash)
+            for name, config_hash, remote_hash in conn.execute(
+                "SELECT name, config_hash, remote_hash FROM services WHERE applied_at >= ?", (cutoff,)
+            )
+        }
+
+    def record(self, fingerprints, now=None):
+        """Store ``{name: (config_hash, remote_hash)}`` for services that converged."""
+        conn = self._connect()
+        if conn is None or not fingerprints:
+            return
+        now = now or time.time()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO services VALUES (?, ?, ?, ?)",
+                    [(name, c, r, now) for name, (c, r) in fingerprints.items()],
+                )
+        except sqlite3.Error as e:
+            print(f"Error saving provisioning state: {e}")
+
+    def load_secrets(self):
+        """Return ``{service: {key: secret_hash}}`` of the values last applied."""
+        conn = self._connect()
+        if conn is None:
+            return {}
+        result = defaultdict(dict)
+        for service, key, secret_hash in conn.execute("SELECT service, key, secret_hash FROM secrets"):
+            result[service][key] = secret_hash
+        return dict(result)
+
+    def record_secrets(self, secrets):
+        """Replace the stored hashes of each service in ``{service: {key: secret_hash}}``."""
+        conn = self._connect()
+        if conn is None or not secrets:
+            return
+        try:
+            with conn:
+                conn.executemany("DELETE FROM secrets WHERE service = ?", [(name,) for name in secrets])
+                conn.executemany(
+                    "INSERT INTO secrets VALUES (?, ?, ?)",
+                    [(name, key, h) for name, hashes in secrets.items() for key, h in hashes.items()],
+                )
+        except sqlite3.Error as e:
+            print(f"Error saving provisioning state: {e}")
+
+class BencodeError(ValueError):
+    pass
+
+def _bdecode_at(data, i):
+    """Decode the bencoded value starting at ``i``; returns (value, end)."""
+    token = data[i:i + 1]
+    if token == b"i":
+        end = data.find(b"e", i)
+        if end < 0:
+            raise BencodeError(f"unterminated integer at {i}")
+        return int(data[i + 1:end]), end + 1
+    if token == b"l":
+        items = []
+        i += 1
+        while data[i:i + 1] != b"e":
+            if i >= len(data):
+                raise BencodeError("unterminated list")
+            value, i = _bdecode_at(data, i)
+            items.append(value)
+        return items, i + 1
+    if token == b"d":
+        result = {}
+        i += 1
+        while data[i:i + 1] != b"e":
+            if i >= len(data):
+                raise BencodeError("unterminated dict")
+            key, i = _bdecode_at(data, i)
+            result[key], i = _bdecode_at(data, i)
+        return result, i + 1
+    if token.isdigit():
+        colon = data.find(b":", i)
+        if colon < 0:
+            raise BencodeError(f"bad string length at {i}")
+        start = colon + 1
+        end = start + int(data[i:colon])
+        if end > len(data):
+            raise BencodeError(f"string at {i} runs past end of data")
+        return bytes(data[start:end]), end
+    raise BencodeError(f"unexpected token {token!r} at {i}")
+
+def _bskip(data, i):
+    """Return the end offset of the bencoded value at ``i`` without building it."""
+    token = data[i:i + 1]
+    if token == b"i":
+        end = data.find(b"e", i)
+        if end < 0:
+            raise BencodeError(f"unterminated integer at {i}")
+        return end + 1
+    if token in (b"l", b"d"):
+        i += 1
+        while data[i:i + 1] != b"e":
+            if i >= len(data):
+                raise BencodeError("unterminated container")
+            i = _bskip(data, i)
+        return i + 1
+    if token.isdigit():
+        colon = data.find(b":", i)
+        if colon < 0:
+            raise BencodeError(f"bad string length at {i}")
+        end = colon + 1 + int(data[i:colon])
+        if end > len(data):
+            raise BencodeError(f"string at {i} runs past end of data")
+        return end
+    raise BencodeError(f"unexpected token {token!r} at {i}")
+
+def infohashes_from_bytes(data):
+    """Return ``(v1, v2)`` hex infohashes of a bencoded .torrent (None where absent).
+
+    Only the raw ``info`` dict span is hashed; piece data is skipped rather
+    than decoded. ``v1`` is SHA-1 for v1 and hybrid torrents; ``v2`` is SHA-256
+    when the info dict declares ``meta version`` 2.
+    """
+    if data[0:1] != b"d":
+        raise BencodeError("torrent is not a bencoded dict")
+    i = 1
+    info_span = None
+    while data[i:i + 1] != b"e":
+        if i >= len(data):
+            raise BencodeError("unterminated dict")
+        key, i = _bdecode_at(data, i)
+        end = _bskip(data, i)
+        if key == b"info":
+            info_span = (i, end)
+        i = end
+    if info_span is None:
+        raise BencodeError("torrent has no info dict")
+
+    start, end = info_span
+    if data[start:start + 1] != b"d":
+        raise BencodeError("info is not a dict")
+    meta_version = 1
+    has_pieces = False
+    j = start + 1
+    while j < end - 1:
+        key, j = _bdecode_at(data, j)
+        if key == b"meta version":
+            meta_version, j = _bdecode_at(data, j)
+        else:
+            has_pieces = has_pieces or key == b"pieces"
+            j = _bskip(data, j)
+
+    info = data[start:end]
+    # Hybrid torrents carry both v1 "pieces" and "meta version" 2
+    v1 = hashlib.sha1(info).hexdigest() if meta_version != 2 or has_pieces else None
+    v2 = hashlib.sha256(info).hexdigest() if meta_version == 2 else None
+    return v1, v2
+
+def torrent_infohashes(path):
+    """Read a .torrent file (mmap for large files) and return its ``(v1, v2)`` hashes."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= TORRENT_MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return infohashes_from_bytes(data)
+        return infohashes_from_bytes(f.read())
+
+def _safe_torrent_infohashes(path):
+    try:
+        return path, torrent_infohashes(path)
+    except (OSError, ValueError) as e:
+        return path, e
+
+def scan_torrent_hashes(paths, workers=None):
+    """Map each .torrent path to ``(v1, v2)`` hashes, or to the error that stopped parsing.
+
+    Large batches (``TORRENT_POOL_THRESHOLD`` files or more) are spread over a
+    process pool since hashing is CPU-bound.
+    """
+    paths = list(paths)
+    if len(paths) < TORRENT_POOL_THRESHOLD or workers == 1:
+        return dict(_safe_torrent_infohashes(p) for p in paths)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(_safe_torrent_infohashes, paths, chunksize=64))
+
+def loaded_infohashes(torrents):
+    """Collect every id qBittorrent knows a torrent by (hash, v1, v2 and truncated v2)."""
+    known = set()
+    for t in torrents:
+        for key in ("hash", "infohash_v1", "infohash_v2"):
+            value = t.get(key)
+            if value:
+                known.add(value.lower())
+                known.add(value.lower()[:40])
+    return known
+
+def _torrent_batches(file_paths, max_bytes, max_files, results):
+    """Yield lists of ``(path, content)`` within the batch limits.
+
+    Files that cannot be read are recorded as "unreadable" in ``results``.
+    """
+    batch = []
+    batch_bytes = 0
+    for path in file_paths:
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+        except OSError as e:
+            print(f"Error reading {path}: {e}")
+            results[path] = "unreadable"
+            continue
+        if batch and (batch_bytes + len(content) > max_bytes or len(batch) >= max_files):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append((path, content))
+        batch_bytes += len(content)
+    if batch:
+        yield batch
+
+def _fetch_each(fetch, hashes, workers):
+    """Call ``fetch(hash)`` for every hash; returns ``(results, latencies)``.
+
+    The first hash is fetched alone so the client logs in once before the
+    remaining calls fan out over a thread pool.
+    """
+    results = {}
+    latencies = {}
+
+    def timed(hash_val):
+        start = time.monotonic()
+        result = fetch(hash_val)
+        return hash_val, result, time.monotonic() - start
+
+    if not hashes:
+        return results, latencies
+
+    timings = [timed(hashes[0])]
+    if len(hashes) > 1:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            timings.extend(executor.map(timed, hashes[1:]))
+
+    for hash_val, result, elapsed in timings:
+        results[hash_val] = result
+        latencies[hash_val] = elapsed
+    return results, latencies
+
+def fetch_trackers(client, hashes, workers=DEFAULT_QBIT_CONCURRENCY, store=None):
+    """Fetch trackers for many hashes with a thread pool.
+
+    Returns ``(trackers_by_hash, latencies)`` where ``latencies`` maps each hash
+    to the seconds its torrents/trackers call took. With a
+    ``TrackerHealthStore``, hashes it holds fresh results for are not fetched,
+    and every fetched result is recorded.
+    """
+    hashes = list(dict.fromkeys(hashes))
+    trackers_by_hash = store.fresh(hashes) if store else {}
+    hashes = [h for h in hashes if h not in trackers_by_hash]
+
+    fetched, latencies = _fetch_each(client.get_trackers, hashes, workers)
+    if store:
+        # qBittorrent always lists the DHT/PeX/LSD entries, so an empty list is a failed call
+        store.record({h: trackers for h, trackers in fetched.items() if trackers})
+    trackers_by_hash.update(fetched)
+    return trackers_by_hash, latencies
+
+def fetch_torrent_files(client, hashes, workers=DEFAULT_QBIT_CONCURRENCY, cache=None):
+    """Fetch torrents/files for many hashes, reusing a ``TorrentFilesCache`` when given."""
+    hashes = list(dict.fromkeys(hashes))
+    files_by_hash = cache.get_many(hashes) if cache else {}
+    hashes = [h for h in hashes if h not in files_by_hash]
+
+    fetched, _ = _fetch_each(client.get_torrent_files, hashes, workers)
+    if cache:
+        # Every torrent has at least one file, so an empty list is a failed call
+        cache.store({h: files for h, files in fetched.items() if files})
+    files_by_hash.update(fetched)
+    return files_by_hash
+
+def map_path(path, path_map):
+    """Translate a qBittorrent (container) path using ``[(prefix, replacement)]``."""
+    for prefix, replacement in path_map:
+        prefix = prefix.rstrip("/")
+        if path == prefix or path.startswith(prefix + "/"):
+            return replacement.rstrip("/") + path[len(prefix):]
+    return path
+
+def parse_path_map(values):
+    """Turn ``FROM=TO`` arguments into ``[(FROM, TO)]``."""
+    pairs = []
+    for value in values or ():
+        source, sep, target = value.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid --path-map '{value}', expected FROM=TO")
+        pairs.append((source, target))
+    return pairs
+
+def _list_directory(path):
+    try:
+        with os.scandir(path) as entries:
+            return path, {
+                entry.name: (None if entry.is_dir(follow_symlinks=False) else entry.stat(follow_symlinks=False).st_size)
+                for entry in entries
+            }
+    except OSError:
+        return path, None
+
+def list_directories(directories, workers=DEFAULT_SCAN_WORKERS):
+    """List many directories in parallel, one scandir per directory.
+
+    Returns ``{directory: {name: size}}`` with ``None`` as the size of
+    subdirectories, or ``None`` for directories that cannot be read.
+    """
+    directories = list(dict.fromkeys(directories))
+    if len(directories) <= 1:
+        return dict(_list_directory(d) for d in directories)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return dict(executor.map(_list_directory, directories))
+
+def _list_if_changed(path, cached):
+    """Return ``(path, mtime_ns, entries, rescanned)``, reusing ``cached`` when the mtime matches."""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return path, None, None, False
+    if cached and cached[0] == mtime_ns:
+        return path, mtime_ns, cached[1], False
+    return (path, mtime_ns, _list_directory(path)[1], True)
+
+def scan_tree(roots, workers=DEFAULT_SCAN_WORKERS, cache=None):
+    """List every directory under ``roots``; returns ``(listing, rescanned)``.
+
+    ``listing`` maps each directory to ``{name: size}`` (``None`` for
+    subdirectories). Levels are processed breadth first with a thread pool.
+    With a ``DirectoryCache`` each directory is only stat'ed and its stored
+    listing reused when the mtime is unchanged; ``rescanned`` counts the
+    directories that needed a scandir.
+    """
+    listing = {}
+    rescanned = 0
+    frontier = [root for root in dict.fromkeys(roots) if os.path.isdir(root)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        while frontier:
+            cached = cache.get_many(frontier) if cache else {}
+            updates = {}
+            next_frontier = []
+            for path, mtime_ns, entries, changed in executor.map(
+                lambda d: _list_if_changed(d, cached.get(d)), frontier
+            ):
+                if entries is None:
+                    continue
+                listing[path] = entries
+                if changed:
+                    rescanned += 1
+                    updates[path] = (mtime_ns, entries)
+                next_frontier.extend(os.path.join(path, name) for name, size in entries.items() if size is None)
+            if cache:
+                cache.store(updates)
+            frontier = next_frontier
+    return listing, rescanned
+
+def walk_files(roots, workers=DEFAULT_SCAN_WORKERS):
+    """Yield ``(path, size)`` for every file under ``roots``.
+
+    The tree is walked breadth first, listing each level's directories in
+    parallel with list_directories().
+    """
+    frontier = [root for root in dict.fromkeys(roots) if os.path.isdir(root)]
+    while frontier:
+        listing = list_directories(frontier, workers)
+        next_frontier = []
+        for directory in frontier:
+            for name, size in (listing.get(directory) or {}).items():
+                path = os.path.join(directory, name)
+                if size is None:
+                    next_frontier.append(path)
+                else:
+                    yield path, size
+        frontier = next_frontier
+
+def format_latency_summary(latencies):
+    """Summarize per-call latencies as 'N calls, avg X ms, p95 Y ms, max Z ms'."""
+    if not latencies:
+        return "0 calls"
+    values = sorted(latencies.values())
+    avg = sum(values) / len(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    return (
+        f"{len(values)} calls, avg {avg * 1000:.0f} ms, "
+        f"p95 {p95 * 1000:.0f} ms, max {values[-1] * 1000:.0f} ms"
+    )
+
 class QBitClient:
-    def __init__(self, base_url, username, password):
+    def __init__(self, base_url, username, password, fields=None, session_cache=None,
+                 pool_size=DEFAULT_QBIT_CONCURRENCY):
         self.base_url = base_url
         self.username = username
         self.password = password
         self.session = requests.Session()
+        # Size the pool for concurrent per-torrent calls sharing this session; callers
+        # running more workers than this would stop reusing connections
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         self.logged_in = False
+        # When set, get_torrents() returns a compact TorrentTable with only these fields
+        self.fields = fields
+        # Optional SessionCache (or path) used to reuse the SID across CLI invocations
+        if isinstance(session_cache, str):
+            session_cache = SessionCache(session_cache)
+        self.session_cache = session_cache
+        self._cache_key = f"{base_url}|{username}"
+        # Serializes re-logins from concurrent callers; the generation counts them
+        self._login_lock = threading.Lock()
+        self._login_generation = 0
+
+    def close(self):
+        self.session.close()
 
     def login(self):
         if self.logged_in:
             return True
-            
+        if not self.session_cache:
+            return self._login()
+
+        # Hold the cache lock so parallel runs reuse one SID instead of racing to log in
+        with self.session_cache.locked():
+            cookies = self.session_cache.load(self._cache_key)
+            if cookies:
+                self.session.cookies.update(cookies)
+                self.session_cache.store(self._cache_key, cookies)
+                self.logged_in = True
+                return True
+            return self._login()
+
+    def _login(self):
         url = f"{self.base_url}/api/v2/auth/login"
         data = {"username": self.username, "password": self.password}
         try:
@@ -316,60 +1496,126 @@ class QBitClient:
             response.raise_for_status()
             if response.text == "Ok.":
                 self.logged_in = True
+                if self.session_cache:
+                    self.session_cache.store(self._cache_key, self.session.cookies.get_dict())
                 return True
         except Exception as e:
             print(f"Login error: {e}")
         return False
 
-    def get_torrents(self, hashes=None):
+    def _relogin(self, generation):
+        """Replace an expired SID, preferring one another thread or process already refreshed.
+
+        ``generation`` is the login generation the failed request was sent
+        with; if another thread has re-logged in since, its SID is reused.
+        """
+        with self._login_lock:
+            if generation != self._login_generation:
+                return self.logged_in
+            try:
+                return self._replace_sid()
+            finally:
+                # Bumped once the new SID is in place, so requests sent meanwhile reuse it too
+                self._login_generation += 1
+
+    def _replace_sid(self):
+        self.logged_in = False
+        stale = self.session.cookies.get_dict()
+        self.session.cookies.clear()
+        if not self.session_cache:
+            return self._login()
+        with self.session_cache.locked():
+            cookies = self.session_cache.load(self._cache_key)
+            if cookies and cookies != stale:
+                self.session.cookies.update(cookies)
+                self.logged_in = True
+                return True
+            self.session_cache.invalidate(self._cache_key)
+            return self._login()
+
+    def _request(self, method, url, **kwargs):
+        generation = self._login_generation
+        response = self.session.request(method, url, **kwargs)
+        if response.status_code == 403 and self._relogin(generation):
+            response = self.session.request(method, url, **kwargs)
+        return response
+
+    def get_torrents(self, filter_by=None, category=None, tag=None, hashes=None, predicate=None):
+        """Query torrents/info with server-side filtering.
+
+        ``filter_by`` (e.g. 'downloading', 'stalled'), ``category``, ``tag`` and
+        ``hashes`` are sent to qBittorrent, which combines them with AND.
+        ``predicate`` is applied locally for anything the API cannot express.
+        """
         if not self.login(): return []
+        params = torrent_query_params(filter_by, category, tag, hashes)
+        if self.fields:
+            # Build the compact table page by page so the full JSON list is never held
+            table = TorrentTable(self.fields)
+            for page in self._iter_pages(DEFAULT_PAGE_SIZE, "added_on", params):
+                table.extend(filter(predicate, page) if predicate else page)
+            return table
         url = f"{self.base_url}/api/v2/torrents/info"
-        params = {}
-        if hashes:
-            params["hashes"] = hashes
         try:
-            response = self.session.get(url, params=params)
+            response = self._request("GET", url, params=params)
             response.raise_for_status()
-            return response.json()
+            torrents = response.json()
         except Exception as e:
             print(f"Error getting torrents: {e}")
             return []
+        return [t for t in torrents if predicate(t)] if predicate else torrents
 
     def get_trackers(self, hash_val):
         if not self.login(): return []
         url = f"{self.base_url}/api/v2/torrents/trackers"
         params = {"hash": hash_val}
         try:
-            response = self.session.get(url, params=params)
+            response = self._request("GET", url, params=params)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            return []
+
+    def get_torrent_files(self, hash_val):
+        """Get the file list (name relative to save_path, size, progress, priority) of a torrent."""
+        if not self.login(): return []
+        url = f"{self.base_url}/api/v2/torrents/files"
+        try:
+            response = self._request("GET", url, params={"hash": hash_val})
             response.raise_for_status()
             return response.json()
         except Exception as e:
+            print(f"Error getting files for {hash_val}: {e}")
             return []
 
+    def get_trackers_batch(self, hashes, workers=DEFAULT_QBIT_CONCURRENCY):
+        """Get trackers for many torrents concurrently (see fetch_trackers)."""
+        return fetch_trackers(self, hashes, workers)
+
     def pause_torrent(self, hashes):
         if not self.login(): return
         url = f"{self.base_url}/api/v2/torrents/pause"
-        self.session.post(url, data={"hashes": hashes})
+        self._request("POST", url, data={"hashes": hashes})
 
     def resume_torrent(self, hashes):
         if not self.login(): return
         url = f"{self.base_url}/api/v2/torrents/resume"
-        self.session.post(url, data={"hashes": hashes})
+        self._request("POST", url, data={"hashes": hashes})
 
     def recheck_torrent(self, hashes):
         if not self.login(): return
         url = f"{self.base_url}/api/v2/torrents/recheck"
-        self.session.post(url, data={"hashes": hashes})
+        self._request("POST", url, data={"hashes": hashes})
 
     def reannounce_torrent(self, hashes):
         if not self.login(): return
         url = f"{self.base_url}/api/v2/torrents/reannounce"
-        self.session.post(url, data={"hashes": hashes})
+        self._request("POST", url, data={"hashes": hashes})
 
     def set_location(self, hashes, location):
         if not self.login(): return False
         url = f"{self.base_url}/api/v2/torrents/setLocation"
-        response = self.session.post(url, data={"hashes": hashes, "location": location})
+        response = self._request("POST", url, data={"hashes": hashes, "location": location})
         return response.status_code == 200
 
     def delete_torrents(self, hashes, delete_files=False):
@@ -379,27 +1625,68 @@ class QBitClient:
             "hashes": hashes,
             "deleteFiles": "true" if delete_files else "false"
         }
-        self.session.post(url, data=data)
+        self._request("POST", url, data=data)
 
     def add_torrent_file(self, file_path, save_path=None):
         if not self.login(): return False
         url = f"{self.base_url}/api/v2/torrents/add"
-        files = {'torrents': open(file_path, 'rb')}
         data = {}
         if save_path:
             data['savepath'] = save_path
         try:
-            self.session.post(url, files=files, data=data)
+            with open(file_path, 'rb') as f:
+                files = {'torrents': (os.path.basename(file_path), f.read())}
+            self._request("POST", url, files=files, data=data)
             return True
         except Exception as e:
             print(f"Error adding torrent: {e}")
             return False
 
+    def add_torrent_files(self, file_paths, save_path=None, category=None, tags=None,
+                          max_batch_bytes=TORRENT_BATCH_MAX_BYTES,
+                          max_batch_files=TORRENT_BATCH_MAX_FILES):
+        """Upload many .torrent files using a few multipart torrents/add requests.
+
+        Files are packed into batches bounded by ``max_batch_bytes`` and
+        ``max_batch_files``; only the current batch is held in memory. Every
+        batch carries the same savepath/category/tags. Returns
+        ``{path: "added" | "failed" | "unreadable"}``; qBittorrent reports one
+        result per request, so all files in a batch share its outcome.
+        """
+        results = {}
+        if not self.login():
+            return {path: "failed" for path in file_paths}
+        data = {}
+        if save_path:
+            data["savepath"] = save_path
+        if category:
+            data["category"] = category
+        if tags:
+            data["tags"] = ",".join(tags) if isinstance(tags, (list, tuple, set)) else tags
+
+        for batch in _torrent_batches(file_paths, max_batch_bytes, max_batch_files, results):
+            paths = [path for path, _ in batch]
+            files = [
+                ("torrents", (os.path.basename(path), content, "application/x-bittorrent"))
+                for path, content in batch
+            ]
+            try:
+                response = self._request(
+                    "POST", f"{self.base_url}/api/v2/torrents/add", files=files, data=data
+                )
+                response.raise_for_status()
+                status = "failed" if response.text.strip() == "Fails." else "added"
+            except Exception as e:
+                print(f"Error adding {len(paths)} torrents: {e}")
+                status = "failed"
+            results.update((path, status) for path in paths)
+        return results
+
     def get_preferences(self):
         if not self.login(): return {}
         url = f"{self.base_url}/api/v2/app/preferences"
         try:
-            response = self.session.get(url)
+            response = self._request("GET", url)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -411,7 +1698,7 @@ class QBitClient:
         url = f"{self.base_url}/api/v2/app/setPreferences"
         try:
             # qBittorrent expects 'json' parameter with JSON string
-            self.session.post(url, data={"json": json.dumps(prefs)})
+            self._request("POST", url, data={"json": json.dumps(prefs)})
             return True
         except Exception as e:
             print(f"Error setting preferences: {e}")
@@ -421,7 +1708,7 @@ class QBitClient:
         if not self.login(): return False
         url = f"{self.base_url}/api/v2/torrents/createCategory"
         try:
-            self.session.post(url, data={"category": category})
+            self._request("POST", url, data={"category": category})
             return True
         except Exception as e:
             print(f"Error creating category {category}: {e}")
@@ -431,7 +1718,7 @@ class QBitClient:
         if not self.login(): return False
         url = f"{self.base_url}/api/v2/torrents/editCategory"
         try:
-            self.session.post(url, data={"category": category, "savePath": save_path})
+            self._request("POST", url, data={"category": category, "savePath": save_path})
             return True
         except Exception as e:
             print(f"Error setting category save path: {e}")
@@ -442,25 +1729,50 @@ class QBitClient:
         if not self.login(): return {}
         url = f"{self.base_url}/api/v2/torrents/categories"
         try:
-            response = self.session.get(url)
+            response = self._request("GET", url)
             response.raise_for_status()
             return response.json()
         except Exception as e:
             print(f"Error getting categories: {e}")
             return {}
 
-    def get_torrents(self, filter_by=None):
-        """Get all torrents or filter by state (e.g., 'downloading', 'seeding')."""
-        if not self.login(): return []
+    def _iter_pages(self, page_size, sort, params):
         url = f"{self.base_url}/api/v2/torrents/info"
-        params = {"filter": filter_by} if filter_by else {}
-        try:
-            response = self.session.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            print(f"Error getting torrents: {e}")
-            return []
+        offset = 0
+        while True:
+            page_params = dict(params, limit=page_size, offset=offset)
+            if sort:
+                page_params["sort"] = sort
+            try:
+                response = self._request("GET", url, params=page_params)
+                response.raise_for_status()
+                page = response.json()
+            except Exception as e:
+                print(f"Error getting torrents: {e}")
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            offset += page_size
+
+    def iter_torrents(self, page_size=DEFAULT_PAGE_SIZE, sort="added_on", filter_by=None,
+                      category=None, tag=None, hashes=None, predicate=None):
+        """Yield torrents one torrents/info page at a time.
+
+        Only one page is parsed and held at once, so callers can start processing
+        before later pages arrive. The default ``added_on`` sort keeps offsets
+        stable while new torrents are being added. Query arguments behave as in
+        get_torrents().
+        """
+        if not self.login(): return
+        params = torrent_query_params(filter_by, category, tag, hashes)
+        for page in self._iter_pages(page_size, sort, params):
+            if predicate:
+                page = [t for t in page if predicate(t)]
+            if self.fields:
+                yield from TorrentTable(self.fields, page)
+            else:
+                yield from page
 
     def pause_torrents(self, hashes):
         """Pause torrents by hash list."""
@@ -468,7 +1780,7 @@ class QBitClient:
         url = f"{self.base_url}/api/v2/torrents/pause"
         try:
             hash_string = "|".join(hashes) if isinstance(hashes, list) else hashes
-            self.session.post(url, data={"hashes": hash_string})
+            self._request("POST", url, data={"hashes": hash_string})
             return True
         except Exception as e:
             print(f"Error pausing torrents: {e}")
@@ -480,7 +1792,7 @@ class QBitClient:
         url = f"{self.base_url}/api/v2/torrents/resume"
         try:
             hash_string = "|".join(hashes) if isinstance(hashes, list) else hashes
-            self.session.post(url, data={"hashes": hash_string})
+            self._request("POST", url, data={"hashes": hash_string})
             return True
         except Exception as e:
             print(f"Error resuming torrents: {e}")
@@ -492,12 +1804,807 @@ class QBitClient:
         url = f"{self.base_url}/api/v2/torrents/setCategory"
         try:
             hash_string = "|".join(hashes) if isinstance(hashes, list) else hashes
-            self.session.post(url, data={"hashes": hash_string, "category": category})
+            self._request("POST", url, data={"hashes": hash_string, "category": category})
             return True
         except Exception as e:
             print(f"Error setting category: {e}")
             return False
 
+    def get_maindata(self, rid=0):
+        """Get torrent/category/server state changes since response id ``rid``."""
+        if not self.login(): return {}
+        url = f"{self.base_url}/api/v2/sync/maindata"
+        try:
+            response = self._request("GET", url, params={"rid": rid})
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            print(f"Error getting maindata: {e}")
+            return {}
+
+# States matched by each qBittorrent torrents/info ``filter`` value
+TORRENT_FILTER_STATES = {
+    "downloading": {"downloading", "metaDL", "forcedMetaDL", "stalledDL", "checkingDL",
+                    "pausedDL", "stoppedDL", "queuedDL", "forcedDL", "allocating"},
+    "seeding": {"uploading", "stalledUP", "checkingUP", "queuedUP", "forcedUP"},
+    "completed": {"uploading", "stalledUP", "checkingUP", "pausedUP", "stoppedUP",
+                  "queuedUP", "forcedUP"},
+    "paused": {"pausedDL", "pausedUP", "stoppedDL", "stoppedUP"},
+    "stopped": {"pausedDL", "pausedUP", "stoppedDL", "stoppedUP"},
+    "stalled": {"stalledDL", "stalledUP"},
+    "stalled_downloading": {"stalledDL"},
+    "stalled_uploading": {"stalledUP"},
+    "checking": {"checkingDL", "checkingUP", "checkingResumeData"},
+    "moving": {"moving"},
+    "errored": {"error", "missingFiles", "unknown"},
+}
+
+def torrent_matches_filter(torrent, filter_by):
+    """Check a torrent dict against a torrents/info ``filter`` value locally."""
+    if not filter_by or filter_by == "all":
+        return True
+    if filter_by in ("active", "inactive"):
+        active = torrent.get("dlspeed", 0) > 0 or torrent.get("upspeed", 0) > 0
+        return active == (filter_by == "active")
+    if filter_by in ("resumed", "running"):
+        return torrent.get("state") not in TORRENT_FILTER_STATES["paused"]
+    states = TORRENT_FILTER_STATES.get(filter_by)
+    return states is None or torrent.get("state") in states
+
+# Field projection kept by TorrentTable: name -> array typecode (None = Python objects)
+TORRENT_FIELDS = {
+    "hash": None,
+    "name": None,
+    "state": None,
+    "category": None,
+    "tags": None,
+    "save_path": None,
+    "content_path": None,
+    "progress": "d",
+    "availability": "d",
+    "size": "q",
+    "dlspeed": "q",
+    "upspeed": "q",
+    "eta": "q",
+    "num_seeds": "q",
+    "num_complete": "q",
+    "num_leechs": "q",
+    "num_incomplete": "q",
+    "priority": "q",
+    "added_on": "q",
+    "infohash_v1": None,
+    "infohash_v2": None,
+}
+
+class TorrentRow:
+    """Read-only view of one TorrentTable row that behaves like the torrents/info dict."""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key):
+        return self._table.columns[key][self._index]
+
+    def __contains__(self, key):
+        return key in self._table.columns
+
+    def get(self, key, default=None):
+        column = self._table.columns.get(key)
+        return default if column is None else column[self._index]
+
+    def keys(self):
+        return self._table.columns.keys()
+
+    def to_dict(self):
+        return {key: column[self._index] for key, column in self._table.columns.items()}
+
+    def __repr__(self):
+        return f"TorrentRow({self.to_dict()!r})"
+
+class TorrentTable:
+    """Struct-of-arrays torrent list keyed by hash that keeps only a declared field projection.
+
+    Numeric fields are stored in typed ``array`` columns and string values are
+    interned, so a large library costs a few hundred bytes per torrent instead
+    of a full JSON dict. Iterating yields TorrentRow views, so code written
+    against the torrents/info dicts works unchanged; filters such as
+    ``select("state", ...)`` scan a single column. Fields outside the projection
+    are not available, and numeric fields missing from the source read as 0.
+    """
+
+    def __init__(self, fields=None, torrents=()):
+        self.fields = dict(fields or TORRENT_FIELDS)
+        self.fields.setdefault("hash", None)
+        self.columns = {
+            name: array.array(code) if code else [] for name, code in self.fields.items()
+        }
+        self._index = {}
+        self.extend(torrents)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return (TorrentRow(self, i) for i in range(len(self)))
+
+    def __contains__(self, hash_val):
+        return hash_val in self._index
+
+    def _coerce(self, name, value):
+        if self.fields[name]:
+            return value or 0
+        return sys.intern(value) if isinstance(value, str) else value
+
+    def append(self, torrent, **values):
+        """Add or replace a torrent from a torrents/info (or maindata) dict or TorrentRow.
+
+        ``values`` set fields on top of the torrent's own (e.g. ``instance``).
+        """
+        hash_val = torrent["hash"]
+        if hash_val in self._index:
+            self.update(hash_val, dict(torrent, **values))
+            return
+        self._index[hash_val] = len(self._index)
+        for name, column in self.columns.items():
+            column.append(self._coerce(name, values[name] if name in values else torrent.get(name)))
+
+    def extend(self, torrents):
+        for torrent in torrents:
+            self.append(torrent)
+
+    def update(self, hash_val, delta):
+        """Apply a partial update to an existing row, ignoring fields outside the projection."""
+        index = self._index[hash_val]
+        for name, value in delta.items():
+            column = self.columns.get(name)
+            if column is not None and name != "hash":
+                column[index] = self._coerce(name, value)
+
+    def remove(self, hash_val):
+        """Remove a row by moving the last row into its slot (invalidates held TorrentRows)."""
+        index = self._index.pop(hash_val)
+        last = len(self._index)
+        for column in self.columns.values():
+            if index != last:
+                column[index] = column[last]
+            column.pop()
+        if index != last:
+            self._index[self.columns["hash"][index]] = index
+
+    def get(self, hash_val):
+        index = self._index.get(hash_val)
+        return None if index is None else TorrentRow(self, index)
+
+    def column(self, name):
+        return self.columns[name]
+
+    def where(self, name, values):
+        """Return row indices whose ``name`` column value is in ``values``."""
+        values = set(values)
+        return [i for i, value in enumerate(self.columns[name]) if value in values]
+
+    def select(self, name, values):
+        """Return TorrentRows whose ``name`` column value is in ``values``."""
+        return [TorrentRow(self, i) for i in self.where(name, values)]
+
+def filter_by_state(torrents, states):
+    """Return torrents whose state is in ``states``, scanning one column for a TorrentTable."""
+    if isinstance(torrents, TorrentTable):
+        return torrents.select("state", states)
+    return [t for t in torrents if t['state'] in states]
+
+def format_size(num_bytes):
+    """Format a byte count using binary units (e.g. '1.5 GiB')."""
+    size = float(num_bytes)
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if abs(size) < 1024 or unit == "TiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def format_duration(seconds):
+    """Format seconds as e.g. '1h 02m', '3m 05s' or '42s'."""
+    seconds = int(max(seconds, 0))
+    hours, rem = divmod(seconds, 3600)
+    minutes, secs = divmod(rem, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {secs:02d}s"
+    return f"{secs}s"
+
+def path_device(path, path_map=()):
+    """Return ``st_dev`` for ``path`` or its nearest existing parent, or None.
+
+    qBittorrent reports container paths; ``path_map`` translates them to
+    local paths first (see map_path). A path not yet created resolves to the
+    device of its closest existing ancestor, but the filesystem root does
+    not count: a path only the root contains could not be resolved locally.
+    """
+    path = os.path.abspath(map_path(path or os.sep, path_map))
+    while True:
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            path = parent
+
+def split_tags(tags):
+    """Split qBittorrent's comma-separated ``tags`` field into a set."""
+    return {tag.strip() for tag in (tags or "").split(",") if tag.strip()}
+
+# States treated as stalled downloads by the status and cleanup utilities
+STALLED_STATES = {"stalledDL", "metaDL"}
+
+class TorrentHistory:
+    """Fixed-size ring buffer of samples per torrent for trend-based checks.
+
+    Each torrent gets one ``array('d')`` of ``capacity`` samples of
+    (time, progress, dlspeed, num_seeds, availability), so memory stays
+    bounded however long the caller keeps polling. Feed it torrents/info
+    results with record(); the oldest samples are overwritten first.
+    """
+
+    FIELDS = ("time", "progress", "dlspeed", "num_seeds", "availability")
+
+    def __init__(self, capacity=120):
+        self.capacity = capacity
+        self._buffers = {}  # hash -> array of capacity * len(FIELDS)
+        self._positions = {}  # hash -> (start, count)
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def record(self, torrents, now=None):
+        now = time.monotonic() if now is None else now
+        width = len(self.FIELDS)
+        for t in torrents:
+            hash_val = t['hash']
+            buf = self._buffers.get(hash_val)
+            if buf is None:
+                buf = self._buffers[hash_val] = array.array("d", bytes(8 * width * self.capacity))
+                self._positions[hash_val] = (0, 0)
+            start, count = self._positions[hash_val]
+            slot = (start + count) % self.capacity
+            if count < self.capacity:
+                count += 1
+            else:
+                start = (start + 1) % self.capacity
+            offset = slot * width
+            buf[offset] = now
+            buf[offset + 1] = t.get('progress', 0) or 0
+            buf[offset + 2] = t.get('dlspeed', 0) or 0
+            buf[offset + 3] = t.get('num_seeds', 0) or 0
+            buf[offset + 4] = t.get('availability', 0) or 0
+            self._positions[hash_val] = (start, count)
+
+    def forget(self, hashes):
+        for hash_val in hashes:
+            self._buffers.pop(hash_val, None)
+            self._positions.pop(hash_val, None)
+
+    def samples(self, hash_val):
+        """Return samples for ``hash_val`` oldest first, as tuples in FIELDS order."""
+        buf = self._buffers.get(hash_val)
+        if buf is None:
+            return []
+        start, count = self._positions[hash_val]
+        width = len(self.FIELDS)
+        result = []
+        for i in range(count):
+            offset = ((start + i) % self.capacity) * width
+            result.append(tuple(buf[offset:offset + width]))
+        return result
+
+    def _window(self, hash_val, window):
+        samples = self.samples(hash_val)
+        if window and samples:
+            cutoff = samples[-1][0] - window
+            samples = [sample for sample in samples if sample[0] >= cutoff]
+        return samples
+
+    def progress_rate(self, hash_val, window=None):
+        """Progress fraction per second over the last ``window`` seconds, or None."""
+        samples = self._window(hash_val, window)
+        if len(samples) < 2 or samples[-1][0] <= samples[0][0]:
+            return None
+        return (samples[-1][1] - samples[0][1]) / (samples[-1][0] - samples[0][0])
+
+    def smoothed_speed(self, hash_val, alpha=0.3):
+        """Exponential moving average of dlspeed, or None without samples."""
+        average = None
+        for sample in self.samples(hash_val):
+            average = sample[2] if average is None else alpha * sample[2] + (1 - alpha) * average
+        return average
+
+    def eta(self, hash_val, window=None):
+        """Seconds to completion from the observed progress rate, or None if not moving."""
+        rate = self.progress_rate(hash_val, window)
+        if not rate or rate <= 0:
+            return None
+        return (1 - self.samples(hash_val)[-1][1]) / rate
+
+    def stalled_for(self, hash_val):
+        """Seconds the progress has not increased, or None with fewer than two samples."""
+        samples = self.samples(hash_val)
+        if len(samples) < 2:
+            return None
+        last_time, last_progress = samples[-1][0], samples[-1][1]
+        since = last_time
+        for sample in reversed(samples[:-1]):
+            if sample[1] < last_progress:
+                break
+            since = sample[0]
+        return last_time - since
+
+    def no_progress(self, hash_val, seconds):
+        """True if the history spans ``seconds`` and progress stayed flat throughout."""
+        stalled = self.stalled_for(hash_val)
+        return stalled is not None and stalled >= seconds
+
+# Fuzzy matches scoring below this trigram Dice similarity are dropped
+MIN_FUZZY_SCORE = 0.3
+
+# Separators torrent name searches treat as spaces
+NAME_SEPARATORS = str.maketrans("._-", "   ")
+
+def normalize_name(text):
+    """Lowercase a torrent name and treat ``.``/``_``/``-`` as spaces."""
+    return " ".join((text or "").lower().translate(NAME_SEPARATORS).split())
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def search_torrents(torrents, query, limit=20):
+    """Return ``(hash, match_type)`` candidates for a query in one pass over ``torrents``.
+
+    An exact hash wins outright. Otherwise hash-prefix and name-substring
+    matches (shortest names first) are all returned; fuzzy matches ranked by
+    trigram similarity (up to ``limit``) are only used when nothing matched
+    literally.
+    """
+    query = query.strip()
+    lowered = query.lower()
+    needle = normalize_name(query)
+    by_prefix = len(lowered) >= 3 and re.fullmatch(r"[0-9a-f]+", lowered)
+    names = {}
+    prefixed = []
+    for torrent in torrents:
+        hash_val = torrent["hash"]
+        if hash_val == lowered:
+            return [(hash_val, "hash")]
+        names[hash_val] = normalize_name(torrent.get("name", ""))
+        if by_prefix and hash_val.startswith(lowered):
+            prefixed.append(hash_val)
+
+    results = [(h, "hash prefix") for h in sorted(prefixed)]
+    if needle:
+        seen = set(prefixed)
+        named = [h for h, name in names.items() if needle in name and h not in seen]
+        named.sort(key=lambda h: (len(names[h]), names[h]))
+        results.extend((h, "name") for h in named)
+    if results:
+        return results
+
+    grams = _trigrams(needle)
+    if not grams:
+        return []
+    scored = []
+    for hash_val, name in names.items():
+        shared = sum(1 for gram in grams if gram in name)
+        score = 2 * shared / (len(grams) + max(len(name) - 2, 1))
+        if shared and score >= MIN_FUZZY_SCORE:
+            scored.append((hash_val, score))
+    scored.sort(key=lambda item: (-item[1], names[item[0]]))
+    return [(h, f"fuzzy {score:.2f}") for h, score in scored[:limit]]
+
+class TorrentStateMirror:
+    """In-memory copy of the qBittorrent torrent list kept current through sync/maindata.
+
+    The first sync() transfers a full snapshot; every later call sends the last
+    ``rid`` so qBittorrent only returns the fields that changed since then.
+    Anything the mirror does not implement is forwarded to the wrapped client,
+    so it can be passed to the utilities in place of a QBitClient. Pass
+    ``fields`` (e.g. TORRENT_FIELDS) to keep only those keys per torrent.
+
+    The query methods (get_torrents, iter_torrents, get_categories) sync first
+    when the last sync is older than ``max_age`` seconds, so with the default
+    of 0 every read reflects qBittorrent at the time of the call. Loops that
+    call sync() themselves can read ``torrents`` directly instead.
+    """
+
+    def __init__(self, client, fields=None, max_age=0):
+        self.client = client
+        self.fields = fields
+        self.max_age = max_age
+        self.synced_at = None
+        self.rid = 0
+        self.torrents = {}
+        self.categories = {}
+        self.tags = set()
+        self.server_state = {}
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def sync(self):
+        """Apply the next maindata delta and return (changed_hashes, removed_hashes)."""
+        data = self.client.get_maindata(self.rid)
+        self.synced_at = time.monotonic()
+        if not data:
+            return set(), set()
+
+        removed = set()
+        if data.get("full_update"):
+            removed = set(self.torrents)
+            self.torrents = {}
+            self.categories = {}
+            self.tags = set()
+            self.server_state = {}
+
+        changed = set()
+        for hash_val, delta in data.get("torrents", {}).items():
+            entry = self.torrents.get(hash_val)
+            if entry is None:
+                entry = self.torrents[hash_val] = {"hash": hash_val}
+            if self.fields:
+                delta = {k: v for k, v in delta.items() if k in self.fields}
+            entry.update(delta)
+            changed.add(hash_val)
+            removed.discard(hash_val)
+
+        for hash_val in data.get("torrents_removed", []):
+            if self.torrents.pop(hash_val, None) is not None:
+                removed.add(hash_val)
+
+        for name, delta in data.get("categories", {}).items():
+            self.categories.setdefault(name, {}).update(delta)
+        for name in data.get("categories_removed", []):
+            self.categories.pop(name, None)
+        self.tags.update(data.get("tags", []))
+        self.tags.difference_update(data.get("tags_removed", []))
+        self.server_state.update(data.get("server_state", {}))
+
+        self.rid = data.get("rid", self.rid)
+        return changed, removed
+
+    def _refresh(self):
+        if self.synced_at is None or not self.rid or time.monotonic() - self.synced_at >= self.max_age:
+            self.sync()
+
+    def get_torrents(self, filter_by=None, category=None, tag=None, hashes=None, predicate=None):
+        """Query the local table with the same arguments as QBitClient.get_torrents()."""
+        self._refresh()
+        if hashes:
+            wanted = hashes.split("|") if isinstance(hashes, str) else hashes
+            torrents = [self.torrents[h] for h in wanted if h in self.torrents]
+        else:
+            torrents = list(self.torrents.values())
+        if filter_by:
+            torrents = [t for t in torrents if torrent_matches_filter(t, filter_by)]
+        if category is not None:
+            torrents = [t for t in torrents if t.get("category", "") == category]
+        if tag is not None:
+            torrents = [t for t in torrents if tag in split_tags(t.get("tags", ""))]
+        if predicate:
+            torrents = [t for t in torrents if predicate(t)]
+        return torrents
+
+    def iter_torrents(self, page_size=DEFAULT_PAGE_SIZE, sort=None, **query):
+        """Yield torrents from the local table (``page_size`` is accepted for compatibility)."""
+        torrents = self.get_torrents(**query)
+        if sort:
+            torrents.sort(key=lambda t: (t.get(sort) is None, t.get(sort)))
+        yield from torrents
+
+    def get_categories(self):
+        """Get categories from the local table."""
+        self._refresh()
+        return dict(self.categories)
+
+class MultiQBitClient:
+    """Fan QBitClient calls out over several qBittorrent instances.
+
+    Queries run on every instance concurrently and the merged torrents carry
+    an ``instance`` key naming where they live. The owner of each hash is
+    remembered, so per-hash actions (recheck, reannounce, delete, ...) are
+    split into one request per owning instance. A hash found on several
+    instances is reported once; actions go to every instance holding it and
+    reads (trackers, files) to the first. Tabled clients (``fields``) are
+    merged into one TorrentTable with an ``instance`` column, keeping the
+    first instance's row for such a hash. sync/maindata is merged across
+    instances; uploads go to the first instance. Anything else (preferences,
+    categories setup) is not implemented and raises AttributeError rather
+    than silently reaching one instance. close() (or ``with``) shuts the
+    worker threads down.
+    """
+
+    # server_state keys summed across instances; the rest come from the first instance
+    SUMMED_SERVER_STATE = ("dl_info_speed", "up_info_speed", "dl_info_data", "up_info_data", "dht_nodes")
+
+    def __init__(self, clients):
+        self.clients = dict(clients)
+        self.primary = next(iter(self.clients.values()))
+        self.owners = {}  # hash -> instance names holding it, in client order
+        self._conflicts = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.clients)))
+        # Merged maindata rid -> {instance: rid}, and each instance's server_state
+        self._maindata_rid = 0
+        self._maindata_rids = {}
+        self._server_states = {}
+
+    def _each(self, clients, call):
+        """Run ``call(name, client)`` on every instance; returns {name: result}."""
+        futures = {self._executor.submit(call, name, client): name for name, client in clients.items()}
+        results = {}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"Error querying qBittorrent instance {name}: {e}")
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for client in self.clients.values():
+            client.close()
+
+    def _remember(self, name, hashes):
+        """Record ``name`` as an owner of ``hashes``, reporting hashes seen on several instances."""
+        order = list(self.clients)
+        conflicts = []
+        with self._lock:
+            for hash_val in hashes:
+                owners = self.owners.setdefault(hash_val, [])
+                if name in owners:
+                    continue
+                owners.append(name)
+                owners.sort(key=order.index)
+                if len(owners) > 1 and hash_val not in self._conflicts:
+                    self._conflicts.add(hash_val)
+                    conflicts.append((hash_val, list(owners)))
+        for hash_val, owners in conflicts:
+            print(f"Torrent {hash_val} is on several qBittorrent instances ({', '.join(owners)}); "
+                  f"actions apply to all of them")
+
+    def _tag(self, name, torrents):
+        tagged = [dict(t, instance=name) for t in torrents]
+        self._remember(name, [t["hash"] for t in tagged if "hash" in t])
+        return tagged
+
+    def _merge_tables(self, tables):
+        """Merge per-instance TorrentTables column by column into one with ``instance``."""
+        fields = dict(next(iter(tables.values())).fields, instance=None)
+        merged = TorrentTable(fields)
+        for name in self.clients:
+            table = tables.get(name)
+            if table is None:
+                continue
+            self._remember(name, table.columns["hash"])
+            for row in table:
+                if row["hash"] not in merged:
+                    merged.append(row, instance=name)
+        return merged
+
+    def _split(self, hashes):
+        """Group ``hashes`` (list or '|'-joined) by owning instance, looking up unknown ones."""
+        wanted = hashes.split("|") if isinstance(hashes, str) else list(hashes)
+        unknown = [h for h in wanted if h not in self.owners]
+        if unknown:
+            self._each(self.clients, lambda name, client: self._tag(name, client.get_torrents(hashes=unknown)))
+        groups = {}
+        for hash_val in wanted:
+            owners = self.owners.get(hash_val)
+            if not owners:
+                print(f"Torrent {hash_val} not found on any qBittorrent instance")
+                continue
+            for owner in owners:
+                groups.setdefault(owner, []).append(hash_val)
+        return groups
+
+    def _route(self, method, hashes, *args, **kwargs):
+        groups = self._split(hashes)
+        clients = {name: self.clients[name] for name in groups}
+        results = self._each(
+            clients, lambda name, client: getattr(client, method)("|".join(groups[name]), *args, **kwargs)
+        )
+        return all(result is not False for result in results.values()) if results else False
+
+    def get_torrents(self, filter_by=None, category=None, tag=None, hashes=None, predicate=None):
+        clients = self.clients
+        if hashes:
+            wanted = hashes.split("|") if isinstance(hashes, str) else list(hashes)
+            if all(h in self.owners for h in wanted):
+                # Only ask the instances that own these hashes
+                owning = {name for h in wanted for name in self.owners[h]}
+                clients = {name: client for name, client in self.clients.items() if name in owning}
+        results = self._each(
+            clients, lambda name, client: client.get_torrents(filter_by, category, tag, hashes, predicate)
+        )
+        if results and all(isinstance(torrents, TorrentTable) for torrents in results.values()):
+            return self._merge_tables(results)
+        return [t for name in self.clients if name in results for t in self._tag(name, results[name])]
+
+    def iter_torrents(self, page_size=DEFAULT_PAGE_SIZE, sort="added_on", **query):
+        """Yield torrents from every instance as their pages arrive.
+
+        Each instance is paged on its own thread into a bounded queue, so no
+        instance's list is held in full and a slow instance does not hold
+        back the others.
+        """
+        pending = queue.Queue(maxsize=max(1, page_size))
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pending.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def pump(name, client):
+            try:
+                for t in client.iter_torrents(page_size, sort, **query):
+                    if not put(self._tag(name, [t])[0]):
+                        return
+            except Exception as e:
+                print(f"Error querying qBittorrent instance {name}: {e}")
+            finally:
+                put(done)
+
+        for name, client in self.clients.items():
+            threading.Thread(target=pump, args=(name, client), daemon=True).start()
+        remaining = len(self.clients)
+        try:
+            while remaining:
+                item = pending.get()
+                if item is done:
+                    remaining -= 1
+                else:
+                    yield item
+        finally:
+            # Let the pumps exit if the caller stops early
+            stop.set()
+
+    def get_maindata(self, rid=0):
+        """Merge sync/maindata from every instance into one response.
+
+        Every instance keeps its own rid; the merged response carries a rid
+        of this client's that maps back to them. When any instance sends a
+        full update, the others are asked for one too, so the merged response
+        can be applied as a full update. Torrent deltas carry ``instance``.
+        """
+        rids = self._maindata_rids.get(rid, {}) if rid else {}
+        results = self._each(self.clients, lambda name, client: client.get_maindata(rids.get(name, 0)))
+        results = {name: data for name, data in results.items() if data}
+        if not results:
+            return {}
+        full = any(data.get("full_update") for data in results.values())
+        if full:
+            partial = {name: client for name, client in self.clients.items()
+                       if name in results and not results[name].get("full_update")}
+            if partial:
+                refetched = self._each(partial, lambda name, client: client.get_maindata(0))
+                results.update((name, data) for name, data in refetched.items() if data)
+            results = {name: data for name, data in results.items() if data.get("full_update")}
+            self._server_states = {}
+
+        merged = {"torrents": {}, "torrents_removed": [], "categories": {}, "categories_removed": [],
+                  "tags": [], "tags_removed": []}
+        if full:
+            merged["full_update"] = True
+        next_rids = {}
+        for name in self.clients:
+            data = results.get(name)
+            if data is None:
+                # A full update without this instance leaves it out of the mirror; start it over
+                next_rids[name] = 0 if full else rids.get(name, 0)
+                continue
+            next_rids[name] = data.get("rid", rids.get(name, 0))
+            torrents = data.get("torrents", {})
+            self._remember(name, torrents)
+            merged["torrents"].update((h, dict(delta, instance=name)) for h, delta in torrents.items())
+            merged["torrents_removed"].extend(data.get("torrents_removed", []))
+            merged["categories"].update(data.get("categories", {}))
+            merged["categories_removed"].extend(data.get("categories_removed", []))
+            merged["tags"].extend(tag for tag in data.get("tags", []) if tag not in merged["tags"])
+            merged["tags_removed"].extend(data.get("tags_removed", []))
+            self._server_states.setdefault(name, {}).update(data.get("server_state", {}))
+
+        server_state = {}
+        for name in reversed(list(self.clients)):
+            server_state.update(self._server_states.get(name, {}))
+        for key in self.SUMMED_SERVER_STATE:
+            values = [state[key] for state in self._server_states.values() if key in state]
+            if values:
+                server_state[key] = sum(values)
+        merged["server_state"] = server_state
+
+        self._maindata_rid += 1
+        # A mirror only ever resumes from the latest rid; older ones fall back to a full update
+        self._maindata_rids = {self._maindata_rid: next_rids}
+        merged["rid"] = self._maindata_rid
+        return merged
+
+    def _owner(self, hash_val):
+        owners = self.owners.get(hash_val)
+        return owners[0] if owners else next(iter(self._split([hash_val])), None)
+
+    def get_trackers(self, hash_val):
+        owner = self._owner(hash_val)
+        return self.clients[owner].get_trackers(hash_val) if owner else []
+
+    def get_torrent_files(self, hash_val):
+        owner = self._owner(hash_val)
+        return self.clients[owner].get_torrent_files(hash_val) if owner else []
+
+    def get_trackers_batch(self, hashes, workers=DEFAULT_QBIT_CONCURRENCY):
+        """Get trackers for many torrents concurrently, each from its owning instance."""
+        return fetch_trackers(self, hashes, workers)
+
+    def add_torrent_files(self, file_paths, **kwargs):
+        """Upload .torrent files to the first instance (see QBitClient.add_torrent_files)."""
+        return self.primary.add_torrent_files(file_paths, **kwargs)
+
+    def get_categories(self):
+        merged = {}
+        for categories in self._each(self.clients, lambda name, client: client.get_categories()).values():
+            merged.update(categories or {})
+        return merged
+
+    def pause_torrent(self, hashes):
+        self._route("pause_torrent", hashes)
+
+    def resume_torrent(self, hashes):
+        self._route("resume_torrent", hashes)
+
+    def recheck_torrent(self, hashes):
+        self._route("recheck_torrent", hashes)
+
+    def reannounce_torrent(self, hashes):
+        self._route("reannounce_torrent", hashes)
+
+    def set_location(self, hashes, location):
+        return self._route("set_location", hashes, location)
+
+    def delete_torrents(self, hashes, delete_files=False):
+        self._route("delete_torrents", hashes, delete_files)
+
+    def pause_torrents(self, hashes):
+        return self._route("pause_torrents", hashes)
+
+    def resume_torrents(self, hashes):
+        return self._route("resume_torrents", hashes)
+
+    def set_torrent_category(self, hashes, category):
+        return self._route("set_torrent_category", hashes, category)
+
+def connect_qbit(config, client_class=None, **kwargs):
+    """Build a client for every configured instance; one instance gets a plain client."""
+    client_class = client_class or QBitClient
+    instances = config.qbit_instances
+    if len(instances) <= 1:
+        return client_class(config.base_url, config.qbit_user, config.qbit_pass, **kwargs)
+    return MultiQBitClient({
+        inst["name"]: client_class(inst["url"], inst["username"], inst["password"], **kwargs)
+        for inst in instances
+    })
+
 class Config:
     def __init__(self):
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -522,6 +2629,53 @@ class Config:
         self.bt_backup_path = os.environ.get("BT_BACKUP_PATH")
         self.default_save_path = os.environ.get("DEFAULT_SAVE_PATH", "/media/downloads")
         self.default_scan_path = os.environ.get("DEFAULT_SCAN_PATH")
+        self.session_cache_path = os.environ.get(
+            "QBIT_SESSION_CACHE",
+            os.path.join(os.path.expanduser("~"), ".cache", "torrent-services", "qbit_session.json"),
+        )
+        self.qbit_instances = self._load_instances()
+        self.torrent_files_path = os.environ.get(
+            "TORRENT_FILES_DB",
+            os.path.join(os.path.expanduser("~"), ".cache", "torrent-services", "torrent_files.sqlite"),
+        )
+        self.directory_cache_path = os.environ.get(
+            "DIRECTORY_CACHE_DB",
+            os.path.join(os.path.expanduser("~"), ".cache", "torrent-services", "directories.sqlite"),
+        )
+        self.tracker_health_path = os.environ.get(
+            "TRACKER_HEALTH_DB",
+            os.path.join(os.path.expanduser("~"), ".cache", "torrent-services", "tracker_health.sqlite"),
+        )
+
+    def _load_instances(self):
+        """Read ``qbittorrent.instances`` from setup.config.json.
+
+        Each entry needs ``name`` and ``url``; ``username`` defaults to
+        SERVICE_USER and the password comes from ``password_env`` (an env var
+        name) or falls back to QBITTORRENT_PASSWORD. Without the key the single
+        ``base_url`` instance is returned.
+        """
+        entries = self.settings.get("qbittorrent", {}).get("instances") or []
+        instances = []
+        for i, entry in enumerate(entries):
+            if not isinstance(entry, dict) or not entry.get("url"):
+                label = entry.get("name") if isinstance(entry, dict) and entry.get("name") else f"#{i + 1}"
+                raise ValueError(
+                    f"qbittorrent.instances entry {label} in {self.config_path} needs a 'url'"
+                )
+            password_env = entry.get("password_env")
+            instances.append({
+                "name": entry.get("name") or f"qbittorrent-{i + 1}",
+                "url": entry["url"],
+                "username": entry.get("username", self.qbit_user),
+                "password": self.env.get(password_env, os.environ.get(password_env)) if password_env else self.qbit_pass,
+            })
+        if not instances:
+            instances.append({
+                "name": "default", "url": self.base_url,
+                "username": self.qbit_user, "password": self.qbit_pass,
+            })
+        return instances
 
     def _load_env(self):
         env_vars = {}
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Bootstrap the *arr services from setup.config.json.
+
+All services are probed concurrently and each one is configured as soon as it
+answers, so a cold start takes about as long as the slowest service instead of
+the sum of all of them.
+
+Features:
+- One worker per service: wait for the API, then run its configure steps.
+- Readiness polls start sub-second, try /ping before the authenticated status
+  call and back off with jitter; the summary shows the slowest service.
+- A service whose effective config and managed resources match the last
+  successful run is skipped (--force reconciles it anyway).
+- Services can declare "depends_on"; their configure steps wait on a shared
+  readiness barrier until those services are up (or have given up).
+- Root folders, download clients, config endpoints and analytics are diffed
+  against the live state; only the differences are written (--plan shows
+  them without writing).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import (
+    ArrReconciler,
+    ProvisioningStateStore,
+    arr_client,
+    get_api_key,
+    load_config,
+    load_env,
+    log,
+    wait_for_service,
+)
+
+# Ports used when a service entry has no "url" and no <NAME>_PORT is set
+DEFAULT_PORTS = {
+    "sonarr": 8989,
+    "radarr": 7878,
+    "prowlarr": 9696,
+    "bazarr": 6767,
+}
+
+# Where the fingerprints of the last successful run per service are kept
+DEFAULT_STATE_PATH = os.environ.get(
+    "PROVISIONING_STATE_DB",
+    os.path.join(os.path.expanduser("~"), ".cache", "torrent-services", "provisioning.sqlite"),
+)
+
+# Resource keys that change without any configuration change and must not affect the fingerprint
+VOLATILE_RESOURCE_KEYS = {"freeSpace", "totalSpace", "unmappedFolders"}
+
+# Unauthenticated endpoints polled before the status call (Sonarr, Radarr and Prowlarr serve /ping)
+DEFAULT_PING_ENDPOINTS = ("/ping",)
+
+def service_url(name, settings):
+    """Resolve a service's base URL from <NAME>_URL, its settings or <NAME>_PORT."""
+    env_url = os.environ.get(f"{name.upper()}_URL")
+    if env_url:
+        return env_url.rstrip("/")
+    if settings.get("url"):
+        return settings["url"].rstrip("/")
+    port = os.environ.get(f"{name.upper()}_PORT", DEFAULT_PORTS.get(name, 80))
+    return f"http://localhost:{port}"
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+def config_fingerprint(settings, url, api_key):
+    """Hash the effective config: settings with download client env fields resolved."""
+    effective = json.loads(json.dumps(settings))
+    for client in effective.get("download_clients", []):
+        for field in client.get("fields", []):
+            if "env" in field:
+                field["value"] = os.environ.get(field["env"])
+    # Only a hash of the key is mixed in so a rotated key forces a run
+    return _digest({"url": url, "api_key": _digest(api_key), "settings": effective})
+
+def _strip_volatile(value):
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in VOLATILE_RESOURCE_KEYS}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+def remote_fingerprint(current):
+    """Hash an ArrReconciler.fetch() result minus free space; None if a resource failed."""
+    if any(state is None for state in current.values()):
+        return None
+    return _digest(_strip_volatile(current))
+
+class Bootstrap:
+    """Bring up several services in parallel behind a shared readiness barrier.
+
+    Every service gets its own worker that waits for the API and then applies
+    the configure steps from its settings through an ArrReconciler, which
+    only writes what differs from the live state. ``ready`` holds one Event per
+    service which is set once the service is either reachable or has given up;
+    a service listed in another's ``depends_on`` therefore blocks only that
+    service's configure steps, never the probes. ``status`` records the
+    outcome per service and ``timings`` the seconds until it was ready.
+
+    With a ProvisioningStateStore, the resources the reconciler manages are
+    fetched once and hashed; a service whose config and resource fingerprints
+    match the last successful run is marked ``unchanged`` without planning
+    or writing, unless ``force`` is set. Edits made in the UI or a reset
+    database change the resources and therefore reconcile again. The store also keeps
+    hashes of the secrets last applied, so a rotated password is sent again
+    although the service only ever returns it masked; ``force`` resends them.
+    """
+
+    def __init__(self, services, max_retries=30, retry_delay=2, dry_run=False, state=None, force=False):
+        self.services = services
+        self.dry_run = dry_run
+        self.state = state
+        self.force = force
+        self.previous = {}
+        self.fingerprints = {}
+        self.applied_secrets = {}
+        self.secrets = {}
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.ready = {name: threading.Event() for name in services}
+        self.status = {}
+        self.timings = {}
+        self.clients = {}
+        self.elapsed = 0.0
+        self.lock = threading.Lock()
+
+    def _set_status(self, name, status):
+        with self.lock:
+            self.status[name] = status
+
+    def wait_ready(self, name, settings, api_key, url):
+        """Wait for one service and release the barrier for it either way."""
+        start = time.monotonic()
+        # The same pooled client serves readiness and reconcile, so its stats cover both
+        with self.lock:
+            self.clients[name] = arr_client(
+                url, api_key, settings.get("api_version", "v3"), settings.get("header_name", "X-Api-Key")
+            )
+        try:
+            wait_for_service(
+                url,
+                api_key,
+                settings.get("display_name", name.capitalize()),
+                endpoint=settings.get("status_endpoint", "system/status"),
+                header_name=settings.get("header_name", "X-Api-Key"),
+                max_retries=self.max_retries,
+                retry_delay=self.retry_delay,
+                ping_endpoints=settings.get("ping_endpoints", DEFAULT_PING_ENDPOINTS),
+                api_version=settings.get("api_version", "v3"),
+            )
+            self._set_status(name, "ready")
+            return True
+        except SystemExit:
+            self._set_status(name, "unreachable")
+            return False
+        finally:
+            with self.lock:
+                self.timings[name] = time.monotonic() - start
+            self.ready[name].set()
+
+    def wait_dependencies(self, name, settings):
+        """Block until every dependency has resolved; False if one is not usable."""
+        for dep in settings.get("depends_on", []):
+            if dep not in self.ready:
+                log(f"{name} depends on unknown service {dep}", "WARNING")
+                continue
+            self.ready[dep].wait()
+            if self.status.get(dep) not in ("ready", "configured", "unchanged"):
+                log(f"Skipping {name} configuration: {dep} is not available", "ERROR")
+                return False
+        return True
+
+    def reconciler(self, name, settings, api_key, url):
+        # Built on the same pooled client wait_ready registered for the summary
+        return ArrReconciler(
+            url,
+            api_key,
+            name,
+            api_version=settings.get("api_version", "v3"),
+            header_name=settings.get("header_name", "X-Api-Key"),
+            applied_secrets=self.applied_secrets.get(name),
+            force=self.force,
+        )
+
+    def configure(self, name, settings, reconciler, current=None):
+        """Reconcile a service against its settings; True when every write succeeded."""
+        if reconciler.reconcile(settings, dry_run=self.dry_run, current=current) != 0:
+            return False
+        if not self.dry_run:
+            with self.lock:
+                self.secrets[name] = reconciler.secret_hashes(settings)
+        return True
+
+    def run_service(self, name):
+        settings = self.services[name]
+        url = service_url(name, settings)
+        try:
+            api_key = get_api_key(settings.get("api_key_env", f"{name.upper()}_API_KEY"))
+        except SystemExit:
+            self._set_status(name, "failed")
+            self.ready[name].set()
+            return name
+
+        if not self.wait_ready(name, settings, api_key, url):
+            return name
+        if not self.wait_dependencies(name, settings):
+            self._set_status(name, "blocked")
+            return name
+
+        fingerprint = None
+        current = None
+        try:
+            reconciler = self.reconciler(name, settings, api_key, url)
+            if self.state is not None and not self.dry_run:
+                # The fetch doubles as the fingerprint input and the reconcile's current state
+                current = reconciler.fetch(settings)
+                remote = remote_fingerprint(current)
+                if remote is not None:
+                    fingerprint = (config_fingerprint(settings, url, api_key), remote)
+                if fingerprint is not None and not self.force and self.previous.get(name) == fingerprint:
+                    log(f"{name} unchanged since the last run, skipping (use --force to reconcile)", "INFO")
+                    self._set_status(name, "unchanged")
+                    return name
+            configured = self.configure(name, settings, reconciler, current)
+            if configured and fingerprint is not None and reconciler.changes:
+                # Record the state the writes produced, not the one they replaced
+                remote = remote_fingerprint(reconciler.fetch(settings))
+                fingerprint = (fingerprint[0], remote) if remote is not None else None
+        except Exception as e:
+            log(f"Failed to configure {name}: {e}", "ERROR")
+            configured = False
+        if configured and fingerprint is not None:
+            with self.lock:
+                self.fingerprints[name] = fingerprint
+        self._set_status(name, "configured" if configured else "failed")
+        return name
+
+    def run(self):
+        """Run every service concurrently and return ``{name: status}``."""
+        if not self.services:
+            return {}
+        start = time.monotonic()
+        # The store is only touched from this thread; workers compare against the loaded dict
+        if self.state is not None:
+            self.previous = self.state.load()
+            self.applied_secrets = self.state.load_secrets()
+        with ThreadPoolExecutor(max_workers=len(self.services)) as executor:
+            futures = [executor.submit(self.run_service, name) for name in self.services]
+            for future in as_completed(futures):
+                name = future.result()
+                ok = self.status.get(name) in ("configured", "unchanged")
+                log(f"{name}: {self.status.get(name)}", "SUCCESS" if ok else "WARNING")
+        if self.state is not None:
+            self.state.record(self.fingerprints)
+            self.state.record_secrets(self.secrets)
+        self.elapsed = time.monotonic() - start
+        return dict(self.status)
+
+    def print_summary(self):
+        print()
+        print(f"{'Service':<12} {'Status':<12} {'Ready after':>12}")
+        for name in self.services:
+            timing = self.timings.get(name)
+            ready_after = f"{timing:.1f}s" if timing is not None else "-"
+            print(f"{name:<12} {self.status.get(name, '-'):<12} {ready_after:>12}")
+        print(f"Total: {self.elapsed:.1f}s")
+        ready = {name: t for name, t in self.timings.items() if self.status.get(name) != "unreachable"}
+        if ready:
+            slowest = max(ready, key=ready.get)
+            print(f"Slowest to become ready: {slowest} ({ready[slowest]:.1f}s)")
+        for name, client in self.clients.items():
+            for line in client.format_stats(limit=3):
+                print(f"  {name} {line}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Configure Sonarr, Radarr, Prowlarr and Bazarr in parallel")
+    parser.add_argument(
+        "--config",
+        help="Path to setup.config.json (default: scripts/setup/setup.config.json)",
+    )
+    parser.add_argument("--only", help="Comma-separated list of services to bootstrap")
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Show the changes each service needs without applying them",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Reconcile every service even if nothing changed since the last run",
+    )
+    parser.add_argument(
+        "--state-db",
+        default=DEFAULT_STATE_PATH,
+        help="SQLite file with the fingerprints of the last run",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=30,
+        help=(
+            "Minimum readiness attempts per service; the wait lasts at least max-retries x "
+            "retry-delay seconds"
+        ),
+    )
+    parser.add_argument(
+        "--retry-delay",
+        type=float,
+        default=2,
+        help="Longest delay in seconds between readiness attempts",
+    )
+    args = parser.parse_args()
+
+    load_env()
+    services = load_config(args.config).get("services", {})
+    if args.only:
+        wanted = {s.strip() for s in args.only.split(",") if s.strip()}
+        services = {name: settings for name, settings in services.items() if name in wanted}
+    if not services:
+        log("No services to bootstrap", "WARNING")
+        return
+
+    state = ProvisioningStateStore(args.state_db)
+    bootstrap = Bootstrap(
+        services,
+        max_retries=args.max_retries,
+        retry_delay=args.retry_delay,
+        dry_run=args.plan,
+        state=state,
+        force=args.force,
+    )
+    try:
+        status = bootstrap.run()
+    finally:
+        state.close()
+    bootstrap.print_summary()
+    if any(s not in ("configured", "unchanged") for s in status.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,9 @@ from common import Config, QBitClient
 
 def main():
     config = Config()
-    client = QBitClient(config.base_url, config.qbit_user, config.qbit_pass)
+    client = QBitClient(
+        config.base_url, config.qbit_user, config.qbit_pass, session_cache=config.session_cache_path
+    )
     
     print("Fetching preferences from qBittorrent...")
     prefs = client.get_preferences()
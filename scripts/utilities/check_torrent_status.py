@@ -1,62 +1,281 @@
 import argparse
+import csv
+import io
+import json
+import re
+import shutil
 import sys
 import os
+import time
+from collections import Counter
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from common import Config, QBitClient
-
-def print_table(headers, rows):
-    # Calculate column widths
-    widths = [len(h) for h in headers]
-    for row in rows:
-        for i, val in enumerate(row):
-            widths[i] = max(widths[i], len(str(val)))
-    
-    # Print header
-    header_str = " | ".join(f"{h:<{w}}" for h, w in zip(headers, widths))
-    print(header_str)
-    print("-" * len(header_str))
-    
-    # Print rows
-    for row in rows:
-        print(" | ".join(f"{str(val):<{w}}" for val, w in zip(row, widths)))
+from common import (
+    Config,
+    QBitClient,
+    DEFAULT_PAGE_SIZE,
+    DEFAULT_QBIT_CONCURRENCY,
+    STALLED_STATES,
+    TORRENT_FIELDS,
+    TRACKER_HEALTH_TTL,
+    TorrentStateMirror,
+    DirectoryCache,
+    TorrentFilesCache,
+    TrackerHealthStore,
+    connect_qbit,
+    fetch_torrent_files,
+    fetch_trackers,
+    filter_by_state,
+    format_duration,
+    format_latency_summary,
+    format_size,
+    list_directories,
+    map_path,
+    parse_path_map,
+    scan_tree,
+    search_torrents,
+    walk_files,
+)
 
-def check_all(client):
-    torrents = client.get_torrents()
-    if not torrents:
-        print("No torrents found.")
+# v1 (SHA-1) or v2 (SHA-256) infohash
+HASH_PATTERN = re.compile(r"^(?:[0-9a-fA-F]{40}|[0-9a-fA-F]{64})$")
+
+OUTPUT_FORMATS = ("table", "ndjson", "csv")
+
+class RowWriter:
+    """Write records one at a time as a fixed-width table, NDJSON or CSV.
+
+    ``columns`` describes the table view as ``(header, width, getter)``
+    tuples; cells are truncated to their width so nothing is buffered.
+    NDJSON and CSV write the record dicts themselves, with CSV taking its
+    header from the first record's keys.
+    """
+
+    def __init__(self, columns, fmt="table"):
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {fmt}")
+        self.columns = columns
+        self.fmt = fmt
+        self.count = 0
+        self._buffer = io.StringIO()
+        self._csv = None
+
+    def info(self, message):
+        """Print a status message; machine formats send it to stderr to keep stdout parseable."""
+        print(message, file=sys.stdout if self.fmt == "table" else sys.stderr)
+
+    def _header(self, record):
+        if self.fmt == "table":
+            header_str = " | ".join(f"{h:<{w}}" for h, w, _ in self.columns)
+            print(header_str)
+            print("-" * len(header_str))
+        elif self.fmt == "csv":
+            self._csv = csv.DictWriter(self._buffer, fieldnames=list(record), lineterminator="", extrasaction="ignore")
+            self._csv.writeheader()
+            self._flush_csv()
+
+    def _flush_csv(self):
+        print(self._buffer.getvalue())
+        self._buffer.seek(0)
+        self._buffer.truncate()
+
+    def write(self, record):
+        if not self.count:
+            self._header(record)
+        self.count += 1
+        if self.fmt == "table":
+            print(" | ".join(f"{str(get(record))[:w]:<{w}}" for _, w, get in self.columns))
+        elif self.fmt == "ndjson":
+            print(json.dumps(record, separators=(",", ":")))
+        else:
+            self._csv.writerow({k: json.dumps(v) if isinstance(v, (list, dict)) else v for k, v in record.items()})
+            self._flush_csv()
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+        return self.count
+
+def column(key, header, width, fmt=str):
+    return (header, width, lambda record: fmt(record.get(key, "")))
+
+def percent(value):
+    return f"{(value or 0) * 100:.1f}%"
+
+def instance_of(t):
+    """``{"instance": name}`` for torrents merged from several instances, else {}."""
+    return {"instance": t['instance']} if 'instance' in t else {}
+
+def torrent_issue(t):
+    if t['state'] == 'error':
+        return t.get('error_type', 'Generic Error')
+    elif t['state'] in ['stalledDL', 'metaDL']:
+        return "Stalled"
+    elif t['state'] == 'missingFiles':
+        return "Missing Files"
+    return ""
+
+def check_all(client, page_size=DEFAULT_PAGE_SIZE, fmt="table"):
+    writer = RowWriter(
+        [column("name", "Name", 50), column("state", "State", 18),
+         column("progress", "Progress", 8, percent), column("issue", "Issue", 13)],
+        fmt,
+    )
+    records = (
+        {"hash": t.get('hash', ''), "name": t['name'], "state": t['state'],
+         "progress": t['progress'], "issue": torrent_issue(t), **instance_of(t)}
+        for t in client.iter_torrents(page_size=page_size)
+    )
+    if not writer.write_all(records):
+        writer.info("No torrents found.")
+
+# qBittorrent reports this ETA for torrents that will never finish
+INFINITE_ETA = 8640000
+
+WATCH_COLUMNS = [("Name", 50), ("State", 18), ("Progress", 8), ("Down", 11), ("Up", 11), ("ETA", 8), ("Issue", 13)]
+
+# Sort key and whether the natural order is descending
+WATCH_SORTS = {
+    "name": (lambda t: t.get('name', '').lower(), False),
+    "state": (lambda t: (t.get('state', ''), t.get('name', '').lower()), False),
+    "speed": (lambda t: t.get('dlspeed', 0) + t.get('upspeed', 0), True),
+    "eta": (lambda t: t.get('eta', INFINITE_ETA), False),
+    "progress": (lambda t: t.get('progress', 0), True),
+}
+
+class WatchView:
+    """Terminal view that rewrites only the screen lines that changed.
+
+    Row text is cached per hash and rebuilt only for hashes reported changed
+    by the mirror; each frame is compared line by line with the previous one
+    and only differing lines are redrawn with cursor-positioning escapes.
+    """
+
+    def __init__(self, mirror, sort="name", reverse=False, out=None, height=None):
+        self.mirror = mirror
+        self.key, descending = WATCH_SORTS[sort]
+        self.descending = descending != reverse
+        self.sort = sort
+        self.out = out or sys.stdout
+        self.height = height
+        self.rows = {}
+        self.screen = []
+
+    def format_row(self, t):
+        eta = t.get('eta', INFINITE_ETA)
+        values = [
+            t.get('name', ''),
+            t.get('state', ''),
+            f"{t.get('progress', 0) * 100:.1f}%",
+            f"{format_size(t.get('dlspeed', 0))}/s",
+            f"{format_size(t.get('upspeed', 0))}/s",
+            "-" if eta >= INFINITE_ETA else format_duration(eta),
+            torrent_issue(t),
+        ]
+        return " | ".join(f"{str(val)[:w]:<{w}}" for val, (_, w) in zip(values, WATCH_COLUMNS))
+
+    def frame(self, changed, removed):
+        for hash_val in removed:
+            self.rows.pop(hash_val, None)
+        for hash_val in changed:
+            if hash_val in self.mirror.torrents:
+                self.rows[hash_val] = self.format_row(self.mirror.torrents[hash_val])
+
+        height = self.height or shutil.get_terminal_size((120, 40)).lines
+        order = sorted(self.mirror.torrents.values(), key=self.key, reverse=self.descending)
+        state = self.mirror.server_state
+        header = " | ".join(f"{h:<{w}}" for h, w in WATCH_COLUMNS)
+        lines = [
+            f"{len(order)} torrents | down {format_size(state.get('dl_info_speed', 0))}/s | "
+            f"up {format_size(state.get('up_info_speed', 0))}/s | sort: {self.sort} | Ctrl-C to exit",
+            header,
+            "-" * len(header),
+        ]
+        lines.extend(self.rows[t['hash']] for t in order[:max(height - len(lines) - 1, 0)])
+        return lines
+
+    def render(self, changed, removed):
+        """Draw the next frame; returns the number of lines rewritten."""
+        lines = self.frame(changed, removed)
+        writes = [] if self.screen else ["\x1b[2J"]
+        for i, line in enumerate(lines):
+            if i >= len(self.screen) or self.screen[i] != line:
+                writes.append(f"\x1b[{i + 1};1H{line}\x1b[K")
+        for i in range(len(lines), len(self.screen)):
+            writes.append(f"\x1b[{i + 1};1H\x1b[K")
+        rewritten = len(writes) - (0 if self.screen else 1)
+        self.screen = lines
+        if writes:
+            self.out.write("".join(writes))
+            self.out.flush()
+        return rewritten
+
+    def close(self):
+        # Leave the cursor below the table
+        self.out.write(f"\x1b[{len(self.screen) + 1};1H\n")
+        self.out.flush()
+
+def watch(client, interval=2.0, sort="name", reverse=False, iterations=None, out=None):
+    """Redraw the torrent list every ``interval`` seconds from sync/maindata deltas."""
+    mirror = client if isinstance(client, TorrentStateMirror) else TorrentStateMirror(client, TORRENT_FIELDS)
+    view = WatchView(mirror, sort, reverse, out)
+    ticks = 0
+    try:
+        while True:
+            changed, removed = mirror.sync()
+            view.render(changed, removed)
+            ticks += 1
+            if iterations and ticks >= iterations:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    view.close()
+
+def find_torrents(client, query, limit=20):
+    """Return (torrent, match_type) candidates for a hash, hash prefix or name query."""
+    if HASH_PATTERN.match(query):
+        # Full infohash: let qBittorrent return just that torrent
+        matches = client.get_torrents(hashes=query.lower())
+        target = next(iter(matches), None)
+        if target is not None:
+            return [(target, "hash")]
+
+    # Names cannot be filtered server-side, so match them in one pass over the list
+    torrents = {t['hash']: t for t in client.get_torrents()}
+    return [(torrents[h], match) for h, match in search_torrents(torrents.values(), query, limit)]
+
+def inspect_torrent(client, query, fmt="table"):
+    candidates = find_torrents(client, query)
+    writer = RowWriter(
+        [column("hash", "Hash", 40), column("name", "Name", 50),
+         column("state", "State", 18), column("match", "Match", 12)],
+        fmt,
+    )
+    if not candidates:
+        writer.info(f"Torrent not found: {query}")
         return
 
-    headers = ["Name", "State", "Progress", "Issue"]
-    rows = []
-    
-    for t in torrents:
-        issue = ""
-        if t['state'] == 'error':
-            issue = t.get('error_type', 'Generic Error')
-        elif t['state'] in ['stalledDL', 'metaDL']:
-            issue = "Stalled"
-        elif t['state'] == 'missingFiles':
-            issue = "Missing Files"
-            
-        rows.append([
-            t['name'][:50],
-            t['state'],
-            f"{t['progress']*100:.1f}%",
-            issue
-        ])
-    
-    print_table(headers, rows)
+    if len(candidates) > 1:
+        writer.info(f"Found {len(candidates)} torrents matching '{query}':\n")
+        writer.write_all(
+            {"hash": t['hash'], "name": t['name'], "state": t.get('state', ''), "match": match}
+            for t, match in candidates
+        )
+        writer.info("\nRe-run with a hash (or unique hash prefix) to inspect one torrent.")
+        return
 
-def inspect_torrent(client, query):
-    torrents = client.get_torrents()
-    target = None
-    for t in torrents:
-        if t['hash'] == query or query.lower() in t['name'].lower():
-            target = t
-            break
-            
-    if not target:
-        print(f"Torrent not found: {query}")
+    target = candidates[0][0]
+    trackers = client.get_trackers(target['hash'])
+
+    if fmt != "table":
+        record = {key: target.get(key) for key in (
+            "hash", "name", "state", "progress", "save_path", "content_path", "dlspeed",
+            "num_seeds", "num_complete", "num_leechs", "num_incomplete",
+        )}
+        record["trackers"] = [
+            {key: tr.get(key) for key in ("url", "status", "msg", "num_peers")} for tr in trackers
+        ]
+        writer.write(record)
         return
 
     print(f"\n--- Inspecting: {target['name']} ---")
@@ -70,7 +289,6 @@ def inspect_torrent(client, query):
     print(f"Peers: {target['num_leechs']} (Total: {target['num_incomplete']})")
     
     print("\nTrackers:")
-    trackers = client.get_trackers(target['hash'])
     for tr in trackers:
         print(f"  URL: {tr['url']}")
         print(f"  Status: {tr['status']}")
@@ -78,53 +296,399 @@ def inspect_torrent(client, query):
         print(f"  Peers: {tr['num_peers']}")
         print("-" * 20)
 
-def analyze_stalled(client):
-    torrents = client.get_torrents()
-    stalled = [t for t in torrents if t['state'] in ['stalledDL', 'metaDL']]
-    
-    print(f"Found {len(stalled)} stalled torrents.\n")
+def tracker_status(trackers, dead=None):
+    if not trackers:
+        return "No trackers"
+    working = [tr for tr in trackers if tr['status'] == 2]
+    if working:
+        return f"Working ({len(working)})"
+    msg = trackers[0].get('msg', 'Unknown')
+    if not msg:
+        msg = f"Status: {trackers[0]['status']}"
+    if dead:
+        msg = f"{msg} (dead {format_duration(dead)})"
+    return msg
+
+def analyze_stalled(client, workers=DEFAULT_QBIT_CONCURRENCY, store=None, fmt="table"):
+    writer = RowWriter(
+        [
+            column("name", "Name", 50),
+            ("Seeds", 16, lambda r: f"{r['dlspeed']}/{r['num_seeds']} ({r['num_complete']})"),
+            ("Peers", 12, lambda r: f"{r['num_leechs']} ({r['num_incomplete']})"),
+            column("tracker_status", "Tracker Status", 40),
+        ],
+        fmt,
+    )
+    # 'downloading' covers stalledDL and metaDL; narrow to those two locally
+    torrents = client.get_torrents(filter_by="downloading")
+    stalled = filter_by_state(torrents, STALLED_STATES)
     
-    headers = ["Name", "Seeds", "Peers", "Tracker Status"]
-    rows = []
-
-    for t in stalled:
-        seeds = f"{t['dlspeed']}/{t['num_seeds']} ({t['num_complete']})"
-        peers = f"{t['num_leechs']} ({t['num_incomplete']})"
-        
-        trackers = client.get_trackers(t['hash'])
-        tracker_msg = "No trackers"
-        if trackers:
-            working = [tr for tr in trackers if tr['status'] == 2]
-            if working:
-                tracker_msg = f"Working ({len(working)})"
+    writer.info(f"Found {len(stalled)} stalled torrents.\n")
+
+    trackers_by_hash, latencies = fetch_trackers(client, [t['hash'] for t in stalled], workers, store)
+    if latencies:
+        writer.info(f"Tracker lookups: {format_latency_summary(latencies)}\n")
+    if store and len(latencies) < len(stalled):
+        writer.info(f"Tracker status for {len(stalled) - len(latencies)} torrents reused from {store.path}\n")
+
+    # qBittorrent always lists DHT/PeX/LSD, so an empty list is a failed lookup
+    unverified = [t for t in stalled if not trackers_by_hash.get(t['hash'])]
+    if unverified:
+        writer.info(f"Skipping {len(unverified)} torrents whose tracker lookup failed:")
+        for t in unverified:
+            writer.info(f"  {t['name']}")
+        writer.info("")
+
+    def records():
+        for t in stalled:
+            trackers = trackers_by_hash.get(t['hash'], [])
+            if not trackers:
+                continue
+            working = any(tr['status'] == 2 for tr in trackers)
+            dead = store.dead_for(t['hash']) if store and trackers and not working else None
+            yield {
+                "hash": t['hash'],
+                "name": t['name'],
+                "state": t['state'],
+                "dlspeed": t['dlspeed'],
+                "num_seeds": t['num_seeds'],
+                "num_complete": t['num_complete'],
+                "num_leechs": t['num_leechs'],
+                "num_incomplete": t['num_incomplete'],
+                "tracker_status": tracker_status(trackers, dead),
+                "dead_seconds": dead,
+                **instance_of(t),
+            }
+
+    writer.write_all(records())
+
+def check_torrent_files(torrent, files, listing, path_map=()):
+    """Compare a torrent's wanted files with directory listings.
+
+    Returns ``(missing, size_mismatch)`` where ``missing`` is a list of
+    ``(relative_name, size)`` for files that are not on disk.
+    """
+    missing = []
+    mismatched = 0
+    for f in files:
+        if f.get('priority', 1) == 0:
+            continue
+        path = map_path(os.path.join(torrent['save_path'], f['name']), path_map)
+        entries = listing.get(os.path.dirname(path))
+        size = entries.get(os.path.basename(path), False) if entries else False
+        if size is False or size is None:
+            missing.append((f['name'], f['size']))
+        elif size != f['size']:
+            mismatched += 1
+    return missing, mismatched
+
+def relocation_guess(missing, candidates):
+    """Return ``(matched_files, suggested_save_path)`` for missing files.
+
+    ``candidates`` maps ``(basename, size)`` to paths found on disk. A match
+    whose path ends with the file's relative name votes for the directory it
+    sits under as the torrent's new save path.
+    """
+    matched = 0
+    votes = Counter()
+    for name, size in missing:
+        paths = candidates.get((os.path.basename(name), size), ())
+        if paths:
+            matched += 1
+        for path in paths:
+            if path.endswith(os.sep + name):
+                votes[path[:-len(name) - 1]] += 1
+    if not votes:
+        return matched, None
+    root, count = votes.most_common(1)[0]
+    return matched, root if count * 2 >= len(missing) else None
+
+def diagnose_files(client, query=None, workers=DEFAULT_QBIT_CONCURRENCY, cache=None,
+                   path_map=(), search=(), fmt="table"):
+    writer = RowWriter(
+        [
+            column("name", "Name", 40),
+            ("Missing", 9, lambda r: f"{r['missing_files']}/{r['files']}"),
+            column("missing_bytes", "Missing Size", 12, format_size),
+            column("relocated_matches", "Matches", 7),
+            column("suggested_save_path", "Suggested Save Path", 40, lambda v: v or ""),
+        ],
+        fmt,
+    )
+    if query:
+        torrents = [t for t, _ in find_torrents(client, query)]
+    else:
+        # 'errored' covers error and missingFiles; narrow to missingFiles locally
+        torrents = filter_by_state(client.get_torrents(filter_by="errored"), {"missingFiles"})
+    if not torrents:
+        writer.info("No torrents with missing files.")
+        return
+
+    writer.info(f"Checking files of {len(torrents)} torrents...")
+    files_by_hash = fetch_torrent_files(client, [t['hash'] for t in torrents], workers, cache)
+    directories = {
+        os.path.dirname(map_path(os.path.join(t['save_path'], f['name']), path_map))
+        for t in torrents for f in files_by_hash.get(t['hash'], [])
+    }
+    listing = list_directories(directories, workers)
+    results = [(t, *check_torrent_files(t, files_by_hash.get(t['hash'], []), listing, path_map)) for t in torrents]
+
+    candidates = {}
+    wanted = {(os.path.basename(name), size) for _, missing, _ in results for name, size in missing}
+    if wanted:
+        roots = search or sorted({map_path(t['save_path'], path_map) for t in torrents})
+        writer.info(f"Searching {', '.join(roots)} for relocated files...")
+        for path, size in walk_files(roots, workers):
+            key = (os.path.basename(path), size)
+            if key in wanted:
+                candidates.setdefault(key, []).append(path)
+
+    def records():
+        for t, missing, mismatched in results:
+            matched, suggestion = relocation_guess(missing, candidates)
+            yield {
+                "hash": t['hash'],
+                "name": t['name'],
+                "state": t.get('state', ''),
+                "files": len(files_by_hash.get(t['hash'], [])),
+                "missing_files": len(missing),
+                "missing_bytes": sum(size for _, size in missing),
+                "size_mismatch": mismatched,
+                "relocated_matches": matched,
+                "suggested_save_path": suggestion,
+                **instance_of(t),
+            }
+
+    writer.write_all(records())
+
+def claimed_paths(torrents, files_by_hash, path_map=()):
+    """Return ``(files, directories, subtrees)`` referenced by any torrent, as local paths.
+
+    A torrent whose file list could not be fetched (an empty list) claims
+    its whole ``content_path`` (or ``save_path/name``) as a subtree, so its
+    data is never reported as orphaned.
+    """
+    files = set()
+    directories = set()
+    subtrees = set()
+
+    def claim_parents(path):
+        parent = os.path.dirname(path)
+        while parent not in directories and parent != os.path.dirname(parent):
+            directories.add(parent)
+            parent = os.path.dirname(parent)
+
+    for t in torrents:
+        torrent_files = files_by_hash.get(t['hash'])
+        if not torrent_files:
+            content = t.get('content_path') or os.path.join(t['save_path'], t.get('name', ''))
+            path = map_path(content.rstrip(os.sep), path_map)
+            subtrees.add(path)
+            files.add(path + ".!qB")
+            claim_parents(path)
+            continue
+        for f in torrent_files:
+            path = map_path(os.path.join(t['save_path'], f['name']), path_map)
+            files.add(path)
+            # qBittorrent can keep an incomplete file under a .!qB suffix
+            files.add(path + ".!qB")
+            claim_parents(path)
+    return files, directories, subtrees
+
+def directory_totals(listing):
+    """Map each listed directory to ``(bytes, files)`` including subdirectories."""
+    totals = {}
+    for directory in sorted(listing, key=lambda d: d.count(os.sep), reverse=True):
+        size = count = 0
+        for name, entry_size in listing[directory].items():
+            if entry_size is None:
+                sub_size, sub_count = totals.get(os.path.join(directory, name), (0, 0))
+                size += sub_size
+                count += sub_count
             else:
-                tracker_msg = trackers[0].get('msg', 'Unknown')
-                if not tracker_msg:
-                    tracker_msg = f"Status: {trackers[0]['status']}"
-        
-        rows.append([t['name'][:50], seeds, peers, tracker_msg])
-        
-    print_table(headers, rows)
+                size += entry_size
+                count += 1
+        totals[directory] = (size, count)
+    return totals
+
+def find_orphans(client, roots=(), workers=DEFAULT_QBIT_CONCURRENCY, files_cache=None, dir_cache=None,
+                 path_map=(), fmt="table"):
+    writer = RowWriter(
+        [column("type", "Type", 9), column("size", "Size", 10, format_size),
+         column("files", "Files", 6), column("path", "Path", 80)],
+        fmt,
+    )
+    torrents = list(client.get_torrents())
+    writer.info(f"Collecting file lists for {len(torrents)} torrents...")
+    files_by_hash = fetch_torrent_files(client, [t['hash'] for t in torrents], workers, files_cache)
+    claimed_files, claimed_dirs, claimed_trees = claimed_paths(torrents, files_by_hash, path_map)
+    unverified = [t for t in torrents if not files_by_hash.get(t['hash'])]
+    if unverified:
+        writer.info(f"File lists unavailable for {len(unverified)} torrents; their whole content path is treated as claimed (unverified):")
+        for t in unverified:
+            writer.info(f"  {t['name']}")
+
+    roots = sorted(set(roots or (map_path(t['save_path'], path_map) for t in torrents)))
+    # Skip roots nested inside another root
+    roots = [r for r in roots if not any(r.startswith(other.rstrip(os.sep) + os.sep) for other in roots)]
+    listing, rescanned = scan_tree(roots, workers, dir_cache)
+    writer.info(f"Scanned {len(listing)} directories under {', '.join(roots)} ({rescanned} changed since last scan).")
+    totals = directory_totals(listing)
+
+    def records():
+        stack = [r for r in reversed(roots) if r in listing]
+        while stack:
+            directory = stack.pop()
+            for name, size in sorted(listing[directory].items()):
+                path = os.path.join(directory, name)
+                if path in claimed_trees:
+                    continue
+                if size is None:
+                    if path in claimed_dirs or path in claimed_files:
+                        stack.append(path)
+                    else:
+                        total, count = totals.get(path, (0, 0))
+                        yield {"type": "directory", "path": path, "size": total, "files": count}
+                elif path not in claimed_files:
+                    yield {"type": "file", "path": path, "size": size, "files": 1}
+
+    orphan_bytes = 0
+    orphans = 0
+    for record in records():
+        writer.write(record)
+        orphans += 1
+        orphan_bytes += record["size"]
+    writer.info(f"{orphans} orphaned entries, {format_size(orphan_bytes)} unreferenced.")
 
 def main():
     parser = argparse.ArgumentParser(description="Check torrent status")
-    parser.add_argument("action", choices=["all", "inspect", "stalled"], default="all", nargs="?", help="Action to perform")
-    parser.add_argument("--query", "-q", help="Hash or name for inspection")
+    parser.add_argument(
+        "action",
+        choices=["all", "inspect", "stalled", "files", "orphans"],
+        default="all",
+        nargs="?",
+        help="Action to perform",
+    )
+    parser.add_argument(
+        "--query",
+        "-q",
+        help="Hash or name for inspection (or to pick torrents for 'files')",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=DEFAULT_PAGE_SIZE,
+        help="Torrents fetched per request for 'all'",
+    )
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="table",
+        help="Output format for every action (--watch always draws a table)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep 'all' on screen, updating from incremental sync",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=2.0,
+        help="Seconds between updates in --watch mode",
+    )
+    parser.add_argument(
+        "--sort",
+        choices=sorted(WATCH_SORTS),
+        default="name",
+        help="Sort column in --watch mode",
+    )
+    parser.add_argument("--reverse", action="store_true", help="Reverse the --sort order")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_QBIT_CONCURRENCY,
+        help="Concurrent qBittorrent requests for 'stalled', 'files' and 'orphans'",
+    )
+    parser.add_argument(
+        "--path-map",
+        action="append",
+        metavar="FROM=TO",
+        help="Translate qBittorrent paths to local paths for 'files' and 'orphans' (repeatable)",
+    )
+    parser.add_argument(
+        "--search",
+        action="append",
+        metavar="PATH",
+        help="Directories searched for relocated files (default: the save paths)",
+    )
+    parser.add_argument(
+        "--root",
+        action="append",
+        metavar="PATH",
+        help="Directories scanned by 'orphans' (default: the torrents' save paths)",
+    )
+    parser.add_argument(
+        "--tracker-ttl",
+        type=int,
+        default=TRACKER_HEALTH_TTL,
+        help="Seconds stored tracker status is reused for 'stalled' (0 = always query)",
+    )
     
     args = parser.parse_args()
     
     config = Config()
-    client = QBitClient(config.base_url, config.qbit_user, config.qbit_pass)
+    client = connect_qbit(
+        config,
+        QBitClient,
+        fields=TORRENT_FIELDS,
+        session_cache=config.session_cache_path,
+        pool_size=args.workers,
+    )
     
-    if args.action == "all":
-        check_all(client)
-    elif args.action == "inspect":
-        if not args.query:
-            print("Error: --query is required for inspect")
-            return
-        inspect_torrent(client, args.query)
-    elif args.action == "stalled":
-        analyze_stalled(client)
+    try:
+        if args.action == "all" and args.watch:
+            watch(client, interval=args.interval, sort=args.sort, reverse=args.reverse)
+        elif args.action == "all":
+            check_all(client, page_size=args.page_size, fmt=args.format)
+        elif args.action == "inspect":
+            if not args.query:
+                print("Error: --query is required for inspect")
+                return
+            inspect_torrent(client, args.query, fmt=args.format)
+        elif args.action == "stalled":
+            store = TrackerHealthStore(config.tracker_health_path, ttl=args.tracker_ttl)
+            analyze_stalled(client, workers=args.workers, store=store, fmt=args.format)
+            store.close()
+        elif args.action == "files":
+            try:
+                path_map = parse_path_map(args.path_map)
+            except ValueError as e:
+                print(f"Error: {e}")
+                return
+            cache = TorrentFilesCache(config.torrent_files_path)
+            diagnose_files(
+                client, args.query, workers=args.workers, cache=cache,
+                path_map=path_map, search=args.search or (), fmt=args.format,
+            )
+            cache.close()
+        elif args.action == "orphans":
+            try:
+                path_map = parse_path_map(args.path_map)
+            except ValueError as e:
+                print(f"Error: {e}")
+                return
+            files_cache = TorrentFilesCache(config.torrent_files_path)
+            dir_cache = DirectoryCache(config.directory_cache_path)
+            find_orphans(
+                client, args.root or (), workers=args.workers, files_cache=files_cache,
+                dir_cache=dir_cache, path_map=path_map, fmt=args.format,
+            )
+            files_cache.close()
+            dir_cache.close()
+    finally:
+        client.close()
+
 
 if __name__ == "__main__":
     main()
@@ -2,34 +2,314 @@ import argparse
 import sys
 import os
 import glob
+import time
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from common import Config, QBitClient
+from common import (
+    Config,
+    QBitClient,
+    DEFAULT_QBIT_CONCURRENCY,
+    STALLED_STATES,
+    TORRENT_FIELDS,
+    TRACKER_HEALTH_TTL,
+    TorrentHistory,
+    TrackerHealthStore,
+    connect_qbit,
+    fetch_trackers,
+    filter_by_state,
+    format_duration,
+    format_latency_summary,
+    format_size,
+    loaded_infohashes,
+    parse_path_map,
+    path_device,
+    scan_torrent_hashes,
+)
 
-def fix_paths(client, config):
+MOVING_STATES = {"moving"}
+
+# Downloads qBittorrent is actually trying to fetch; paused, queued and checking ones sit still on purpose
+OBSERVED_STATES = STALLED_STATES | {"downloading", "forcedDL", "forcedMetaDL"}
+
+def _needs_fixing(t, config):
+    """Return the target save path for a torrent on the old bad path, else None."""
+    current_path = t['save_path']
+    if current_path != config.default_save_path:
+        # Only fix if it looks like the old bad path or user explicitly wants to normalize
+        if "/downloads/" in current_path and "/media/" not in current_path:
+            return config.default_save_path
+    return None
+
+class RelocationPlanner:
+    """Group setLocation calls by target path and throttle cross-device moves.
+
+    A move within one filesystem is a rename, so every such torrent for a
+    target goes out in a single request. Moves across devices copy the data;
+    those are fed to qBittorrent ``max_moving`` at a time and tracked until
+    they leave the ``moving`` state. Devices are looked up through
+    ``path_map``; a move whose device cannot be resolved counts as a copy.
+    """
+
+    def __init__(self, client, max_moving=2, poll_interval=10, path_map=()):
+        self.client = client
+        self.max_moving = max_moving
+        self.poll_interval = poll_interval
+        self.path_map = path_map
+        self.renames = {}  # target -> [torrent]
+        self.copies = []   # [(target, torrent)], largest last
+        self.sizes = {}
+
+    def plan(self, torrents, target_for):
+        """Classify each torrent ``target_for`` maps to a new path; returns the count."""
+        devices = {}
+
+        def device(path):
+            if path not in devices:
+                devices[path] = path_device(path, self.path_map)
+            return devices[path]
+
+        for t in torrents:
+            target = target_for(t)
+            if not target:
+                continue
+            self.sizes[t['hash']] = t.get('size', 0) or 0
+            source = device(t.get('save_path') or "")
+            if source is not None and source == device(target):
+                self.renames.setdefault(target, []).append(t)
+            else:
+                self.copies.append((target, t))
+        # Smallest copies first, popped from the end
+        self.copies.sort(key=lambda item: item[1].get('size', 0) or 0, reverse=True)
+        return len(self.sizes)
+
+    def print_plan(self):
+        for target, torrents in self.renames.items():
+            print(f"Rename {len(torrents)} torrents to {target} (same filesystem, 1 request)")
+        targets = {}
+        for target, t in self.copies:
+            count, size = targets.get(target, (0, 0))
+            targets[target] = (count + 1, size + (t.get('size', 0) or 0))
+        for target, (count, size) in targets.items():
+            print(
+                f"Copy {count} torrents ({format_size(size)}) to {target} "
+                f"(cross-device, {self.max_moving or 'all'} at a time)"
+            )
+        for t in self.planned():
+            print(f"  {t['name']}: {t['save_path']}")
+
+    def planned(self):
+        for torrents in self.renames.values():
+            yield from torrents
+        for _, t in reversed(self.copies):
+            yield t
+
+    def _send(self, moves):
+        """Issue one setLocation per target for ``[(target, hash)]``."""
+        by_target = {}
+        for target, hash_val in moves:
+            by_target.setdefault(target, []).append(hash_val)
+        for target, hashes in by_target.items():
+            self.client.set_location("|".join(hashes), target)
+
+    def _poll(self, hashes):
+        """Return {hash: state} for the given hashes."""
+        if not hashes:
+            return {}
+        return {t['hash']: t.get('state') for t in self.client.get_torrents(hashes=list(hashes))}
+
+    def run(self):
+        for target, torrents in self.renames.items():
+            self._send([(target, t['hash']) for t in torrents])
+        if not self.copies:
+            return
+        if self.max_moving <= 0:
+            self._send([(target, t['hash']) for target, t in self.copies])
+            return
+
+        total = len(self.copies)
+        total_bytes = sum(self.sizes[t['hash']] for _, t in self.copies)
+        in_flight = {}  # hash -> polls since submitted while not seen moving
+        done = 0
+        done_bytes = 0
+        start = time.monotonic()
+
+        while True:
+            states = self._poll(in_flight)
+            for hash_val in list(in_flight):
+                if states.get(hash_val) in MOVING_STATES:
+                    in_flight[hash_val] = -1
+                elif in_flight[hash_val] == -1 or in_flight[hash_val] >= 1:
+                    # Seen moving and now finished, or never started after a grace poll
+                    del in_flight[hash_val]
+                    done += 1
+                    done_bytes += self.sizes[hash_val]
+                else:
+                    in_flight[hash_val] += 1
+
+            batch = []
+            while self.copies and len(in_flight) + len(batch) < self.max_moving:
+                target, t = self.copies.pop()
+                batch.append((target, t['hash']))
+            if batch:
+                self._send(batch)
+                for _, hash_val in batch:
+                    in_flight[hash_val] = 0
+
+            elapsed = time.monotonic() - start
+            remaining = total_bytes - done_bytes
+            eta = format_duration(remaining / (done_bytes / elapsed)) if done_bytes and elapsed else "unknown"
+            print(f"Moved {done}/{total} torrents, {format_size(remaining)} left, ETA {eta}")
+            if not in_flight and not self.copies:
+                break
+            time.sleep(self.poll_interval)
+
+def fix_paths(client, config, dry_run=False, max_moving=2, poll_interval=10, path_map=()):
     torrents = client.get_torrents()
-    count = 0
-    for t in torrents:
-        # Logic from fix_paths_bulk.py
-        # If save_path is wrong, we might need to delete and re-add or setLocation
-        # The previous script deleted and re-added from backup.
-        # But setLocation is safer if the torrent is still in the list.
-        
-        # Check if path is invalid (e.g. /downloads/incomplete)
-        current_path = t['save_path']
-        if current_path != config.default_save_path:
-             # Only fix if it looks like the old bad path or user explicitly wants to normalize
-             if "/downloads/" in current_path and "/media/" not in current_path:
-                 print(f"Fixing path for {t['name']}...")
-                 client.set_location(t['hash'], config.default_save_path)
-                 count += 1
+    # setLocation is safer than the old delete and re-add from backup while
+    # the torrent is still in the list
+    planner = RelocationPlanner(client, max_moving, poll_interval, path_map)
+    count = planner.plan(torrents, lambda t: _needs_fixing(t, config))
+    if dry_run:
+        planner.print_plan()
+        print(f"Dry run: would fix paths for {count} torrents.")
+        return
+    for t in planner.planned():
+        print(f"Fixing path for {t['name']}...")
+    planner.run()
     print(f"Fixed paths for {count} torrents.")
 
-def recheck_all(client):
+CHECKING_STATES = {"checkingUP", "checkingDL", "checkingResumeData"}
+
+class RecheckScheduler:
+    """Feed rechecks to qBittorrent a few torrents at a time per block device.
+
+    Torrents are grouped by the ``st_dev`` of their save path and ordered by
+    size (smallest first by default) or queue priority. Each poll tops every
+    device up to ``max_active`` torrents in a checking state, so one array is
+    never asked to hash the whole library at once and downloads keep flowing.
+    Save paths are translated with ``path_map`` first; torrents whose device
+    cannot be resolved locally share one queue.
+    """
+
+    ORDERS = {
+        "size": lambda t: t.get('size', 0),
+        "size-desc": lambda t: -t.get('size', 0),
+        "priority": lambda t: (t.get('priority', 0) <= 0, t.get('priority', 0)),
+    }
+
+    def __init__(self, client, max_active=2, order="size", poll_interval=10, path_map=()):
+        self.client = client
+        self.max_active = max_active
+        self.order = order
+        self.poll_interval = poll_interval
+        self.path_map = path_map
+        self.queues = {}
+        self.sizes = {}
+        self.device_of = {}
+        self.total_bytes = 0
+
+    def plan(self, torrents):
+        """Group torrents into per-device queues; returns the number queued."""
+        key = self.ORDERS[self.order]
+        devices = {}
+        for t in torrents:
+            save_path = t.get('save_path') or ""
+            if save_path not in devices:
+                devices[save_path] = path_device(save_path, self.path_map)
+            device = devices[save_path]
+            self.queues.setdefault(device, []).append(t)
+            self.sizes[t['hash']] = t.get('size', 0) or 0
+            self.device_of[t['hash']] = device
+        for queue in self.queues.values():
+            queue.sort(key=key)
+            # Pop from the end, so reverse once instead of shifting the front
+            queue.reverse()
+        self.total_bytes = sum(self.sizes.values())
+        return len(self.sizes)
+
+    def _poll(self, hashes):
+        """Return {hash: (state, progress)} for the given hashes."""
+        if not hashes:
+            return {}
+        return {
+            t['hash']: (t.get('state'), t.get('progress', 0) or 0)
+            for t in self.client.get_torrents(hashes=list(hashes))
+        }
+
+    def run(self):
+        total = len(self.sizes)
+        if not total:
+            return
+        in_flight = {}  # hash -> polls since submitted while not seen checking
+        done_bytes = 0
+        done = 0
+        start = time.monotonic()
+
+        while True:
+            states = self._poll(in_flight)
+            checking_bytes = 0
+            for hash_val in list(in_flight):
+                state, progress = states.get(hash_val, (None, 0))
+                if state in CHECKING_STATES:
+                    in_flight[hash_val] = -1
+                    checking_bytes += self.sizes[hash_val] * progress
+                elif in_flight[hash_val] == -1 or in_flight[hash_val] >= 1:
+                    # Seen checking and now finished, or never started after a grace poll
+                    del in_flight[hash_val]
+                    done += 1
+                    done_bytes += self.sizes[hash_val]
+                else:
+                    in_flight[hash_val] += 1
+
+            active = {}
+            for hash_val in in_flight:
+                device = self.device_of[hash_val]
+                active[device] = active.get(device, 0) + 1
+            batch = []
+            for device, queue in self.queues.items():
+                while queue and active.get(device, 0) < self.max_active:
+                    batch.append(queue.pop()['hash'])
+                    active[device] = active.get(device, 0) + 1
+            if batch:
+                self.client.recheck_torrent("|".join(batch))
+                for hash_val in batch:
+                    in_flight[hash_val] = 0
+
+            self._report(done, total, done_bytes + checking_bytes, start)
+            if not in_flight and not any(self.queues.values()):
+                break
+            time.sleep(self.poll_interval)
+
+        print(f"Recheck finished: {total} torrents in {format_duration(time.monotonic() - start)}.")
+
+    def _report(self, done, total, checked_bytes, start):
+        elapsed = time.monotonic() - start
+        remaining = max(self.total_bytes - checked_bytes, 0)
+        eta = "unknown"
+        if checked_bytes > 0 and elapsed > 0:
+            eta = format_duration(remaining / (checked_bytes / elapsed))
+        percent = checked_bytes / self.total_bytes * 100 if self.total_bytes else done / total * 100
+        print(
+            f"Rechecked {done}/{total} torrents ({percent:.1f}%), "
+            f"{format_size(remaining)} left, ETA {eta}"
+        )
+
+def recheck_all(client, max_active=2, order="size", poll_interval=10, path_map=()):
     torrents = client.get_torrents()
-    hashes = "|".join([t['hash'] for t in torrents])
-    if hashes:
+    if not torrents:
+        return
+    if max_active <= 0:
+        # Unthrottled: hand everything to qBittorrent in one request
         print(f"Rechecking {len(torrents)} torrents...")
-        client.recheck_torrent(hashes)
+        client.recheck_torrent("|".join([t['hash'] for t in torrents]))
+        return
+
+    scheduler = RecheckScheduler(client, max_active, order, poll_interval, path_map)
+    scheduler.plan(torrents)
+    print(
+        f"Rechecking {len(torrents)} torrents on {len(scheduler.queues)} device(s), "
+        f"{max_active} at a time per device..."
+    )
+    scheduler.run()
 
 def announce_all(client):
     torrents = client.get_torrents()
@@ -38,19 +318,75 @@ def announce_all(client):
         print(f"Reannouncing {len(torrents)} torrents...")
         client.reannounce_torrent(hashes)
 
-def delete_broken(client, delete_files=False):
-    torrents = client.get_torrents()
-    stalled = [t for t in torrents if t['state'] in ['stalledDL', 'metaDL']]
+def observe_downloads(client, minutes, poll_interval=60):
+    """Sample downloading torrents for ``minutes``; returns (history, candidates).
+
+    Candidates are the latest torrents that were in one of OBSERVED_STATES in
+    every sample, so paused, queued or checking downloads are never judged.
+    """
+    window = minutes * 60
+    history = TorrentHistory(capacity=int(window / max(poll_interval, 1)) + 3)
+    observed = {}  # hash -> samples taken in an observed state
+    rounds = 0
+    first = None
+    while True:
+        torrents = client.get_torrents(filter_by="downloading")
+        now = time.monotonic()
+        history.record(torrents, now)
+        rounds += 1
+        for t in torrents:
+            if t.get('state') in OBSERVED_STATES:
+                observed[t['hash']] = observed.get(t['hash'], 0) + 1
+        if first is None:
+            first = now
+        # Measure from the first sample, not the first request, so the samples span the window
+        remaining = window - (now - first)
+        if remaining <= 0:
+            return history, [t for t in torrents if observed.get(t['hash']) == rounds]
+        time.sleep(min(poll_interval, remaining))
+
+def delete_broken(client, delete_files=False, workers=DEFAULT_QBIT_CONCURRENCY, store=None, dead_days=0,
+                  observe_minutes=0, poll_interval=60):
+    if observe_minutes > 0:
+        # Judge by progress over the window rather than a state that may flap
+        print(f"Watching downloads for {observe_minutes:g} minutes...")
+        history, torrents = observe_downloads(client, observe_minutes, poll_interval)
+        stalled = [t for t in torrents if history.no_progress(t['hash'], observe_minutes * 60)]
+    else:
+        # 'downloading' covers stalledDL and metaDL; narrow to those two locally
+        torrents = client.get_torrents(filter_by="downloading")
+        stalled = filter_by_state(torrents, STALLED_STATES)
     hashes_to_delete = []
     
     print(f"Analyzing {len(stalled)} stalled torrents...")
+    trackers_by_hash, latencies = fetch_trackers(client, [t['hash'] for t in stalled], workers, store)
+    if latencies:
+        print(f"Tracker lookups: {format_latency_summary(latencies)}")
+
+    unverified = []
     for t in stalled:
-        trackers = client.get_trackers(t['hash'])
+        trackers = trackers_by_hash.get(t['hash'], [])
+        if not trackers:
+            # qBittorrent always lists DHT/PeX/LSD, so an empty list is a failed lookup
+            unverified.append(t)
+            continue
         has_working = any(tr['status'] == 2 for tr in trackers)
         
         if not has_working:
+            if dead_days > 0:
+                # Require a history of failure, not just one bad snapshot
+                dead = store.dead_for(t['hash']) if store else None
+                if dead is None or dead < dead_days * 86400:
+                    age = format_duration(dead) if dead else "just now"
+                    print(f"Keeping {t['name']}: trackers failing since {age}")
+                    continue
             print(f"Marking for deletion: {t['name']}")
             hashes_to_delete.append(t['hash'])
+
+    if unverified:
+        print(f"Skipping {len(unverified)} torrents whose tracker lookup failed:")
+        for t in unverified:
+            print(f"  {t['name']}")
             
     if hashes_to_delete:
         print(f"Deleting {len(hashes_to_delete)} torrents...")
@@ -58,7 +394,7 @@ def delete_broken(client, delete_files=False):
     else:
         print("No broken torrents found.")
 
-def add_missing(client, config, scan_path=None):
+def add_missing(client, config, scan_path=None, workers=None, category=None, tags=None):
     target_path = scan_path if scan_path else config.default_scan_path
     
     if not target_path:
@@ -76,47 +412,180 @@ def add_missing(client, config, scan_path=None):
         print("No .torrent files found.")
         return
 
-    print(f"Found {len(files)} .torrent files. Adding them...")
-    
-    count = 0
+    print(f"Found {len(files)} .torrent files. Hashing them locally...")
+    hashes = scan_torrent_hashes(files, workers)
+    loaded = loaded_infohashes(client.get_torrents())
+
+    missing = []
     for fpath in files:
-        if client.add_torrent_file(fpath, config.default_save_path):
+        result = hashes[fpath]
+        if isinstance(result, Exception):
+            # Let qBittorrent decide what to do with files we could not parse
+            print(f"Could not parse {os.path.basename(fpath)} ({result}); uploading anyway.")
+            missing.append(fpath)
+        elif not any(h and h[:40] in loaded for h in result):
+            missing.append(fpath)
+
+    print(f"{len(files) - len(missing)} already loaded, adding {len(missing)}...")
+    if not missing:
+        print("Processed 0 .torrent files.")
+        return
+
+    results = client.add_torrent_files(
+        missing, save_path=config.default_save_path, category=category, tags=tags
+    )
+    count = 0
+    for fpath in missing:
+        status = results.get(fpath, "failed")
+        if status == "added":
             count += 1
+        else:
+            print(f"Failed to add {os.path.basename(fpath)}: {status}")
     
     print(f"Processed {count} .torrent files.")
-        # We don't know if it was new or not without checking hash, but this ensures they are added.
-    
-    print(f"Processed {len(files)} .torrent files.")
 
 def main():
     parser = argparse.ArgumentParser(description="Manage torrents")
     subparsers = parser.add_subparsers(dest="command", required=True)
     
-    subparsers.add_parser("fix-paths", help="Fix save paths for torrents")
-    subparsers.add_parser("recheck", help="Force recheck all torrents")
+    fix_parser = subparsers.add_parser("fix-paths", help="Fix save paths for torrents")
+    fix_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the relocation plan without moving anything",
+    )
+    fix_parser.add_argument(
+        "--max-moving",
+        type=int,
+        default=2,
+        help="Cross-device moves in flight at once (0 = all at once)",
+    )
+    fix_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=10,
+        help="Seconds between progress polls",
+    )
+    fix_parser.add_argument(
+        "--path-map",
+        action="append",
+        metavar="FROM=TO",
+        help="Translate qBittorrent paths to local paths for the device check (repeatable)",
+    )
+    recheck_parser = subparsers.add_parser("recheck", help="Force recheck all torrents")
+    recheck_parser.add_argument(
+        "--max-active",
+        type=int,
+        default=2,
+        help="Torrents checking at once per device (0 = all at once)",
+    )
+    recheck_parser.add_argument(
+        "--order",
+        choices=sorted(RecheckScheduler.ORDERS),
+        default="size",
+        help="Queue order within each device",
+    )
+    recheck_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=10,
+        help="Seconds between progress polls",
+    )
+    recheck_parser.add_argument(
+        "--path-map",
+        action="append",
+        metavar="FROM=TO",
+        help="Translate qBittorrent paths to local paths for the device check (repeatable)",
+    )
     subparsers.add_parser("announce", help="Force reannounce all torrents")
     
-    del_parser = subparsers.add_parser("delete-broken", help="Delete stalled torrents with no working trackers")
+    del_parser = subparsers.add_parser(
+        "delete-broken",
+        help="Delete stalled torrents with no working trackers",
+    )
     del_parser.add_argument("--delete-files", action="store_true", help="Also delete files on disk")
+    del_parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_QBIT_CONCURRENCY,
+        help="Concurrent tracker lookups",
+    )
+    del_parser.add_argument(
+        "--dead-days",
+        type=float,
+        default=0,
+        help="Only delete torrents whose trackers have failed for this many days",
+    )
+    del_parser.add_argument(
+        "--observe",
+        type=float,
+        default=0,
+        help=(
+            "Minutes to watch downloads; only torrents without progress for the whole window are "
+            "candidates"
+        ),
+    )
+    del_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=60,
+        help="Seconds between samples while observing",
+    )
+    del_parser.add_argument(
+        "--tracker-ttl",
+        type=int,
+        default=TRACKER_HEALTH_TTL,
+        help="Seconds stored tracker status is reused (0 = always query)",
+    )
     
     add_parser = subparsers.add_parser("add-missing", help="Scan folder and add missing torrents")
     add_parser.add_argument("--path", help="Path to scan for .torrent files (overrides default)")
+    add_parser.add_argument(
+        "--workers",
+        type=int,
+        help="Processes used to hash large directories (default: CPU count)",
+    )
+    add_parser.add_argument("--category", help="Category assigned to added torrents")
+    add_parser.add_argument("--tags", help="Comma-separated tags assigned to added torrents")
     
     args = parser.parse_args()
+    try:
+        path_map = parse_path_map(getattr(args, "path_map", None))
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
     
     config = Config()
-    client = QBitClient(config.base_url, config.qbit_user, config.qbit_pass)
+    client = connect_qbit(
+        config,
+        QBitClient,
+        fields=TORRENT_FIELDS,
+        session_cache=config.session_cache_path,
+        # add-missing's --workers counts hashing processes, not requests
+        pool_size=args.workers if args.command == "delete-broken" else DEFAULT_QBIT_CONCURRENCY,
+    )
     
-    if args.command == "fix-paths":
-        fix_paths(client, config)
-    elif args.command == "recheck":
-        recheck_all(client)
-    elif args.command == "announce":
-        announce_all(client)
-    elif args.command == "delete-broken":
-        delete_broken(client, args.delete_files)
-    elif args.command == "add-missing":
-        add_missing(client, config, args.path)
+    try:
+        if args.command == "fix-paths":
+            fix_paths(client, config, args.dry_run, args.max_moving, args.poll_interval, path_map=path_map)
+        elif args.command == "recheck":
+            recheck_all(client, args.max_active, args.order, args.poll_interval, path_map=path_map)
+        elif args.command == "announce":
+            announce_all(client)
+        elif args.command == "delete-broken":
+            store = TrackerHealthStore(config.tracker_health_path, ttl=args.tracker_ttl)
+            delete_broken(
+                client, args.delete_files, workers=args.workers, store=store, dead_days=args.dead_days,
+                observe_minutes=args.observe, poll_interval=args.poll_interval,
+            )
+            store.close()
+        elif args.command == "add-missing":
+            add_missing(
+                client, config, args.path, workers=args.workers, category=args.category, tags=args.tags
+            )
+    finally:
+        client.close()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+qBittorrent Prometheus Exporter
+
+Serves qBittorrent metrics on /metrics from a snapshot rebuilt in the
+background, so a scrape never touches the qBittorrent API.
+
+Features:
+- Follows sync/maindata with a rid cursor; each refresh only transfers changes.
+- Aggregates are adjusted per changed torrent instead of recomputed.
+- Per-state counts, per-category and per-tracker throughput, swarm health.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import (
+    Config,
+    QBitClient,
+    TorrentStateMirror,
+)
+
+DEFAULT_PORT = 8090
+DEFAULT_INTERVAL = 15
+
+# Only the maindata keys the aggregates need are kept in the mirror
+EXPORTER_FIELDS = {
+    "state", "category", "tracker", "dlspeed", "upspeed", "progress",
+    "availability", "num_complete", "num_incomplete",
+}
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def tracker_host(url):
+    """Reduce a tracker URL to its host to keep label cardinality bounded."""
+    if not url:
+        return ""
+    return urlparse(url).hostname or url
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class MetricsCollector:
+    """Keep running aggregates over a TorrentStateMirror and render them.
+
+    Every torrent's contribution to the aggregates is remembered, so a refresh
+    subtracts the old contribution and adds the new one only for hashes that
+    sync/maindata reported as changed or removed. The rendered text is cached
+    in ``snapshot`` for the HTTP handler.
+    """
+
+    def __init__(self, client):
+        self.mirror = TorrentStateMirror(client, EXPORTER_FIELDS)
+        self.contributions = {}
+        self.states = Counter()
+        self.categories = {}  # name -> [torrents, dlspeed, upspeed]
+        self.trackers = {}    # host -> [torrents, dlspeed, upspeed]
+        self.swarm = Counter()
+        self.up = 0
+        self.last_sync = 0.0
+        self.sync_duration = 0.0
+        self.sync_errors = 0
+        self.lock = threading.Lock()
+        self.snapshot = self.render().encode()
+
+    def _contribution(self, t):
+        incomplete = (t.get("progress", 0) or 0) < 1
+        availability = t.get("availability", -1)
+        return (
+            t.get("state", "unknown"),
+            t.get("category", ""),
+            tracker_host(t.get("tracker", "")),
+            t.get("dlspeed", 0) or 0,
+            t.get("upspeed", 0) or 0,
+            t.get("num_complete", 0) or 0,
+            t.get("num_incomplete", 0) or 0,
+            int(incomplete and (t.get("num_complete", 0) or 0) == 0),
+            int(incomplete and availability is not None and 0 <= availability < 1),
+        )
+
+    def _apply(self, contribution, sign):
+        state, category, tracker, dlspeed, upspeed, seeds, leechers, seedless, unavailable = contribution
+        self.states[state] += sign
+        for table, key in ((self.categories, category), (self.trackers, tracker)):
+            totals = table.setdefault(key, [0, 0, 0])
+            totals[0] += sign
+            totals[1] += sign * dlspeed
+            totals[2] += sign * upspeed
+            if totals[0] <= 0:
+                del table[key]
+        self.swarm["seeds"] += sign * seeds
+        self.swarm["leechers"] += sign * leechers
+        self.swarm["seedless"] += sign * seedless
+        self.swarm["unavailable"] += sign * unavailable
+        if self.states[state] <= 0:
+            del self.states[state]
+
+    def refresh(self):
+        """Pull the next maindata delta and rebuild the snapshot."""
+        start = time.monotonic()
+        previous_rid = self.mirror.rid
+        changed, removed = self.mirror.sync()
+        # qBittorrent advances rid on every successful response
+        self.up = int(self.mirror.rid != previous_rid)
+        if not self.up:
+            self.sync_errors += 1
+
+        for hash_val in removed:
+            old = self.contributions.pop(hash_val, None)
+            if old:
+                self._apply(old, -1)
+        for hash_val in changed:
+            torrent = self.mirror.torrents.get(hash_val)
+            if torrent is None:
+                continue
+            old = self.contributions.get(hash_val)
+            if old:
+                self._apply(old, -1)
+            new = self._contribution(torrent)
+            self._apply(new, 1)
+            self.contributions[hash_val] = new
+
+        self.sync_duration = time.monotonic() - start
+        if self.up:
+            self.last_sync = time.time()
+        snapshot = self.render().encode()
+        with self.lock:
+            self.snapshot = snapshot
+
+    def render(self):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_str = ",".join(f'{k}="{escape_label(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+
+        server = self.mirror.server_state
+        metric("qbittorrent_up", "gauge", "Whether the last sync/maindata call succeeded.", [({}, self.up)])
+        metric("qbittorrent_download_bytes_per_second", "gauge", "Global download rate.",
+               [({}, server.get("dl_info_speed", 0))])
+        metric("qbittorrent_upload_bytes_per_second", "gauge", "Global upload rate.",
+               [({}, server.get("up_info_speed", 0))])
+        metric("qbittorrent_dht_nodes", "gauge", "Connected DHT nodes.", [({}, server.get("dht_nodes", 0))])
+        metric("qbittorrent_connected", "gauge", "Connection status reported by qBittorrent.",
+               [({"status": server.get("connection_status", "unknown")}, 1)])
+        metric("qbittorrent_torrents", "gauge", "Torrents by state.",
+               [({"state": state}, count) for state, count in sorted(self.states.items())])
+        metric("qbittorrent_category_torrents", "gauge", "Torrents by category.",
+               [({"category": k}, v[0]) for k, v in sorted(self.categories.items())])
+        metric("qbittorrent_category_download_bytes_per_second", "gauge", "Download rate by category.",
+               [({"category": k}, v[1]) for k, v in sorted(self.categories.items())])
+        metric("qbittorrent_category_upload_bytes_per_second", "gauge", "Upload rate by category.",
+               [({"category": k}, v[2]) for k, v in sorted(self.categories.items())])
+        metric("qbittorrent_tracker_torrents", "gauge", "Torrents by current tracker host.",
+               [({"tracker": k}, v[0]) for k, v in sorted(self.trackers.items())])
+        metric("qbittorrent_tracker_download_bytes_per_second", "gauge", "Download rate by tracker host.",
+               [({"tracker": k}, v[1]) for k, v in sorted(self.trackers.items())])
+        metric("qbittorrent_tracker_upload_bytes_per_second", "gauge", "Upload rate by tracker host.",
+               [({"tracker": k}, v[2]) for k, v in sorted(self.trackers.items())])
+        metric("qbittorrent_swarm_seeds", "gauge", "Seeds in the swarms of all torrents.",
+               [({}, self.swarm["seeds"])])
+        metric("qbittorrent_swarm_leechers", "gauge", "Leechers in the swarms of all torrents.",
+               [({}, self.swarm["leechers"])])
+        metric("qbittorrent_torrents_without_seeds", "gauge", "Incomplete torrents with no seeds in the swarm.",
+               [({}, self.swarm["seedless"])])
+        metric("qbittorrent_torrents_unavailable", "gauge", "Incomplete torrents with availability below 1.",
+               [({}, self.swarm["unavailable"])])
+        metric("qbittorrent_exporter_last_sync_timestamp_seconds", "gauge", "Time of the last successful sync.",
+               [({}, f"{self.last_sync:.3f}")])
+        metric("qbittorrent_exporter_sync_duration_seconds", "gauge", "Duration of the last sync.",
+               [({}, f"{self.sync_duration:.6f}")])
+        metric("qbittorrent_exporter_sync_errors_total", "counter", "Failed sync/maindata calls.",
+               [({}, self.sync_errors)])
+        return "\n".join(lines) + "\n"
+
+    def run(self, interval, stop_event):
+        while not stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing metrics: {e}")
+            stop_event.wait(interval)
+
+def make_handler(collector):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            with collector.lock:
+                body = collector.snapshot
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve qBittorrent metrics for Prometheus")
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=int(os.environ.get("EXPORTER_PORT", DEFAULT_PORT)),
+        help="Port to listen on",
+    )
+    parser.add_argument("--bind", default="0.0.0.0", help="Address to listen on")
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=float(os.environ.get("EXPORTER_INTERVAL", DEFAULT_INTERVAL)),
+        help="Seconds between sync/maindata refreshes",
+    )
+    args = parser.parse_args()
+
+    config = Config()
+    client = QBitClient(
+        os.environ.get("QBITTORRENT_BASE_URL", config.base_url),
+        os.environ.get("QBITTORRENT_USERNAME", config.qbit_user),
+        os.environ.get("QBITTORRENT_PASSWORD", config.qbit_pass),
+    )
+    collector = MetricsCollector(client)
+    stop_event = threading.Event()
+    refresher = threading.Thread(target=collector.run, args=(args.interval, stop_event), daemon=True)
+    refresher.start()
+
+    server = ThreadingHTTPServer((args.bind, args.port), make_handler(collector))
+    print(f"Serving metrics on http://{args.bind}:{args.port}/metrics (refresh every {args.interval:g}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -11,12 +11,11 @@ Usage:
 
 import os
 import sys
-import requests
 import argparse
 import time
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from common import load_env, log, get_api_key, get_headers
+from common import load_env, log, get_api_key, arr_client
 
 load_env()
 
@@ -26,11 +25,10 @@ RADARR_URL = os.environ.get("RADARR_URL", "http://localhost:7878")
 
 def trigger_command(url, api_key, command_name, **kwargs):
     """Send a command to Sonarr/Radarr API."""
-    headers = get_headers(api_key)
     payload = {"name": command_name, **kwargs}
 
     try:
-        resp = requests.post(f"{url}/api/v3/command", headers=headers, json=payload, timeout=10)
+        resp = arr_client(url, api_key).post("command", json=payload)
         resp.raise_for_status()
         command_id = resp.json().get("id")
         log(f"✓ Triggered: {command_name} (Command ID: {command_id})", "SUCCESS")
@@ -42,12 +40,8 @@ def trigger_command(url, api_key, command_name, **kwargs):
 
 def check_command_status(url, api_key, command_id):
     """Check the status of a command."""
-    headers = get_headers(api_key)
-
     try:
-        resp = requests.get(f"{url}/api/v3/command/{command_id}", headers=headers, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
+        data = arr_client(url, api_key).get_json(f"command/{command_id}")
         return data.get("status"), data.get("message", "")
     except Exception as e:
         log(f"Failed to check command status: {e}", "WARNING")
@@ -56,13 +50,10 @@ def check_command_status(url, api_key, command_id):
 
 def get_missing_items(url, api_key, item_type="series"):
     """Get list of items with missing files."""
-    headers = get_headers(api_key)
-    endpoint = "/api/v3/wanted/missing" if item_type == "series" else "/api/v3/movie"
+    endpoint = "wanted/missing" if item_type == "series" else "movie"
 
     try:
-        resp = requests.get(f"{url}{endpoint}", headers=headers, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
+        data = arr_client(url, api_key).get_json(endpoint, timeout=30)
 
         if item_type == "series":
             records = data.get("records", [])
@@ -7,9 +7,11 @@ This script validates and syncs Prowlarr API keys to Sonarr/Radarr indexers.
 
 import os
 import sys
-import requests
 from pathlib import Path
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import arr_client
+
 
 def log(msg, level="INFO"):
     """Print colored log messages."""
@@ -110,11 +112,9 @@ def fix_indexers(app_name, base_url, app_api_key, correct_prowlarr_key):
     """Fix Prowlarr indexers in Sonarr/Radarr."""
     log(f"Checking {app_name} indexers...", "INFO")
 
-    headers = {"X-Api-Key": app_api_key}
+    client = arr_client(base_url, app_api_key)
     try:
-        resp = requests.get(f"{base_url}/api/v3/indexer", headers=headers)
-        resp.raise_for_status()
-        indexers = resp.json()
+        indexers = client.get_json("indexer")
     except Exception as e:
         log(f"Failed to get indexers from {app_name}: {e}", "ERROR")
         return
@@ -142,20 +142,12 @@ def fix_indexers(app_name, base_url, app_api_key, correct_prowlarr_key):
 
                 try:
                     # Update the indexer
-                    update_resp = requests.put(
-                        f"{base_url}/api/v3/indexer/{indexer['id']}",
-                        headers=headers,
-                        json=indexer
-                    )
+                    update_resp = client.put(f"indexer/{indexer['id']}", json=indexer)
                     update_resp.raise_for_status()
 
                     # Test the indexer
                     log(f"Testing indexer: {indexer['name']}", "INFO")
-                    test_resp = requests.post(
-                        f"{base_url}/api/v3/indexer/test",
-                        headers=headers,
-                        json=indexer
-                    )
+                    test_resp = client.post("indexer/test", json=indexer)
 
                     if test_resp.status_code == 200:
                         log(f"Indexer {indexer['name']} test PASSED", "SUCCESS")
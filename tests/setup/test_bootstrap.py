@@ -0,0 +1,298 @@
+"""Tests for bootstrap.py"""
+import threading
+import time
+import pytest
+from unittest.mock import patch, MagicMock
+from scripts.common import ProvisioningStateStore
+from scripts.setup import bootstrap
+
+
+@pytest.fixture(autouse=True)
+def api_keys(monkeypatch):
+    for name in ('SONARR', 'RADARR', 'PROWLARR'):
+        monkeypatch.setenv(f'{name}_API_KEY', 'key')
+        monkeypatch.delenv(f'{name}_URL', raising=False)
+        monkeypatch.delenv(f'{name}_PORT', raising=False)
+
+
+class TestServiceUrl:
+    """Tests for service_url."""
+
+    def test_default_port(self):
+        """Test the well-known port is used when nothing is configured."""
+        assert bootstrap.service_url('sonarr', {}) == 'http://localhost:8989'
+
+    def test_env_overrides_settings(self, monkeypatch):
+        """Test <NAME>_URL wins over the config file."""
+        monkeypatch.setenv('SONARR_URL', 'http://sonarr:8989/')
+        assert bootstrap.service_url('sonarr', {'url': 'http://other'}) == 'http://sonarr:8989'
+
+
+class TestBootstrap:
+    """Tests for the Bootstrap orchestrator."""
+
+    def test_probes_run_concurrently(self):
+        """Test total time tracks the slowest service, not the sum."""
+        def slow_wait(url, *args, **kwargs):
+            time.sleep(0.2)
+            return True
+
+        services = {'sonarr': {}, 'radarr': {}, 'prowlarr': {}}
+        with patch.object(bootstrap, 'wait_for_service', side_effect=slow_wait), \
+             patch('builtins.print'):
+            runner = bootstrap.Bootstrap(services)
+            status = runner.run()
+
+        assert status == {'sonarr': 'configured', 'radarr': 'configured', 'prowlarr': 'configured'}
+        assert runner.elapsed < 0.5
+
+    def test_configures_ready_service_without_waiting_for_others(self):
+        """Test a ready service is configured while another is still starting."""
+        release = threading.Event()
+        configured = []
+
+        def wait(url, *args, **kwargs):
+            if 'localhost:7878' in url:
+                assert release.wait(5)
+            return True
+
+        def reconciler(url, *args, **kwargs):
+            def reconcile(settings, dry_run=False, current=None):
+                configured.append(url)
+                release.set()
+                return 0
+            return MagicMock(reconcile=MagicMock(side_effect=reconcile))
+
+        services = {
+            'sonarr': {'root_folders': [{'path': '/media/tv'}]},
+            'radarr': {'root_folders': [{'path': '/media/movies'}]},
+        }
+        with patch.object(bootstrap, 'wait_for_service', side_effect=wait), \
+             patch.object(bootstrap, 'ArrReconciler', side_effect=reconciler), \
+             patch('builtins.print'):
+            status = bootstrap.Bootstrap(services).run()
+
+        assert configured == ['http://localhost:8989', 'http://localhost:7878']
+        assert set(status.values()) == {'configured'}
+
+    def test_dependency_waits_on_barrier(self):
+        """Test configure steps wait until a dependency is ready."""
+        order = []
+
+        def wait(url, *args, **kwargs):
+            if 'localhost:8989' in url:
+                time.sleep(0.1)
+            order.append(('ready', url))
+            return True
+
+        services = {
+            'sonarr': {},
+            'prowlarr': {'depends_on': ['sonarr'], 'disable_analytics': True, 'api_version': 'v1'},
+        }
+        def reconciler(url, *args, **kwargs):
+            return MagicMock(reconcile=MagicMock(side_effect=lambda *a, **k: order.append(('configure', url)) or 0))
+
+        with patch.object(bootstrap, 'wait_for_service', side_effect=wait), \
+             patch.object(bootstrap, 'ArrReconciler', side_effect=reconciler) as arr, \
+             patch('builtins.print'):
+            bootstrap.Bootstrap(services).run()
+
+        assert order.index(('ready', 'http://localhost:8989')) < order.index(('configure', 'http://localhost:9696'))
+        assert {c.kwargs['api_version'] for c in arr.call_args_list} == {'v3', 'v1'}
+
+    def test_ping_endpoints_passed_through(self):
+        """Test /ping is probed by default and can be turned off per service."""
+        services = {'sonarr': {}, 'bazarr': {'ping_endpoints': []}}
+        with patch.object(bootstrap, 'wait_for_service', return_value=True) as wait, \
+             patch.dict('os.environ', {'BAZARR_API_KEY': 'key'}), \
+             patch('builtins.print'):
+            bootstrap.Bootstrap(services).run()
+
+        pings = {c.args[0]: c.kwargs['ping_endpoints'] for c in wait.call_args_list}
+        assert pings == {'http://localhost:8989': ('/ping',), 'http://localhost:6767': []}
+
+    def test_unreachable_dependency_blocks(self):
+        """Test a dependent service is skipped when its dependency never comes up."""
+        def wait(url, *args, **kwargs):
+            if 'localhost:8989' in url:
+                raise SystemExit(1)
+            return True
+
+        services = {'sonarr': {}, 'prowlarr': {'depends_on': ['sonarr'], 'disable_analytics': True}}
+        with patch.object(bootstrap, 'wait_for_service', side_effect=wait), \
+             patch.object(bootstrap, 'ArrReconciler') as arr, \
+             patch('builtins.print'):
+            status = bootstrap.Bootstrap(services).run()
+
+        assert status == {'sonarr': 'unreachable', 'prowlarr': 'blocked'}
+        arr.assert_not_called()
+
+    def test_missing_api_key_fails_service(self, monkeypatch):
+        """Test a missing API key fails only that service."""
+        monkeypatch.delenv('RADARR_API_KEY')
+        with patch.object(bootstrap, 'wait_for_service', return_value=True), \
+             patch('builtins.print'):
+            status = bootstrap.Bootstrap({'sonarr': {}, 'radarr': {}}).run()
+
+        assert status == {'sonarr': 'configured', 'radarr': 'failed'}
+
+    def test_failed_writes_fail_service(self):
+        """Test a service whose reconcile reports failures is marked failed."""
+        with patch.object(bootstrap, 'wait_for_service', return_value=True), \
+             patch.object(bootstrap, 'ArrReconciler') as arr, \
+             patch('builtins.print'):
+            arr.return_value.reconcile.return_value = 1
+            status = bootstrap.Bootstrap({'sonarr': {}}, dry_run=True).run()
+
+        assert status == {'sonarr': 'failed'}
+        arr.return_value.reconcile.assert_called_once_with({}, dry_run=True, current=None)
+    def test_summary_names_slowest_service(self, capsys):
+        """Test the summary points at the service that took longest."""
+        runner = bootstrap.Bootstrap({'sonarr': {}, 'radarr': {}})
+        runner.status = {'sonarr': 'configured', 'radarr': 'configured'}
+        runner.timings = {'sonarr': 0.4, 'radarr': 3.2}
+        runner.print_summary()
+
+        assert 'Slowest to become ready: radarr (3.2s)' in capsys.readouterr().out
+
+
+
+class TestFingerprintSkip:
+    """Tests for skipping services that have not changed since the last run."""
+
+    SETTINGS = {
+        'sonarr': {
+            'root_folders': [{'path': '/media/tv'}],
+            'download_clients': [{'name': 'qBittorrent', 'protocol': 'torrent', 'implementation': 'QBittorrent',
+                                  'fields': [{'name': 'password', 'env': 'QBITTORRENT_PASSWORD'}]}],
+        },
+    }
+
+    @staticmethod
+    def resources(host='gluetun', free_space=None):
+        """What ArrReconciler.fetch returns for SETTINGS; free space varies between runs."""
+        return {
+            'rootfolder': [{'id': 1, 'path': '/media/tv', 'freeSpace': free_space or time.time_ns()}],
+            'downloadclient': [{'id': 3, 'name': 'qBittorrent',
+                                'fields': [{'name': 'host', 'value': host}, {'name': 'password', 'value': '********'}]}],
+        }
+
+    def run(self, state, fetched=None, force=False, changes=()):
+        with patch.object(bootstrap, 'wait_for_service', return_value=True), \
+             patch.object(bootstrap, 'ArrReconciler') as arr, \
+             patch('builtins.print'):
+            reconciler = arr.return_value
+            if isinstance(fetched, list):
+                reconciler.fetch.side_effect = fetched
+            else:
+                reconciler.fetch.return_value = fetched or self.resources()
+            reconciler.reconcile.return_value = 0
+            reconciler.changes = list(changes)
+            reconciler.secret_hashes.return_value = {}
+            result = bootstrap.Bootstrap(self.SETTINGS, state=state, force=force).run()
+        return result, reconciler.reconcile.call_count
+
+    def test_second_run_is_skipped(self, monkeypatch):
+        """Test an unchanged config and managed resources short-circuit the run."""
+        monkeypatch.setenv('QBITTORRENT_PASSWORD', 'one')
+        state = ProvisioningStateStore(':memory:')
+
+        assert self.run(state) == ({'sonarr': 'configured'}, 1)
+        # freeSpace differs between runs but is not part of the fingerprint
+        assert self.run(state) == ({'sonarr': 'unchanged'}, 0)
+        assert self.run(state, force=True) == ({'sonarr': 'configured'}, 1)
+
+    def test_skipped_run_reuses_fetch(self):
+        """Test the fetched resources are handed to the reconcile instead of read twice."""
+        state = ProvisioningStateStore(':memory:')
+        fetched = self.resources()
+        with patch.object(bootstrap, 'wait_for_service', return_value=True), \
+             patch.object(bootstrap, 'ArrReconciler') as arr, \
+             patch('builtins.print'):
+            arr.return_value.fetch.return_value = fetched
+            arr.return_value.reconcile.return_value = 0
+            arr.return_value.changes = []
+            bootstrap.Bootstrap(self.SETTINGS, state=state).run()
+
+        arr.return_value.fetch.assert_called_once()
+        assert arr.return_value.reconcile.call_args.kwargs['current'] is fetched
+
+    def test_changes_trigger_run(self, monkeypatch):
+        """Test a changed env-resolved field or a resource edited in the UI reconciles again."""
+        monkeypatch.setenv('QBITTORRENT_PASSWORD', 'one')
+        state = ProvisioningStateStore(':memory:')
+        self.run(state)
+
+        monkeypatch.setenv('QBITTORRENT_PASSWORD', 'two')
+        assert self.run(state) == ({'sonarr': 'configured'}, 1)
+        edited = self.resources(host='qbittorrent')
+        assert self.run(state, fetched=edited) == ({'sonarr': 'configured'}, 1)
+        assert self.run(state, fetched=edited) == ({'sonarr': 'unchanged'}, 0)
+
+    def test_records_state_after_writes(self):
+        """Test a run that wrote changes records the resources as they are afterwards."""
+        state = ProvisioningStateStore(':memory:')
+        before = self.resources(host='qbittorrent')
+        after = self.resources()
+
+        assert self.run(state, fetched=[before, after], changes=['update']) == ({'sonarr': 'configured'}, 1)
+        assert self.run(state, fetched=after) == ({'sonarr': 'unchanged'}, 0)
+
+    def test_unreadable_resources_are_not_skipped(self):
+        """Test a failed fetch never matches a stored fingerprint."""
+        state = ProvisioningStateStore(':memory:')
+        self.run(state)
+
+        assert self.run(state, fetched={'rootfolder': None}) == ({'sonarr': 'configured'}, 1)
+        assert state.load() != {}
+
+    def test_rotated_secret_reaches_reconciler(self, monkeypatch):
+        """Test the hashes of applied secrets are stored and handed to the next run."""
+        monkeypatch.setenv('QBITTORRENT_PASSWORD', 'one')
+        state = ProvisioningStateStore(':memory:')
+        with patch.object(bootstrap, 'wait_for_service', return_value=True), \
+             patch.object(bootstrap, 'ArrReconciler') as arr, \
+             patch('builtins.print'):
+            arr.return_value.fetch.return_value = self.resources()
+            arr.return_value.reconcile.return_value = 0
+            arr.return_value.changes = []
+            arr.return_value.secret_hashes.return_value = {'qBittorrent/password': 'hash-one'}
+            bootstrap.Bootstrap(self.SETTINGS, state=state).run()
+            monkeypatch.setenv('QBITTORRENT_PASSWORD', 'two')
+            bootstrap.Bootstrap(self.SETTINGS, state=state, force=True).run()
+
+        assert state.load_secrets() == {'sonarr': {'qBittorrent/password': 'hash-one'}}
+        first, second = arr.call_args_list
+        assert first.kwargs['applied_secrets'] is None
+        assert second.kwargs['applied_secrets'] == {'qBittorrent/password': 'hash-one'}
+        assert second.kwargs['force'] is True
+
+    def test_failed_run_is_not_recorded(self):
+        """Test a service with failed writes is reconciled again next time."""
+        state = ProvisioningStateStore(':memory:')
+        with patch.object(bootstrap, 'wait_for_service', return_value=True), \
+             patch.object(bootstrap, 'ArrReconciler') as arr, \
+             patch('builtins.print'):
+            arr.return_value.fetch.return_value = {}
+            arr.return_value.reconcile.return_value = 1
+            bootstrap.Bootstrap({'sonarr': {}}, state=state).run()
+
+        assert state.load() == {}
+
+
+class TestMain:
+    """Tests for the CLI entry point."""
+
+    def test_only_filters_services(self, tmp_path):
+        """Test --only restricts the run and failures exit non-zero."""
+        config = tmp_path / 'setup.config.json'
+        config.write_text('{"services": {"sonarr": {}, "radarr": {}}}')
+        with patch('sys.argv', ['bootstrap.py', '--config', str(config), '--only', 'sonarr',
+                                '--state-db', str(tmp_path / 'state.sqlite')]), \
+             patch.object(bootstrap, 'load_env'), \
+             patch.object(bootstrap, 'wait_for_service', side_effect=SystemExit(1)) as wait, \
+             patch('builtins.print'):
+            with pytest.raises(SystemExit):
+                bootstrap.main()
+
+        assert wait.call_count == 1
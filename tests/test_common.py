@@ -1,9 +1,13 @@
 """Tests for common.py utility functions."""
+import hashlib
 import pytest
 import os
 import tempfile
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock, mock_open
+import requests
 import responses
 from scripts import common
 
@@ -279,6 +283,116 @@ class TestWaitForService:
 
         assert exc_info.value.code == 1
 
+    @responses.activate
+    @patch("scripts.common.time.sleep")
+    def test_wait_for_service_pings_before_status(self, mock_sleep):
+        """Test the status call waits until the cheap ping endpoint answers at all."""
+        responses.add(responses.GET, "http://localhost:8989/ping",
+                      body=requests.exceptions.ConnectionError("refused"))
+        # A service without /ping still shows its process is up
+        responses.add(responses.GET, "http://localhost:8989/ping", status=404)
+        responses.add(
+            responses.GET,
+            "http://localhost:8989/api/v3/system/status",
+            json={"version": "1.0"},
+        )
+
+        result = common.wait_for_service(
+            "http://localhost:8989",
+            "test_key",
+            "PingService",
+            max_retries=5,
+            ping_endpoints=("/ping",),
+        )
+
+        assert result is True
+        assert [c.request.url.split("8989")[1] for c in responses.calls] == [
+            "/ping", "/ping", "/api/v3/system/status"
+        ]
+        assert "X-Api-Key" not in responses.calls[0].request.headers
+
+    @responses.activate
+    def test_wait_for_service_backs_off(self):
+        """Test polls start sub-second and double up to retry_delay."""
+        responses.add(
+            responses.GET,
+            "http://localhost:8989/api/v3/system/status",
+            status=500
+        )
+        clock = FakeClock()
+
+        with clock.patch(), pytest.raises(SystemExit):
+            common.wait_for_service(
+                "http://localhost:8989",
+                "test_key",
+                "TestService",
+                max_retries=6,
+                retry_delay=2
+            )
+
+        assert clock.sleeps[0] <= 0.25
+        for delay, cap in zip(clock.sleeps, [0.25, 0.5, 1, 2, 2]):
+            assert cap / 2 <= delay <= cap
+
+    @responses.activate
+    def test_wait_for_service_keeps_full_time_budget(self):
+        """Test the fast start does not shrink the max_retries * retry_delay budget."""
+        responses.add(
+            responses.GET,
+            "http://localhost:8989/api/v3/system/status",
+            status=500
+        )
+        clock = FakeClock()
+
+        with clock.patch(), pytest.raises(SystemExit):
+            common.wait_for_service(
+                "http://localhost:8989",
+                "test_key",
+                "TestService",
+                max_retries=30,
+                retry_delay=2
+            )
+
+        assert 60 <= sum(clock.sleeps) <= 62
+        assert len(responses.calls) >= 30
+
+    @responses.activate
+    def test_wait_for_service_uses_api_version_client(self):
+        """Test readiness goes through the pooled client of the service's API version."""
+        responses.add(
+            responses.GET,
+            "http://prowlarr:9696/api/v1/system/status",
+            json={"version": "1.0"},
+            status=200
+        )
+
+        common.wait_for_service(
+            "http://prowlarr:9696",
+            "test_key",
+            "Prowlarr",
+            max_retries=1,
+            retry_delay=0,
+            api_version="v1"
+        )
+
+        client = common.arr_client("http://prowlarr:9696", "test_key", "v1")
+        assert client.stats["GET system/status"][0] == 1
+
+
+class FakeClock:
+    """Monotonic clock for common.time that only advances when slept on."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def patch(self):
+        return patch.multiple("scripts.common.time", monotonic=lambda: self.now, sleep=self.sleep)
+
 
 class TestConfig:
     """Tests for Config class."""
@@ -313,10 +427,64 @@ class TestConfig:
             assert config.qbit_user == "admin"  # default when SERVICE_USER not set
             assert config.qbit_pass is None
 
+    def test_config_load_instances(self):
+        """Test qbittorrent.instances entries get defaults and env passwords."""
+        with patch.object(common.Config, '__init__', lambda self: None):
+            config = common.Config()
+            config.env = {'QBIT_B_PASS': 'secret'}
+            config.qbit_user = 'admin'
+            config.qbit_pass = 'shared'
+            config.base_url = 'http://localhost:8080'
+            config.settings = {'qbittorrent': {'instances': [
+                {'name': 'a', 'url': 'http://a:8080'},
+                {'url': 'http://b:8080', 'username': 'bob', 'password_env': 'QBIT_B_PASS'},
+            ]}}
+
+            instances = config._load_instances()
+
+        assert instances == [
+            {'name': 'a', 'url': 'http://a:8080', 'username': 'admin', 'password': 'shared'},
+            {'name': 'qbittorrent-2', 'url': 'http://b:8080', 'username': 'bob', 'password': 'secret'},
+        ]
+
+    def test_config_single_instance_default(self):
+        """Test the base_url instance is used when none are configured."""
+        with patch.object(common.Config, '__init__', lambda self: None):
+            config = common.Config()
+            config.env = {}
+            config.qbit_user = 'admin'
+            config.qbit_pass = None
+            config.base_url = 'http://localhost:8080'
+            config.settings = {}
+
+            assert [i['url'] for i in config._load_instances()] == ['http://localhost:8080']
+
+    def test_config_instance_without_url_is_reported(self):
+        """Test an instance entry missing 'url' raises a ValueError naming it."""
+        with patch.object(common.Config, '__init__', lambda self: None):
+            config = common.Config()
+            config.env = {}
+            config.qbit_user = 'admin'
+            config.qbit_pass = None
+            config.config_path = 'setup.config.json'
+            config.settings = {'qbittorrent': {'instances': [
+                {'name': 'a', 'url': 'http://a:8080'},
+                {'name': 'seedbox'},
+            ]}}
+
+            with pytest.raises(ValueError, match="seedbox.*'url'"):
+                config._load_instances()
+
 
 class TestQBitClient:
     """Tests for QBitClient class."""
 
+    def test_qbitclient_pool_size(self):
+        """Test the connection pool is sized for the caller's concurrency."""
+        client = common.QBitClient("http://localhost:8080", "admin", "testpass", pool_size=32)
+
+        assert client.session.get_adapter("http://localhost:8080")._pool_maxsize == 32
+
     @responses.activate
     def test_qbitclient_login_success(self):
         """Test successful qBittorrent login."""
@@ -689,7 +857,7 @@ class TestQBitClient:
 
     @responses.activate
     def test_qbitclient_get_torrents_with_filter(self):
-        """Test get_torrents with filter parameter (second implementation)."""
+        """Test get_torrents sends the state filter to the server."""
         responses.add(
             responses.POST,
             "http://localhost:8080/api/v2/auth/login",
@@ -697,8 +865,6 @@ class TestQBitClient:
             status=200
         )
 
-        # Note: There are two get_torrents methods in QBitClient
-        # This tests the one that accepts filter_by parameter (line 452)
         responses.add(
             responses.GET,
             "http://localhost:8080/api/v2/torrents/info",
@@ -707,11 +873,10 @@ class TestQBitClient:
         )
 
         client = common.QBitClient("http://localhost:8080", "admin", "testpass")
-        # This will hit the first get_torrents method (line 324) or second (line 452)
-        # depending on which one Python resolves (likely the second one overrides the first)
         torrents = client.get_torrents(filter_by="downloading")
 
-        assert len(torrents) >= 0  # May return results based on implementation
+        assert len(torrents) == 1
+        assert "filter=downloading" in responses.calls[1].request.url
 
     @responses.activate
     def test_qbitclient_login_failure(self):
@@ -743,7 +908,7 @@ class TestQBitClient:
 
     @responses.activate
     def test_qbitclient_get_torrents_with_hashes(self):
-        """Test get_torrents with filter_by parameter (the second method overrides the first)."""
+        """Test get_torrents combines filter, category, tag and hashes server-side."""
         responses.add(
             responses.POST,
             "http://localhost:8080/api/v2/auth/login",
@@ -759,11 +924,50 @@ class TestQBitClient:
         )
 
         client = common.QBitClient("http://localhost:8080", "admin", "testpass")
-        # The second get_torrents method (line 452) accepts filter_by, not hashes
-        torrents = client.get_torrents(filter_by="seeding")
+        torrents = client.get_torrents(
+            filter_by="seeding", category="tv", tag="keep", hashes=["seeding123", "other"]
+        )
 
         assert len(torrents) == 1
         assert torrents[0]["state"] == "seeding"
+        url = responses.calls[1].request.url
+        assert "filter=seeding" in url
+        assert "category=tv" in url
+        assert "tag=keep" in url
+        assert "hashes=seeding123%7Cother" in url
+
+    @responses.activate
+    def test_qbitclient_get_torrents_predicate(self):
+        """Test predicates are applied locally to list and table results."""
+        responses.add(
+            responses.POST,
+            "http://localhost:8080/api/v2/auth/login",
+            body="Ok.",
+            status=200
+        )
+        responses.add(
+            responses.GET,
+            "http://localhost:8080/api/v2/torrents/info",
+            json=[
+                {"hash": "a", "state": "stalledDL"},
+                {"hash": "b", "state": "downloading"}
+            ],
+            status=200
+        )
+
+        client = common.QBitClient("http://localhost:8080", "admin", "testpass")
+        stalled = client.get_torrents(predicate=lambda t: t["state"] == "stalledDL")
+        assert [t["hash"] for t in stalled] == ["a"]
+
+        client.fields = common.TORRENT_FIELDS
+        stalled = client.get_torrents(predicate=lambda t: t["state"] == "stalledDL")
+        assert [t["hash"] for t in stalled] == ["a"]
+
+    def test_torrent_query_params(self):
+        """Test query parameter construction, including uncategorized."""
+        assert common.torrent_query_params() == {}
+        assert common.torrent_query_params(category="") == {"category": ""}
+        assert common.torrent_query_params(hashes="abc") == {"hashes": "abc"}
 
     @responses.activate
     def test_qbitclient_operations_login_failed(self):
@@ -877,3 +1081,1395 @@ class TestConfigureRootFolders:
 
         # Should make GET and POST
         assert len(responses.calls) == 2
+
+
+
+class TestArrClient:
+    """Tests for ArrClient."""
+
+    @responses.activate
+    def test_session_carries_key_and_timeout(self):
+        """Test the API key header and default timeout are applied to every call."""
+        responses.add(responses.GET, "http://localhost:8989/api/v3/rootfolder", json=[])
+        client = common.ArrClient("http://localhost:8989/", "test_key")
+        with patch.object(client.session, "request", wraps=client.session.request) as send:
+            assert client.get_json("rootfolder") == []
+
+        assert send.call_args.kwargs["timeout"] == common.DEFAULT_TIMEOUT
+        assert responses.calls[0].request.headers["X-Api-Key"] == "test_key"
+
+    @responses.activate
+    @patch("scripts.common.time.sleep")
+    def test_retries_server_errors(self, mock_sleep):
+        """Test 5xx responses are retried with backoff until one succeeds."""
+        responses.add(responses.GET, "http://localhost:8989/api/v3/system/status", status=503)
+        responses.add(responses.GET, "http://localhost:8989/api/v3/system/status", json={"version": "4"})
+        client = common.ArrClient("http://localhost:8989", "test_key")
+
+        assert client.get_json("system/status") == {"version": "4"}
+        mock_sleep.assert_called_once_with(common.ARR_RETRY_BACKOFF)
+
+    @responses.activate
+    @patch("scripts.common.time.sleep")
+    def test_rate_limit_honours_retry_after(self, mock_sleep):
+        """Test 429 waits for Retry-After, even for POSTs."""
+        responses.add(responses.POST, "http://localhost:8989/api/v3/command", status=429,
+                      headers={"Retry-After": "3"})
+        responses.add(responses.POST, "http://localhost:8989/api/v3/command", json={"id": 1})
+        client = common.ArrClient("http://localhost:8989", "test_key")
+
+        assert client.post("command", json={"name": "RescanSeries"}).status_code == 200
+        mock_sleep.assert_called_once_with(3.0)
+
+    @responses.activate
+    @patch("scripts.common.time.sleep")
+    def test_post_not_retried_on_server_error(self, mock_sleep):
+        """Test a failed POST is returned as-is so it is never sent twice."""
+        responses.add(responses.POST, "http://localhost:8989/api/v3/rootfolder", status=500)
+        client = common.ArrClient("http://localhost:8989", "test_key")
+
+        assert client.post("rootfolder", json={}).status_code == 500
+        assert len(responses.calls) == 1
+
+    @responses.activate
+    def test_stats_group_ids(self):
+        """Test latency counters collapse numeric ids into one endpoint."""
+        responses.add(responses.GET, "http://localhost:8989/api/v3/command/1", json={})
+        responses.add(responses.GET, "http://localhost:8989/api/v3/command/2", json={})
+        responses.add(responses.GET, "http://localhost:8989/ping", json={})
+        client = common.ArrClient("http://localhost:8989", "test_key")
+        client.get("command/1")
+        client.get("command/2")
+        client.get("/ping")
+
+        assert client.stats["GET command/{id}"][0] == 2
+        assert client.stats["GET /ping"][0] == 1
+        assert client.format_stats()[0].startswith("GET ")
+
+    def test_arr_client_is_shared(self):
+        """Test helpers for the same service reuse one pooled client."""
+        first = common.arr_client("http://shared:8989", "key")
+        assert common.arr_client("http://shared:8989/", "key") is first
+        assert common.arr_client("http://shared:8989", "key", "v1") is not first
+
+
+ARR_URL = "http://localhost:8989/api/v3"
+
+DESIRED_ARR = {
+    "disable_analytics": True,
+    "config": {"host": {"logLevel": "info"}, "mediamanagement": {"copyUsingHardlinks": True}},
+    "root_folders": [{"path": "/media/tv"}],
+    "download_clients": [{
+        "name": "qBittorrent",
+        "protocol": "torrent",
+        "implementation": "QBittorrent",
+        "fields": [
+            {"name": "host", "value": "gluetun"},
+            {"name": "password", "env": "RECONCILE_TEST_PASSWORD"},
+        ],
+    }],
+}
+
+CONVERGED_CLIENT = {
+    "id": 3, "name": "qBittorrent", "enable": True, "protocol": "torrent", "priority": 1,
+    "implementation": "QBittorrent",
+    "fields": [
+        {"name": "host", "value": "gluetun"},
+        {"name": "port", "value": 8080},
+        {"name": "password", "value": "********"},
+    ],
+}
+
+
+def add_arr_state(host=None, mediamanagement=None, folders=None, clients=None):
+    responses.add(responses.GET, f"{ARR_URL}/config/host",
+                  json=host or {"id": 1, "analyticsEnabled": False, "logLevel": "info"})
+    responses.add(responses.GET, f"{ARR_URL}/config/mediamanagement",
+                  json=mediamanagement or {"id": 1, "copyUsingHardlinks": True})
+    responses.add(responses.GET, f"{ARR_URL}/rootfolder",
+                  json=folders if folders is not None else [{"id": 1, "path": "/media/tv"}])
+    responses.add(responses.GET, f"{ARR_URL}/downloadclient",
+                  json=clients if clients is not None else [CONVERGED_CLIENT])
+
+
+class TestArrReconciler:
+    """Tests for ArrReconciler."""
+
+    @pytest.fixture(autouse=True)
+    def password(self, monkeypatch):
+        monkeypatch.setenv("RECONCILE_TEST_PASSWORD", "secret")
+
+    def reconciler(self, **kwargs):
+        # By default the current password is the one the last run applied
+        applied = common.ArrReconciler("http://localhost:8989", "test_key", "Sonarr").secret_hashes(DESIRED_ARR)
+        kwargs.setdefault("applied_secrets", applied)
+        return common.ArrReconciler("http://localhost:8989", "test_key", "Sonarr", **kwargs)
+
+    @responses.activate
+    def test_converged_service_only_reads(self):
+        """Test a converged service costs one GET per resource and no writes."""
+        add_arr_state()
+        with patch("builtins.print"):
+            failed = self.reconciler().reconcile(DESIRED_ARR)
+
+        assert failed == 0
+        assert [c.request.method for c in responses.calls] == ["GET"] * 4
+
+    @responses.activate
+    def test_reconcile_reuses_fetched_state(self):
+        """Test a fetch() result passed in is planned against without reading again."""
+        add_arr_state()
+        reconciler = self.reconciler()
+        current = reconciler.fetch(DESIRED_ARR)
+        with patch("builtins.print"):
+            failed = reconciler.reconcile(DESIRED_ARR, current=current)
+
+        assert failed == 0
+        assert reconciler.changes == []
+        assert len(responses.calls) == 4
+
+    @responses.activate
+    def test_plan_merges_host_changes_into_one_put(self):
+        """Test analytics and host config changes become a single PUT."""
+        add_arr_state(host={"id": 1, "analyticsEnabled": True, "logLevel": "debug"})
+        reconciler = self.reconciler()
+        changes = reconciler.plan(DESIRED_ARR, reconciler.fetch(DESIRED_ARR))
+
+        assert len(changes) == 1
+        assert changes[0]["method"] == "PUT"
+        assert changes[0]["path"] == "config/host"
+        assert changes[0]["payload"] == {"id": 1, "analyticsEnabled": False, "logLevel": "info"}
+
+    @responses.activate
+    def test_plan_adds_and_updates_collections(self):
+        """Test missing root folders are added and drifted clients updated in place."""
+        drifted = dict(CONVERGED_CLIENT, fields=[
+            {"name": "host", "value": "qbittorrent"},
+            {"name": "port", "value": 8080},
+            {"name": "password", "value": "********"},
+        ])
+        add_arr_state(folders=[], clients=[drifted])
+        reconciler = self.reconciler()
+        changes = reconciler.plan(DESIRED_ARR, reconciler.fetch(DESIRED_ARR))
+
+        by_path = {c["path"]: c for c in changes}
+        assert set(by_path) == {"rootfolder", "downloadclient/3"}
+        fields = {f["name"]: f["value"] for f in by_path["downloadclient/3"]["payload"]["fields"]}
+        assert fields == {"host": "gluetun", "port": 8080, "password": "secret"}
+
+    @responses.activate
+    def test_plan_resends_rotated_secret(self, monkeypatch):
+        """Test a masked password is sent again once its value changed."""
+        add_arr_state()
+        reconciler = self.reconciler()
+        current = reconciler.fetch(DESIRED_ARR)
+        assert reconciler.plan(DESIRED_ARR, current) == []
+
+        monkeypatch.setenv("RECONCILE_TEST_PASSWORD", "rotated")
+        changes = reconciler.plan(DESIRED_ARR, current)
+
+        assert [(c["method"], c["path"]) for c in changes] == [("PUT", "downloadclient/3")]
+        fields = {f["name"]: f["value"] for f in changes[0]["payload"]["fields"]}
+        assert fields["password"] == "rotated"
+
+    @responses.activate
+    def test_plan_resends_unknown_or_forced_secret(self):
+        """Test masked secrets are sent without a record of them or with force."""
+        add_arr_state()
+        unknown = self.reconciler(applied_secrets={})
+        forced = self.reconciler(force=True)
+        current = unknown.fetch(DESIRED_ARR)
+
+        assert [c["path"] for c in unknown.plan(DESIRED_ARR, current)] == ["downloadclient/3"]
+        assert [c["path"] for c in forced.plan(DESIRED_ARR, current)] == ["downloadclient/3"]
+
+    @responses.activate
+    def test_plan_creates_missing_client(self):
+        """Test a download client that does not exist is POSTed."""
+        add_arr_state(clients=[])
+        reconciler = self.reconciler()
+        changes = reconciler.plan(DESIRED_ARR, reconciler.fetch(DESIRED_ARR))
+
+        assert [(c["method"], c["path"]) for c in changes] == [("POST", "downloadclient")]
+        assert changes[0]["payload"]["configContract"] == "QBittorrentSettings"
+
+    @responses.activate
+    def test_apply_counts_failures(self):
+        """Test failed writes are reported and counted."""
+        add_arr_state(folders=[], mediamanagement={"id": 1, "copyUsingHardlinks": False})
+        responses.add(responses.POST, f"{ARR_URL}/rootfolder", status=400, body="Folder does not exist")
+        responses.add(responses.PUT, f"{ARR_URL}/config/mediamanagement", json={})
+        with patch("builtins.print"):
+            failed = self.reconciler().reconcile(DESIRED_ARR)
+
+        assert failed == 1
+        assert sorted(c.request.method for c in responses.calls) == ["GET"] * 4 + ["POST", "PUT"]
+
+    @responses.activate
+    @patch("scripts.common.time.sleep")
+    def test_dry_run_and_fetch_errors(self, mock_sleep):
+        """Test dry runs write nothing and unreadable resources count as failures."""
+        responses.add(responses.GET, f"{ARR_URL}/rootfolder", status=500)
+        with patch("builtins.print"):
+            failed = self.reconciler().reconcile({"root_folders": [{"path": "/media/tv"}]}, dry_run=True)
+
+        assert failed == 1
+        # One GET plus the client's retries on 500
+        assert len(responses.calls) == 1 + common.ARR_RETRIES
+
+class TestTorrentStateMirror:
+    """Tests for TorrentStateMirror class."""
+
+    @responses.activate
+    def test_mirror_applies_full_then_delta(self):
+        """Test mirror loads a snapshot and then merges partial updates."""
+        responses.add(
+            responses.POST,
+            "http://localhost:8080/api/v2/auth/login",
+            body="Ok.",
+            status=200
+        )
+        responses.add(
+            responses.GET,
+            "http://localhost:8080/api/v2/sync/maindata",
+            json={
+                "rid": 1,
+                "full_update": True,
+                "torrents": {
+                    "abc": {"name": "A", "state": "downloading", "progress": 0.1},
+                    "def": {"name": "B", "state": "stalledDL", "progress": 0.5}
+                },
+                "categories": {"tv": {"name": "tv", "savePath": "/media/tv"}}
+            },
+            status=200
+        )
+        responses.add(
+            responses.GET,
+            "http://localhost:8080/api/v2/sync/maindata",
+            json={
+                "rid": 2,
+                "torrents": {"abc": {"progress": 0.2}},
+                "torrents_removed": ["def"]
+            },
+            status=200
+        )
+
+        client = common.QBitClient("http://localhost:8080", "admin", "testpass")
+        mirror = common.TorrentStateMirror(client)
+
+        changed, removed = mirror.sync()
+        assert changed == {"abc", "def"}
+        assert removed == set()
+        assert mirror.categories["tv"]["savePath"] == "/media/tv"
+
+        changed, removed = mirror.sync()
+        assert changed == {"abc"}
+        assert removed == {"def"}
+        assert mirror.rid == 2
+        assert mirror.torrents["abc"] == {
+            "hash": "abc", "name": "A", "state": "downloading", "progress": 0.2
+        }
+        assert "rid=1" in responses.calls[2].request.url
+
+    def test_mirror_full_update_resets_table(self):
+        """Test a full_update replaces rows that were not resent."""
+        client = MagicMock()
+        client.get_maindata.side_effect = [
+            {"rid": 1, "full_update": True, "torrents": {"abc": {"name": "A"}}},
+            {"rid": 5, "full_update": True, "torrents": {"def": {"name": "B"}}}
+        ]
+        mirror = common.TorrentStateMirror(client)
+
+        mirror.sync()
+        changed, removed = mirror.sync()
+
+        assert changed == {"def"}
+        assert removed == {"abc"}
+        assert list(mirror.torrents) == ["def"]
+
+    def test_mirror_sync_failure_keeps_state(self):
+        """Test a failed sync leaves the table and rid untouched."""
+        client = MagicMock()
+        client.get_maindata.side_effect = [
+            {"rid": 1, "full_update": True, "torrents": {"abc": {"name": "A"}}},
+            {}
+        ]
+        mirror = common.TorrentStateMirror(client)
+
+        mirror.sync()
+        assert mirror.sync() == (set(), set())
+        assert mirror.rid == 1
+        assert "abc" in mirror.torrents
+
+    def test_mirror_get_torrents_filters_locally(self):
+        """Test get_torrents answers from the table with hash and state filters."""
+        client = MagicMock()
+        client.get_maindata.return_value = {
+            "rid": 1,
+            "full_update": True,
+            "torrents": {
+                "abc": {"name": "A", "state": "stalledDL"},
+                "def": {"name": "B", "state": "uploading"}
+            }
+        }
+        mirror = common.TorrentStateMirror(client, max_age=60)
+
+        assert len(mirror.get_torrents()) == 2
+        assert [t["hash"] for t in mirror.get_torrents(filter_by="stalled")] == ["abc"]
+        assert [t["hash"] for t in mirror.get_torrents(hashes="def")] == ["def"]
+        client.get_maindata.assert_called_once_with(0)
+
+    def test_mirror_reads_sync_first(self):
+        """Test every read picks up changes unless the last sync is within max_age."""
+        client = MagicMock()
+        client.get_maindata.side_effect = [
+            {"rid": 1, "full_update": True, "torrents": {"abc": {"state": "downloading"}}},
+            {"rid": 2, "torrents": {"abc": {"state": "stalledDL"}}},
+        ]
+        mirror = common.TorrentStateMirror(client)
+
+        assert [t["state"] for t in mirror.get_torrents()] == ["downloading"]
+        assert [t["state"] for t in mirror.iter_torrents()] == ["stalledDL"]
+        assert [c.args[0] for c in client.get_maindata.call_args_list] == [0, 1]
+
+    def test_mirror_get_torrents_category_and_tag(self):
+        """Test the mirror evaluates category and tag filters locally."""
+        client = MagicMock()
+        client.get_maindata.return_value = {
+            "rid": 1,
+            "full_update": True,
+            "torrents": {
+                "abc": {"category": "tv", "tags": "keep, seed"},
+                "def": {"category": "", "tags": ""}
+            }
+        }
+        mirror = common.TorrentStateMirror(client)
+
+        assert [t["hash"] for t in mirror.get_torrents(category="tv", tag="seed")] == ["abc"]
+        assert [t["hash"] for t in mirror.get_torrents(category="")] == ["def"]
+
+    def test_mirror_forwards_client_methods(self):
+        """Test unknown attributes are delegated to the wrapped client."""
+        client = MagicMock()
+        client.get_trackers.return_value = [{"status": 2}]
+        mirror = common.TorrentStateMirror(client)
+
+        assert mirror.get_trackers("abc") == [{"status": 2}]
+
+
+class TestFetchTrackers:
+    """Tests for fetch_trackers and format_latency_summary."""
+
+    def test_fetch_trackers_maps_hashes(self):
+        """Test trackers are returned per hash with latencies recorded."""
+        client = MagicMock()
+        client.get_trackers.side_effect = lambda h: [{"url": f"http://{h}", "status": 2}]
+
+        trackers, latencies = common.fetch_trackers(client, ["a", "b", "c", "a"], workers=2)
+
+        assert trackers == {
+            "a": [{"url": "http://a", "status": 2}],
+            "b": [{"url": "http://b", "status": 2}],
+            "c": [{"url": "http://c", "status": 2}]
+        }
+        assert set(latencies) == {"a", "b", "c"}
+        assert client.get_trackers.call_count == 3
+
+    def test_fetch_trackers_empty(self):
+        """Test no calls are made for an empty hash list."""
+        client = MagicMock()
+
+        assert common.fetch_trackers(client, []) == ({}, {})
+        client.get_trackers.assert_not_called()
+
+    @responses.activate
+    def test_qbitclient_get_trackers_batch(self):
+        """Test the client batch API logs in once and fetches every hash."""
+        responses.add(
+            responses.POST,
+            "http://localhost:8080/api/v2/auth/login",
+            body="Ok.",
+            status=200
+        )
+        responses.add(
+            responses.GET,
+            "http://localhost:8080/api/v2/torrents/trackers",
+            json=[{"status": 2}],
+            status=200
+        )
+
+        client = common.QBitClient("http://localhost:8080", "admin", "testpass")
+        trackers, _ = client.get_trackers_batch(["h1", "h2", "h3"], workers=3)
+
+        assert set(trackers) == {"h1", "h2", "h3"}
+        logins = [c for c in responses.calls if c.request.url.endswith("/auth/login")]
+        assert len(logins) == 1
+
+    def test_format_latency_summary(self):
+        """Test latency summary formatting."""
+        summary = common.format_latency_summary({"a": 0.010, "b": 0.030})
+
+        assert summary.startswith("2 calls, avg 20 ms")
+        assert "max 30 ms" in summary
+        assert common.format_latency_summary({}) == "0 calls"
+
+
+class TestTorrentTable:
+    """Tests for TorrentTable and TorrentRow."""
+
+    TORRENTS = [
+        {"hash": "abc", "name": "A", "state": "stalledDL", "progress": 0.5, "dlspeed": 0,
+         "tracker": "http://t", "magnet_uri": "magnet:?xt=abc"},
+        {"hash": "def", "name": "B", "state": "uploading", "progress": 1.0, "dlspeed": 100},
+        {"hash": "ghi", "name": "C", "state": "metaDL", "progress": 0.0}
+    ]
+
+    def test_table_projects_fields(self):
+        """Test rows expose projected fields and drop the rest."""
+        table = common.TorrentTable(torrents=self.TORRENTS)
+        row = table.get("abc")
+
+        assert len(table) == 3
+        assert row["name"] == "A"
+        assert row["progress"] == 0.5
+        assert row.get("magnet_uri") is None
+        assert "tracker" not in row
+        assert table.get("ghi")["dlspeed"] == 0
+        assert isinstance(table.column("progress"), common.array.array)
+
+    def test_table_select_scans_state_column(self):
+        """Test select returns rows matching a column value set."""
+        table = common.TorrentTable(torrents=self.TORRENTS)
+
+        stalled = table.select("state", {"stalledDL", "metaDL"})
+
+        assert [r["hash"] for r in stalled] == ["abc", "ghi"]
+        assert table.where("state", ["uploading"]) == [1]
+
+    def test_table_update_and_remove(self):
+        """Test partial updates and swap-removal keep the hash index consistent."""
+        table = common.TorrentTable(torrents=self.TORRENTS)
+
+        table.update("def", {"state": "pausedUP", "tracker": "ignored"})
+        table.remove("abc")
+
+        assert "abc" not in table
+        assert len(table) == 2
+        assert table.get("ghi")["name"] == "C"
+        assert table.get("def")["state"] == "pausedUP"
+        assert sorted(r["hash"] for r in table) == ["def", "ghi"]
+
+    def test_table_custom_projection(self):
+        """Test a custom projection always keeps the hash column."""
+        table = common.TorrentTable({"state": None}, self.TORRENTS)
+
+        assert list(next(iter(table)).keys()) == ["state", "hash"]
+        assert next(iter(table)).to_dict() == {"state": "stalledDL", "hash": "abc"}
+
+    def test_filter_by_state_handles_lists_and_tables(self):
+        """Test filter_by_state works for both dict lists and tables."""
+        table = common.TorrentTable(torrents=self.TORRENTS)
+
+        assert [t["hash"] for t in common.filter_by_state(self.TORRENTS, {"metaDL"})] == ["ghi"]
+        assert [t["hash"] for t in common.filter_by_state(table, {"metaDL"})] == ["ghi"]
+
+    @responses.activate
+    def test_qbitclient_returns_table_with_fields(self):
+        """Test QBitClient returns a TorrentTable when a projection is configured."""
+        responses.add(
+            responses.POST,
+            "http://localhost:8080/api/v2/auth/login",
+            body="Ok.",
+            status=200
+        )
+        responses.add(
+            responses.GET,
+            "http://localhost:8080/api/v2/torrents/info",
+            json=self.TORRENTS,
+            status=200
+        )
+
+        client = common.QBitClient(
+            "http://localhost:8080", "admin", "testpass", fields=common.TORRENT_FIELDS
+        )
+        torrents = client.get_torrents()
+
+        assert isinstance(torrents, common.TorrentTable)
+        assert len(torrents) == 3
+
+    def test_mirror_projects_fields(self):
+        """Test TorrentStateMirror keeps only projected keys."""
+        client = MagicMock()
+        client.get_maindata.return_value = {
+            "rid": 1, "full_update": True,
+            "torrents": {"abc": {"name": "A", "state": "uploading", "magnet_uri": "magnet:?"}}
+        }
+        mirror = common.TorrentStateMirror(client, fields=common.TORRENT_FIELDS)
+        mirror.sync()
+
+        assert mirror.torrents["abc"] == {"hash": "abc", "name": "A", "state": "uploading"}
+
+
+class TestIterTorrents:
+    """Tests for paged torrent iteration."""
+
+    @responses.activate
+    def test_iter_torrents_pages_until_short_page(self):
+        """Test iter_torrents requests successive offsets until a short page."""
+        responses.add(
+            responses.POST,
+            "http://localhost:8080/api/v2/auth/login",
+            body="Ok.",
+            status=200
+        )
+        for page in ([{"hash": "a"}, {"hash": "b"}], [{"hash": "c"}, {"hash": "d"}], [{"hash": "e"}]):
+            responses.add(
+                responses.GET,
+                "http://localhost:8080/api/v2/torrents/info",
+                json=page,
+                status=200
+            )
+
+        client = common.QBitClient("http://localhost:8080", "admin", "testpass")
+        hashes = [t["hash"] for t in client.iter_torrents(page_size=2, filter_by="stalled")]
+
+        assert hashes == ["a", "b", "c", "d", "e"]
+        urls = [c.request.url for c in responses.calls[1:]]
+        assert "offset=0" in urls[0] and "limit=2" in urls[0]
+        assert "offset=4" in urls[2]
+        assert all("filter=stalled" in u and "sort=added_on" in u for u in urls)
+
+    @responses.activate
+    def test_iter_torrents_is_lazy(self):
+        """Test the first page is yielded before the next one is requested."""
+        responses.add(
+            responses.POST,
+            "http://localhost:8080/api/v2/auth/login",
+            body="Ok.",
+            status=200
+        )
+        responses.add(
+            responses.GET,
+            "http://localhost:8080/api/v2/torrents/info",
+            json=[{"hash": "a"}],
+            status=200
+        )
+
+        client = common.QBitClient("http://localhost:8080", "admin", "testpass")
+        first = next(client.iter_torrents(page_size=1))
+
+        assert first == {"hash": "a"}
+        assert len(responses.calls) == 2
+
+    @responses.activate
+    def test_iter_torrents_projects_fields(self):
+        """Test iter_torrents yields TorrentRows when a projection is set."""
+        responses.add(
+            responses.POST,
+            "http://localhost:8080/api/v2/auth/login",
+            body="Ok.",
+            status=200
+        )
+        responses.add(
+            responses.GET,
+            "http://localhost:8080/api/v2/torrents/info",
+            json=[{"hash": "a", "state": "uploading", "magnet_uri": "x"}],
+            status=200
+        )
+
+        client = common.QBitClient(
+            "http://localhost:8080", "admin", "testpass", fields={"state": None}
+        )
+        rows = list(client.iter_torrents())
+
+        assert rows[0].to_dict() == {"state": "uploading", "hash": "a"}
+
+    def test_mirror_iter_torrents_sorted(self):
+        """Test the mirror yields its local rows in the requested order."""
+        client = MagicMock()
+        client.get_maindata.return_value = {
+            "rid": 1, "full_update": True,
+            "torrents": {"b": {"added_on": 2}, "a": {"added_on": 1}}
+        }
+        mirror = common.TorrentStateMirror(client)
+
+        assert [t["hash"] for t in mirror.iter_torrents(sort="added_on")] == ["a", "b"]
+
+
+class TestSessionCache:
+    """Tests for SessionCache and QBitClient SID reuse."""
+
+    def test_session_cache_store_and_expiry(self, tmp_path):
+        """Test cached cookies are returned until they expire."""
+        cache = common.SessionCache(str(tmp_path / "sid.json"), max_age=60)
+        cache.store("key", {"SID": "abc"})
+
+        assert cache.load("key") == {"SID": "abc"}
+        assert cache.load("other") is None
+
+        with patch("scripts.common.time.time", return_value=common.time.time() + 120):
+            assert cache.load("key") is None
+
+        cache.invalidate("key")
+        assert cache.load("key") is None
+        assert oct(os.stat(tmp_path / "sid.json").st_mode & 0o777) == "0o600"
+
+    def test_session_cache_ignores_corrupt_file(self, tmp_path):
+        """Test a corrupt cache file is treated as empty."""
+        path = tmp_path / "sid.json"
+        path.write_text("not json")
+        cache = common.SessionCache(str(path))
+
+        assert cache.load("key") is None
+        cache.store("key", {"SID": "x"})
+        assert cache.load("key") == {"SID": "x"}
+
+    @responses.activate
+    def test_qbitclient_reuses_cached_sid(self, tmp_path):
+        """Test a second client skips auth/login when a valid SID is cached."""
+        responses.add(
+            responses.POST,
+            "http://localhost:8080/api/v2/auth/login",
+            body="Ok.",
+            status=200,
+            headers={"Set-Cookie": "SID=fresh; path=/"}
+        )
+        responses.add(
+            responses.GET,
+            "http://localhost:8080/api/v2/app/preferences",
+            json={"save_path": "/downloads"},
+            status=200
+        )
+        cache_path = str(tmp_path / "sid.json")
+
+        first = common.QBitClient("http://localhost:8080", "admin", "pw", session_cache=cache_path)
+        assert first.get_preferences() == {"save_path": "/downloads"}
+
+        second = common.QBitClient("http://localhost:8080", "admin", "pw", session_cache=cache_path)
+        assert second.get_preferences() == {"save_path": "/downloads"}
+
+        logins = [c for c in responses.calls if c.request.url.endswith("/auth/login")]
+        assert len(logins) == 1
+        assert "SID=fresh" in responses.calls[-1].request.headers["Cookie"]
+
+    @responses.activate
+    def test_qbitclient_relogins_on_expired_cached_sid(self, tmp_path):
+        """Test a 403 with a cached SID falls back to a fresh login and retries."""
+        cache = common.SessionCache(str(tmp_path / "sid.json"))
+        cache.store("http://localhost:8080|admin", {"SID": "stale"})
+
+        responses.add(
+            responses.GET,
+            "http://localhost:8080/api/v2/torrents/categories",
+            status=403
+        )
+        responses.add(
+            responses.POST,
+            "http://localhost:8080/api/v2/auth/login",
+            body="Ok.",
+            status=200,
+            headers={"Set-Cookie": "SID=new; path=/"}
+        )
+        responses.add(
+            responses.GET,
+            "http://localhost:8080/api/v2/torrents/categories",
+            json={"tv": {"savePath": "/media/tv"}},
+            status=200
+        )
+
+        client = common.QBitClient("http://localhost:8080", "admin", "pw", session_cache=cache)
+
+        assert client.get_categories() == {"tv": {"savePath": "/media/tv"}}
+        assert cache.load("http://localhost:8080|admin") == {"SID": "new"}
+        assert len(responses.calls) == 3
+
+    @responses.activate
+    def test_qbitclient_concurrent_403s_log_in_once(self):
+        """Test threads that all hit an expired SID share one re-login."""
+        workers = 8
+        barrier = threading.Barrier(workers, timeout=5)
+
+        def trackers(request):
+            if "SID=new" in request.headers.get("Cookie", ""):
+                return (200, {}, json.dumps([{"status": 2}]))
+            # Hold every stale request until all of them are in flight
+            barrier.wait()
+            return (403, {}, "")
+
+        responses.add_callback(
+            responses.GET,
+            "http://localhost:8080/api/v2/torrents/trackers",
+            callback=trackers
+        )
+        responses.add(
+            responses.POST,
+            "http://localhost:8080/api/v2/auth/login",
+            body="Ok.",
+            status=200,
+            headers={"Set-Cookie": "SID=new; path=/"}
+        )
+        client = common.QBitClient("http://localhost:8080", "admin", "pw")
+        client.session.cookies.set("SID", "stale")
+        client.logged_in = True
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(client.get_trackers, [str(i) for i in range(workers)]))
+
+        assert results == [[{"status": 2}]] * workers
+        logins = [c for c in responses.calls if c.request.url.endswith("/auth/login")]
+        assert len(logins) == 1
+
+
+class TestSearchTorrents:
+    """Tests for search_torrents."""
+
+    TORRENTS = [
+        {"hash": "aa11", "name": "Ubuntu.22.04.Desktop.amd64"},
+        {"hash": "aa22", "name": "ubuntu-server_24.04"},
+        {"hash": "bb33", "name": "Debian 12 Netinst"}
+    ]
+
+    def test_search_exact_and_prefix_hash(self):
+        """Test exact hashes win and hex prefixes list every match."""
+        assert common.search_torrents(self.TORRENTS, "BB33") == [("bb33", "hash")]
+        assert common.search_torrents(self.TORRENTS, "aa1") == [("aa11", "hash prefix")]
+        assert [h for h, _ in common.search_torrents(self.TORRENTS, "aa2")] == ["aa22"]
+
+    def test_search_substring_returns_all_candidates(self):
+        """Test substring matching normalizes separators and returns every hit."""
+        results = common.search_torrents(self.TORRENTS, "ubuntu")
+
+        assert [h for h, _ in results] == ["aa22", "aa11"]
+        assert all(match == "name" for _, match in results)
+        assert common.search_torrents(self.TORRENTS, "22 04") == [("aa11", "name")]
+        assert [h for h, _ in common.search_torrents(self.TORRENTS, "u")] == ["aa22", "aa11"]
+
+    def test_search_fuzzy_ranks_typos(self):
+        """Test fuzzy matches are used when nothing matches literally."""
+        results = common.search_torrents(self.TORRENTS, "debain netinst")
+
+        assert results[0][0] == "bb33"
+        assert results[0][1].startswith("fuzzy")
+        assert common.search_torrents(self.TORRENTS, "zzzz") == []
+        assert common.search_torrents(self.TORRENTS, "") == []
+
+
+class TestFormatting:
+    """Tests for size/duration formatting and device lookup helpers."""
+
+    def test_format_size(self):
+        """Test binary unit formatting."""
+        assert common.format_size(512) == "512 B"
+        assert common.format_size(1536) == "1.5 KiB"
+        assert common.format_size(3 * 1024 ** 4) == "3.0 TiB"
+
+    def test_format_duration(self):
+        """Test duration formatting."""
+        assert common.format_duration(42) == "42s"
+        assert common.format_duration(185) == "3m 05s"
+        assert common.format_duration(3720) == "1h 02m"
+        assert common.format_duration(-5) == "0s"
+
+    def test_path_device_walks_up_to_existing_parent(self, tmp_path):
+        """Test missing paths resolve to the device of the nearest existing parent."""
+        expected = os.stat(tmp_path).st_dev
+
+        assert common.path_device(str(tmp_path / "missing" / "deeper")) == expected
+        assert common.path_device(str(tmp_path)) == expected
+
+    def test_path_device_maps_container_paths(self, tmp_path):
+        """Test container paths are mapped first and unresolvable ones return None."""
+        expected = os.stat(tmp_path).st_dev
+
+        assert common.path_device("/data/downloads", [("/data", str(tmp_path))]) == expected
+        assert common.path_device("/no-such-mount/downloads") is None
+
+
+class TestBencode:
+    """Tests for the bencode infohash helpers."""
+
+    V1_INFO = b"d6:lengthi10e4:name4:test12:piece lengthi16384e6:pieces20:" + b"x" * 20 + b"e"
+    V2_INFO = b"d9:file treed4:testd0:d6:lengthi10eeee12:meta versioni2e4:name4:test12:piece lengthi16384ee"
+    HYBRID_INFO = (
+        b"d9:file treed4:testd0:d6:lengthi10eeee6:lengthi10e12:meta versioni2e4:name4:test"
+        b"12:piece lengthi16384e6:pieces20:" + b"x" * 20 + b"e"
+    )
+
+    def torrent(self, info):
+        return b"d8:announce14:http://tracker4:info" + info + b"e"
+
+    def test_infohashes_rejects_bad_input(self):
+        """Test malformed data raises BencodeError."""
+        for bad in (b"x", b"d4:infoi42", b"d4:infol4:spam", b"d4:info10:short", b"d4:infoxe"):
+            with pytest.raises(common.BencodeError):
+                common.infohashes_from_bytes(bad)
+
+    def test_infohashes_v1_v2_hybrid(self):
+        """Test v1, v2 and hybrid torrents hash the raw info dict."""
+        assert common.infohashes_from_bytes(self.torrent(self.V1_INFO)) == (
+            hashlib.sha1(self.V1_INFO).hexdigest(), None
+        )
+        assert common.infohashes_from_bytes(self.torrent(self.V2_INFO)) == (
+            None, hashlib.sha256(self.V2_INFO).hexdigest()
+        )
+        assert common.infohashes_from_bytes(self.torrent(self.HYBRID_INFO)) == (
+            hashlib.sha1(self.HYBRID_INFO).hexdigest(),
+            hashlib.sha256(self.HYBRID_INFO).hexdigest()
+        )
+
+    def test_infohashes_requires_info(self):
+        """Test a torrent without an info dict is rejected."""
+        with pytest.raises(common.BencodeError):
+            common.infohashes_from_bytes(b"d8:announce3:urle")
+
+    def test_torrent_infohashes_uses_mmap_for_large_files(self, tmp_path):
+        """Test large files are read through mmap and hash the same."""
+        path = tmp_path / "a.torrent"
+        path.write_bytes(self.torrent(self.V1_INFO))
+        expected = common.torrent_infohashes(str(path))
+
+        with patch.object(common, "TORRENT_MMAP_THRESHOLD", 1), \
+                patch.object(common.mmap, "mmap", wraps=common.mmap.mmap) as mock_mmap:
+            assert common.torrent_infohashes(str(path)) == expected
+            mock_mmap.assert_called_once()
+
+    def test_scan_torrent_hashes_pool_and_errors(self, tmp_path):
+        """Test directory scans report hashes and per-file parse errors."""
+        good = tmp_path / "good.torrent"
+        good.write_bytes(self.torrent(self.V1_INFO))
+        bad = tmp_path / "bad.torrent"
+        bad.write_bytes(b"not bencode")
+        paths = [str(good), str(bad)]
+
+        serial = common.scan_torrent_hashes(paths)
+        with patch.object(common, "TORRENT_POOL_THRESHOLD", 1):
+            pooled = common.scan_torrent_hashes(paths, workers=2)
+
+        assert serial[str(good)] == pooled[str(good)]
+        assert isinstance(serial[str(bad)], common.BencodeError)
+        assert isinstance(pooled[str(bad)], common.BencodeError)
+
+    def test_loaded_infohashes(self):
+        """Test loaded ids include v1, v2 and the truncated v2 id."""
+        v2 = "b" * 64
+        known = common.loaded_infohashes([{"hash": v2[:40], "infohash_v1": "", "infohash_v2": v2}])
+
+        assert known == {v2[:40], v2}
+
+
+class TestAddTorrentFiles:
+    """Tests for QBitClient.add_torrent_files batching."""
+
+    @responses.activate
+    def test_batches_by_size_and_reports_per_file(self, tmp_path):
+        """Test files are packed into size-bounded requests with shared options."""
+        responses.add(responses.POST, "http://localhost:8080/api/v2/auth/login", body="Ok.", status=200)
+        responses.add(responses.POST, "http://localhost:8080/api/v2/torrents/add", body="Ok.", status=200)
+        responses.add(responses.POST, "http://localhost:8080/api/v2/torrents/add", body="Fails.", status=200)
+        paths = []
+        for name in ("a", "b", "c"):
+            path = tmp_path / f"{name}.torrent"
+            path.write_bytes(b"x" * 10)
+            paths.append(str(path))
+        missing = str(tmp_path / "missing.torrent")
+
+        client = common.QBitClient("http://localhost:8080", "admin", "testpass")
+        with patch("builtins.print"):
+            results = client.add_torrent_files(
+                paths + [missing], save_path="/downloads", category="tv",
+                tags=["x", "y"], max_batch_bytes=25,
+            )
+
+        assert results == {
+            paths[0]: "added", paths[1]: "added", paths[2]: "failed", missing: "unreadable",
+        }
+        uploads = [c.request for c in responses.calls if c.request.url.endswith("/torrents/add")]
+        assert len(uploads) == 2
+        assert uploads[0].body.count(b'name="torrents"') == 2
+        assert b"/downloads" in uploads[0].body
+        assert b"x,y" in uploads[1].body
+
+    @responses.activate
+    def test_respects_file_count_limit(self, tmp_path):
+        """Test max_batch_files splits uploads regardless of size."""
+        responses.add(responses.POST, "http://localhost:8080/api/v2/auth/login", body="Ok.", status=200)
+        responses.add(responses.POST, "http://localhost:8080/api/v2/torrents/add", body="Ok.", status=200)
+        paths = []
+        for name in ("a", "b", "c"):
+            path = tmp_path / f"{name}.torrent"
+            path.write_bytes(b"x")
+            paths.append(str(path))
+
+        client = common.QBitClient("http://localhost:8080", "admin", "testpass")
+        results = client.add_torrent_files(paths, max_batch_files=2)
+
+        assert set(results.values()) == {"added"}
+        assert sum(c.request.url.endswith("/torrents/add") for c in responses.calls) == 2
+
+    @responses.activate
+    def test_login_failure_marks_all_failed(self, tmp_path):
+        """Test nothing is uploaded when login fails."""
+        responses.add(responses.POST, "http://localhost:8080/api/v2/auth/login", body="Fails.", status=200)
+        path = tmp_path / "a.torrent"
+        path.write_bytes(b"x")
+
+        client = common.QBitClient("http://localhost:8080", "admin", "testpass")
+        with patch("builtins.print"):
+            assert client.add_torrent_files([str(path)]) == {str(path): "failed"}
+
+
+class TestTrackerHealthStore:
+    """Tests for the SQLite tracker health store."""
+
+    def test_fresh_returns_recent_results_only(self, tmp_path):
+        """Test entries are served until they are older than the TTL."""
+        store = common.TrackerHealthStore(str(tmp_path / "health.sqlite"), ttl=60)
+        store.record({"abc": [{"url": "udp://t", "status": 4, "msg": "timed out", "num_peers": 0}]}, now=1000)
+
+        fresh = store.fresh(["abc", "def"], now=1030)
+        assert list(fresh) == ["abc"]
+        assert fresh["abc"][0]["msg"] == "timed out"
+        assert store.fresh(["abc"], now=1100) == {}
+
+    def test_dead_for_tracks_failure_history(self, tmp_path):
+        """Test failing_since survives repeated failures and resets when working."""
+        store = common.TrackerHealthStore(str(tmp_path / "health.sqlite"))
+        failing = {"abc": [{"url": "udp://t", "status": 4}]}
+        store.record(failing, now=1000)
+        store.record(failing, now=5000)
+
+        assert store.dead_for("abc", now=6000) == 5000
+        store.record({"abc": [{"url": "udp://t", "status": 2}]}, now=7000)
+        assert store.dead_for("abc", now=8000) is None
+        assert store.dead_for("unknown") is None
+
+    def test_fetch_trackers_skips_fresh_hashes(self, tmp_path):
+        """Test only stale hashes are fetched and fetched results are recorded."""
+        store = common.TrackerHealthStore(str(tmp_path / "health.sqlite"))
+        store.record({"abc": [{"url": "udp://a", "status": 2}]})
+        client = MagicMock()
+        client.get_trackers.return_value = [{"url": "udp://b", "status": 4}]
+
+        trackers, latencies = common.fetch_trackers(client, ["abc", "def"], store=store)
+
+        client.get_trackers.assert_called_once_with("def")
+        assert list(latencies) == ["def"]
+        assert trackers["abc"][0]["url"] == "udp://a"
+        assert "def" in store.fresh(["def"])
+
+    def test_failed_lookup_is_not_recorded(self, tmp_path):
+        """Test an empty tracker list (failed call) is retried next run."""
+        store = common.TrackerHealthStore(str(tmp_path / "health.sqlite"))
+        client = MagicMock()
+        client.get_trackers.return_value = []
+
+        common.fetch_trackers(client, ["abc"], store=store)
+
+        assert store.fresh(["abc"]) == {}
+
+    def test_unavailable_database_disables_store(self, tmp_path):
+        """Test an unopenable path degrades to no caching."""
+        blocker = tmp_path / "file"
+        blocker.write_text("x")
+        store = common.TrackerHealthStore(str(blocker / "health.sqlite"))
+
+        with patch("builtins.print") as mock_print:
+            assert store.fresh(["abc"]) == {}
+            store.record({"abc": [{"url": "u", "status": 2}]})
+        assert store.dead_for("abc") is None
+        assert mock_print.call_count == 1
+
+
+
+class TestProvisioningStateStore:
+    """Tests for ProvisioningStateStore."""
+
+    def test_round_trip_and_expiry(self, tmp_path):
+        """Test recorded fingerprints load back until they are older than max_age."""
+        store = common.ProvisioningStateStore(str(tmp_path / "state.sqlite"), max_age=60)
+        store.record({"sonarr": ("cfg", "remote")}, now=1000)
+
+        assert store.load(now=1030) == {"sonarr": ("cfg", "remote")}
+        assert store.load(now=1100) == {}
+
+    def test_record_replaces_previous_run(self):
+        """Test a newer run overwrites the stored fingerprints."""
+        store = common.ProvisioningStateStore(":memory:")
+        store.record({"radarr": ("a", "b")})
+        store.record({"radarr": ("c", "d")})
+
+        assert store.load() == {"radarr": ("c", "d")}
+
+    def test_secrets_replace_per_service(self):
+        """Test recorded secret hashes replace only the services they name."""
+        store = common.ProvisioningStateStore(":memory:")
+        store.record_secrets({"sonarr": {"qBittorrent/password": "a"}, "radarr": {"qBittorrent/password": "b"}})
+        store.record_secrets({"sonarr": {"qBittorrent/username": "c"}})
+
+        assert store.load_secrets() == {
+            "sonarr": {"qBittorrent/username": "c"},
+            "radarr": {"qBittorrent/password": "b"},
+        }
+
+class TestTorrentHistory:
+    """Tests for the per-torrent ring buffer."""
+
+    def test_capacity_bounds_samples(self):
+        """Test the oldest samples are overwritten once the buffer is full."""
+        history = common.TorrentHistory(capacity=3)
+        for i in range(5):
+            history.record([{'hash': 'a', 'progress': i / 10}], now=float(i))
+
+        samples = history.samples('a')
+        assert [s[0] for s in samples] == [2.0, 3.0, 4.0]
+        assert len(history) == 1
+
+    def test_rate_eta_and_smoothed_speed(self):
+        """Test progress rate, ETA and EMA speed from recorded samples."""
+        history = common.TorrentHistory()
+        history.record([{'hash': 'a', 'progress': 0.5, 'dlspeed': 100}], now=0.0)
+        history.record([{'hash': 'a', 'progress': 0.6, 'dlspeed': 200}], now=10.0)
+
+        assert history.progress_rate('a') == pytest.approx(0.01)
+        assert history.eta('a') == pytest.approx(40.0)
+        assert history.smoothed_speed('a', alpha=0.5) == pytest.approx(150.0)
+        assert history.eta('missing') is None
+
+    def test_stalled_for_measures_flat_progress(self):
+        """Test stall time counts back to the last progress increase."""
+        history = common.TorrentHistory()
+        for now, progress in ((0, 0.1), (60, 0.2), (120, 0.2), (300, 0.2)):
+            history.record([{'hash': 'a', 'progress': progress}], now=float(now))
+
+        assert history.stalled_for('a') == 240.0
+        assert history.no_progress('a', 240)
+        assert not history.no_progress('a', 241)
+
+    def test_forget_drops_history(self):
+        """Test forgotten torrents free their buffers."""
+        history = common.TorrentHistory()
+        history.record([{'hash': 'a'}, {'hash': 'b'}], now=1.0)
+        history.forget(['a'])
+
+        assert history.samples('a') == []
+        assert len(history) == 1
+
+
+class TestMultiQBitClient:
+    """Tests for fanning out over several qBittorrent instances."""
+
+    def _clients(self):
+        one = MagicMock()
+        one.get_torrents.return_value = [{'hash': 'a1', 'name': 'A'}]
+        one.iter_torrents.return_value = iter([{'hash': 'a1', 'name': 'A'}])
+        two = MagicMock()
+        two.get_torrents.return_value = [{'hash': 'b1', 'name': 'B'}, {'hash': 'b2', 'name': 'C'}]
+        two.iter_torrents.return_value = iter([{'hash': 'b1', 'name': 'B'}])
+        return one, two
+
+    def test_get_torrents_merges_and_tags(self):
+        """Test results from every instance are merged and tagged."""
+        one, two = self._clients()
+        client = common.MultiQBitClient({'one': one, 'two': two})
+
+        torrents = client.get_torrents(filter_by='downloading')
+
+        assert [(t['hash'], t['instance']) for t in torrents] == [('a1', 'one'), ('b1', 'two'), ('b2', 'two')]
+        one.get_torrents.assert_called_once_with('downloading', None, None, None, None)
+
+    def test_get_torrents_merges_tables(self):
+        """Test tabled instances merge into one TorrentTable with an instance column."""
+        one, two = self._clients()
+        one.get_torrents.return_value = common.TorrentTable(common.TORRENT_FIELDS, [{'hash': 'a1', 'size': 5}])
+        two.get_torrents.return_value = common.TorrentTable(common.TORRENT_FIELDS, [{'hash': 'b1', 'size': 7}])
+        client = common.MultiQBitClient({'one': one, 'two': two})
+
+        torrents = client.get_torrents()
+
+        assert isinstance(torrents, common.TorrentTable)
+        assert list(torrents.column('instance')) == ['one', 'two']
+        assert list(torrents.column('size')) == [5, 7]
+        assert client.owners == {'a1': ['one'], 'b1': ['two']}
+
+    def test_duplicate_hash_is_reported_and_routed_to_all(self):
+        """Test a hash on two instances is reported once and acted on everywhere."""
+        one, two = self._clients()
+        two.get_torrents.return_value = [{'hash': 'a1', 'name': 'A'}]
+        two.get_trackers.return_value = [{'status': 2}]
+        client = common.MultiQBitClient({'one': one, 'two': two})
+
+        with patch('builtins.print') as mock_print:
+            client.get_torrents()
+            client.get_torrents()
+            client.delete_torrents('a1')
+            client.get_trackers('a1')
+
+        conflicts = [call for call in mock_print.call_args_list if 'several' in str(call)]
+        assert len(conflicts) == 1
+        assert client.owners['a1'] == ['one', 'two']
+        one.delete_torrents.assert_called_once_with('a1', False)
+        two.delete_torrents.assert_called_once_with('a1', False)
+        one.get_trackers.assert_called_once_with('a1')
+        two.get_trackers.assert_not_called()
+
+    def test_close_shuts_down_workers(self):
+        """Test close() stops the worker threads and closes every instance."""
+        one, two = self._clients()
+        with common.MultiQBitClient({'one': one, 'two': two}) as client:
+            client.get_torrents()
+
+        one.close.assert_called_once()
+        two.close.assert_called_once()
+        with pytest.raises(RuntimeError):
+            client.get_torrents()
+
+    def test_iter_torrents_tags_each_instance(self):
+        """Test iter_torrents yields every instance's torrents."""
+        one, two = self._clients()
+        client = common.MultiQBitClient({'one': one, 'two': two})
+
+        assert sorted((t['hash'], t['instance']) for t in client.iter_torrents()) == [('a1', 'one'), ('b1', 'two')]
+
+    def test_actions_route_to_owner(self):
+        """Test bulk actions are split into one request per owning instance."""
+        one, two = self._clients()
+        client = common.MultiQBitClient({'one': one, 'two': two})
+        client.get_torrents()
+
+        client.recheck_torrent('a1|b1|b2')
+        client.delete_torrents('b2', True)
+
+        one.recheck_torrent.assert_called_once_with('a1')
+        two.recheck_torrent.assert_called_once_with('b1|b2')
+        two.delete_torrents.assert_called_once_with('b2', True)
+        one.delete_torrents.assert_not_called()
+
+    def test_unknown_hash_is_looked_up(self):
+        """Test hashes not seen yet are located before routing."""
+        one, two = self._clients()
+        one.get_torrents.return_value = []
+        two.get_torrents.return_value = [{'hash': 'b9'}]
+        client = common.MultiQBitClient({'one': one, 'two': two})
+
+        with patch('builtins.print') as mock_print:
+            client.reannounce_torrent('b9|zz')
+
+        two.reannounce_torrent.assert_called_once_with('b9')
+        one.reannounce_torrent.assert_not_called()
+        assert any('zz' in str(call) for call in mock_print.call_args_list)
+
+    def test_get_trackers_uses_owner(self):
+        """Test tracker lookups go to the instance that owns the hash."""
+        one, two = self._clients()
+        two.get_trackers.return_value = [{'status': 2}]
+        client = common.MultiQBitClient({'one': one, 'two': two})
+        client.get_torrents()
+
+        assert client.get_trackers('b1') == [{'status': 2}]
+        one.get_trackers.assert_not_called()
+
+    def test_failing_instance_does_not_break_merge(self):
+        """Test an instance raising is reported and skipped."""
+        one, two = self._clients()
+        one.get_torrents.side_effect = RuntimeError('down')
+        client = common.MultiQBitClient({'one': one, 'two': two})
+
+        with patch('builtins.print'):
+            torrents = client.get_torrents()
+
+        assert {t['instance'] for t in torrents} == {'two'}
+
+    def test_iter_torrents_streams_pages(self):
+        """Test torrents are yielded before an instance's iterator is exhausted."""
+        consumed = threading.Event()
+        streamed = []
+
+        def pages(*args, **kwargs):
+            yield {'hash': 'a1'}
+            streamed.append(consumed.wait(timeout=2))
+            yield {'hash': 'a2'}
+
+        one, two = self._clients()
+        one.iter_torrents.side_effect = pages
+        two.iter_torrents.return_value = iter([])
+        client = common.MultiQBitClient({'one': one, 'two': two})
+
+        hashes = []
+        for t in client.iter_torrents():
+            hashes.append(t['hash'])
+            consumed.set()
+
+        assert hashes == ['a1', 'a2']
+        assert streamed == [True]
+
+    def test_get_maindata_merges_instances(self):
+        """Test maindata is merged, tagged and resumed with each instance's own rid."""
+        one, two = self._clients()
+        one.get_maindata.side_effect = [
+            {'rid': 5, 'full_update': True, 'torrents': {'a1': {'name': 'A'}},
+             'server_state': {'dl_info_speed': 10, 'connection_status': 'connected'}},
+            {'rid': 6, 'torrents': {'a1': {'progress': 0.5}}},
+        ]
+        two.get_maindata.side_effect = [
+            {'rid': 9, 'full_update': True, 'torrents': {'b1': {'name': 'B'}},
+             'server_state': {'dl_info_speed': 5, 'connection_status': 'firewalled'}},
+            {'rid': 10, 'torrents_removed': ['b1'], 'server_state': {'dl_info_speed': 7}},
+        ]
+        client = common.MultiQBitClient({'one': one, 'two': two})
+        mirror = common.TorrentStateMirror(client)
+
+        mirror.sync()
+        changed, removed = mirror.sync()
+
+        one.get_maindata.assert_called_with(5)
+        two.get_maindata.assert_called_with(9)
+        assert mirror.torrents == {'a1': {'hash': 'a1', 'name': 'A', 'progress': 0.5, 'instance': 'one'}}
+        assert (changed, removed) == ({'a1'}, {'b1'})
+        assert mirror.server_state == {'dl_info_speed': 17, 'connection_status': 'connected'}
+
+    def test_get_maindata_full_update_from_one_instance_refetches_all(self):
+        """Test one instance resetting its rid turns the merged response into a full update."""
+        one, two = self._clients()
+        one.get_maindata.side_effect = [
+            {'rid': 1, 'full_update': True, 'torrents': {'a1': {'name': 'A'}}},
+            {'rid': 2, 'full_update': True, 'torrents': {'a1': {'name': 'A'}}},
+        ]
+        two.get_maindata.side_effect = [
+            {'rid': 1, 'full_update': True, 'torrents': {'b1': {'name': 'B'}}},
+            {'rid': 2, 'torrents': {}},
+            {'rid': 3, 'full_update': True, 'torrents': {'b1': {'name': 'B'}}},
+        ]
+        client = common.MultiQBitClient({'one': one, 'two': two})
+        mirror = common.TorrentStateMirror(client)
+
+        mirror.sync()
+        mirror.sync()
+
+        two.get_maindata.assert_called_with(0)
+        assert sorted(mirror.torrents) == ['a1', 'b1']
+
+    def test_get_trackers_batch_routes_each_hash(self):
+        """Test the tracker batch asks every hash's owner rather than the first instance."""
+        one, two = self._clients()
+        one.get_trackers.return_value = [{'status': 2}]
+        two.get_trackers.return_value = [{'status': 4}]
+        client = common.MultiQBitClient({'one': one, 'two': two})
+        client.get_torrents()
+
+        trackers, _ = client.get_trackers_batch(['a1', 'b1'])
+
+        assert trackers == {'a1': [{'status': 2}], 'b1': [{'status': 4}]}
+
+    def test_unimplemented_methods_raise(self):
+        """Test calls without a fleet-wide meaning are not forwarded to one instance."""
+        one, two = self._clients()
+        client = common.MultiQBitClient({'one': one, 'two': two})
+
+        with pytest.raises(AttributeError):
+            client.get_preferences()
+        one.get_preferences.assert_not_called()
+
+    def test_connect_qbit_single_and_multi(self):
+        """Test connect_qbit returns a plain client for one instance."""
+        config = MagicMock()
+        factory = MagicMock()
+        config.qbit_instances = [{'name': 'default', 'url': 'u', 'username': 'x', 'password': 'y'}]
+        assert common.connect_qbit(config, factory, fields=None) is factory.return_value
+
+        config.qbit_instances = [
+            {'name': 'a', 'url': 'http://a', 'username': 'x', 'password': 'y'},
+            {'name': 'b', 'url': 'http://b', 'username': 'x', 'password': 'y'},
+        ]
+        client = common.connect_qbit(config, factory)
+        assert isinstance(client, common.MultiQBitClient)
+        assert list(client.clients) == ['a', 'b']
+        factory.assert_any_call('http://b', 'x', 'y')
+
+
+class TestTorrentFiles:
+    """Tests for torrent file lists, caching and directory scans."""
+
+    @responses.activate
+    def test_get_torrent_files(self):
+        """Test torrents/files is requested for the given hash."""
+        responses.add(responses.POST, "http://localhost:8080/api/v2/auth/login", body="Ok.", status=200)
+        responses.add(
+            responses.GET, "http://localhost:8080/api/v2/torrents/files",
+            json=[{"name": "Show/ep1.mkv", "size": 10}], status=200,
+        )
+        client = common.QBitClient("http://localhost:8080", "admin", "testpass")
+
+        assert client.get_torrent_files("abc") == [{"name": "Show/ep1.mkv", "size": 10}]
+        assert "hash=abc" in responses.calls[1].request.url
+
+    def test_files_cache_round_trip_and_expiry(self, tmp_path):
+        """Test cached file lists are returned until max_age passes."""
+        cache = common.TorrentFilesCache(str(tmp_path / "files.sqlite"), max_age=100)
+        cache.store({"abc": [{"name": "a", "size": 1}]}, now=1000)
+
+        assert cache.get_many(["abc", "def"], now=1050) == {"abc": [{"name": "a", "size": 1}]}
+        assert cache.get_many(["abc"], now=1200) == {}
+
+    def test_fetch_torrent_files_uses_cache(self, tmp_path):
+        """Test only uncached hashes are fetched and results are cached."""
+        cache = common.TorrentFilesCache(str(tmp_path / "files.sqlite"))
+        cache.store({"abc": [{"name": "a", "size": 1}]})
+        client = MagicMock()
+        client.get_torrent_files.return_value = [{"name": "b", "size": 2}]
+
+        files = common.fetch_torrent_files(client, ["abc", "def"], cache=cache)
+
+        client.get_torrent_files.assert_called_once_with("def")
+        assert files["def"] == [{"name": "b", "size": 2}]
+        assert "def" in cache.get_many(["def"])
+
+    def test_map_path(self):
+        """Test prefixes are replaced only on path boundaries."""
+        path_map = [("/media/downloads", "/mnt/data")]
+        assert common.map_path("/media/downloads/tv/a.mkv", path_map) == "/mnt/data/tv/a.mkv"
+        assert common.map_path("/media/downloads2/a", path_map) == "/media/downloads2/a"
+
+    def test_list_directories_and_walk(self, tmp_path):
+        """Test directory listings report file sizes and the walker recurses."""
+        (tmp_path / "a").mkdir()
+        (tmp_path / "a" / "one.bin").write_bytes(b"x" * 3)
+        (tmp_path / "top.bin").write_bytes(b"y")
+
+        listing = common.list_directories([str(tmp_path), str(tmp_path / "missing")])
+        assert listing[str(tmp_path)] == {"a": None, "top.bin": 1}
+        assert listing[str(tmp_path / "missing")] is None
+        assert sorted(common.walk_files([str(tmp_path)])) == [
+            (str(tmp_path / "a" / "one.bin"), 3),
+            (str(tmp_path / "top.bin"), 1),
+        ]
+
+
+class TestScanTree:
+    """Tests for the mtime-cached directory scan."""
+
+    def test_scan_tree_reuses_unchanged_directories(self, tmp_path):
+        """Test a second scan only re-lists directories whose mtime changed."""
+        root = tmp_path / "data"
+        (root / "a").mkdir(parents=True)
+        (root / "b").mkdir()
+        (root / "a" / "one.bin").write_bytes(b"x")
+        cache = common.DirectoryCache(str(tmp_path / "cache" / "dirs.sqlite"))
+
+        listing, rescanned = common.scan_tree([str(root)], cache=cache)
+        assert rescanned == 3
+        assert listing[str(root / "a")] == {"one.bin": 1}
+
+        (root / "b" / "new.bin").write_bytes(b"yy")
+        listing, rescanned = common.scan_tree([str(root)], cache=cache)
+        assert rescanned == 1
+        assert listing[str(root / "b")] == {"new.bin": 2}
+
+    def test_scan_tree_without_cache(self, tmp_path):
+        """Test scan_tree lists nested directories and skips missing roots."""
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "f").write_bytes(b"abc")
+
+        listing, rescanned = common.scan_tree([str(tmp_path), str(tmp_path / "nope")])
+
+        assert listing == {str(tmp_path): {"sub": None}, str(tmp_path / "sub"): {"f": 3}}
+        assert rescanned == 2
@@ -1,39 +1,55 @@
 """Tests for check_torrent_status.py"""
+import io
+import json
+import time
 import pytest
 from unittest.mock import patch, MagicMock
 from scripts.utilities import check_torrent_status
+from scripts.common import TorrentStateMirror, TrackerHealthStore
 
 
-class TestPrintTable:
-    """Tests for print_table function."""
+class TestRowWriter:
+    """Tests for the streaming output layer."""
 
-    def test_print_table_formats_correctly(self):
-        """Test print_table formats output correctly."""
-        headers = ['Col1', 'Col2']
-        rows = [['val1', 'val2'], ['val3', 'val4']]
+    COLUMNS = [('Name', 6, lambda r: r['name']), ('Size', 4, lambda r: r['size'])]
+
+    def test_table_truncates_and_streams(self):
+        """Test table rows are printed one at a time with fixed widths."""
+        writer = check_torrent_status.RowWriter(self.COLUMNS)
 
         with patch('builtins.print') as mock_print:
-            check_torrent_status.print_table(headers, rows)
-            # Should print header, separator, and rows
-            assert mock_print.call_count >= 3
+            count = writer.write_all({'name': 'A long name', 'size': 1} for _ in range(2))
 
-    def test_print_table_handles_long_values(self):
-        """Test print_table with long values."""
-        headers = ['Name', 'Status']
-        rows = [['Very Long Name That Exceeds Width', 'OK']]
+        assert count == 2
+        assert mock_print.call_args_list[2][0][0] == 'A long | 1   '
 
-        with patch('builtins.print') as mock_print:
-            check_torrent_status.print_table(headers, rows)
-            assert mock_print.call_count >= 2
+    def test_ndjson_writes_records(self, capsys):
+        """Test NDJSON emits one compact JSON object per line."""
+        writer = check_torrent_status.RowWriter(self.COLUMNS, 'ndjson')
+        writer.write_all([{'name': 'A', 'size': 1}, {'name': 'B', 'size': 2}])
 
-    def test_print_table_empty_rows(self):
-        """Test print_table with empty rows."""
-        headers = ['Col1', 'Col2']
-        rows = []
+        lines = capsys.readouterr().out.splitlines()
+        assert [json.loads(line) for line in lines] == [{'name': 'A', 'size': 1}, {'name': 'B', 'size': 2}]
 
-        with patch('builtins.print') as mock_print:
-            check_torrent_status.print_table(headers, rows)
-            assert mock_print.call_count >= 2
+    def test_csv_writes_header_once(self, capsys):
+        """Test CSV takes its header from the first record and encodes lists as JSON."""
+        writer = check_torrent_status.RowWriter(self.COLUMNS, 'csv')
+        writer.write_all([{'name': 'A, B', 'tags': ['x']}, {'name': 'C', 'tags': []}])
+
+        assert capsys.readouterr().out.splitlines() == ['name,tags', '"A, B","[""x""]"', 'C,[]']
+
+    def test_info_goes_to_stderr_for_machine_formats(self, capsys):
+        """Test status messages do not pollute NDJSON output."""
+        check_torrent_status.RowWriter(self.COLUMNS, 'ndjson').info('Found 3')
+
+        captured = capsys.readouterr()
+        assert captured.out == ''
+        assert 'Found 3' in captured.err
+
+    def test_unknown_format_rejected(self):
+        """Test an unsupported format raises ValueError."""
+        with pytest.raises(ValueError):
+            check_torrent_status.RowWriter(self.COLUMNS, 'xml')
 
 
 class TestCheckAll:
@@ -42,7 +58,7 @@ class TestCheckAll:
     def test_check_all_prints_table(self):
         """Test check_all prints torrent table."""
         class DummyClient:
-            def get_torrents(self):
+            def iter_torrents(self, page_size=None):
                 return [
                     {'name': 'A', 'state': 'error', 'progress': 0.5, 'error_type': 'Disk'},
                     {'name': 'B', 'state': 'stalledDL', 'progress': 0.1},
@@ -56,20 +72,52 @@ class TestCheckAll:
     def test_check_all_no_torrents(self):
         """Test check_all with no torrents."""
         client = MagicMock()
-        client.get_torrents.return_value = []
+        client.iter_torrents.return_value = iter([])
 
         with patch('builtins.print') as mock_print:
             check_torrent_status.check_all(client)
             assert any('No torrents found' in str(call) for call in mock_print.call_args_list)
 
+    def test_check_all_streams_pages(self):
+        """Test check_all prints rows while later pages are still pending."""
+        printed = []
+
+        def pages(page_size):
+            yield {'name': 'First', 'state': 'downloading', 'progress': 0.1}
+            assert any('First' in line for line in printed)
+            yield {'name': 'Second', 'state': 'uploading', 'progress': 1.0}
+
+        client = MagicMock()
+        client.iter_torrents.side_effect = pages
+
+        with patch('builtins.print', side_effect=lambda *a: printed.append(str(a[0]))):
+            check_torrent_status.check_all(client, page_size=1)
+
+        assert any('Second' in line for line in printed)
+
+    def test_check_all_reads_from_mirror(self):
+        """Test check_all works against a TorrentStateMirror."""
+        client = MagicMock()
+        client.get_maindata.return_value = {
+            'rid': 1,
+            'full_update': True,
+            'torrents': {'abc': {'name': 'Mirrored', 'state': 'missingFiles', 'progress': 0.4}}
+        }
+
+        with patch('builtins.print') as mock_print:
+            check_torrent_status.check_all(TorrentStateMirror(client))
+            calls_str = ' '.join(str(call) for call in mock_print.call_args_list)
+            assert 'Mirrored' in calls_str
+            assert 'Missing Files' in calls_str
+
     def test_check_all_various_states(self):
         """Test check_all with various torrent states."""
         client = MagicMock()
-        client.get_torrents.return_value = [
+        client.iter_torrents.return_value = iter([
             {'name': 'Downloading', 'state': 'downloading', 'progress': 0.5},
             {'name': 'Seeding', 'state': 'seeding', 'progress': 1.0},
             {'name': 'Paused', 'state': 'pausedDL', 'progress': 0.3}
-        ]
+        ])
 
         with patch('builtins.print') as mock_print:
             check_torrent_status.check_all(client)
@@ -142,6 +190,42 @@ class TestInspectTorrent:
             check_torrent_status.inspect_torrent(DummyClient(), 'ubuntu')
             assert any('Inspecting' in str(call) for call in mock_print.call_args_list)
 
+    def test_inspect_torrent_by_full_hash_pushes_down(self):
+        """Test a full infohash query is sent to the server as a hashes filter."""
+        full_hash = 'a' * 40
+        client = MagicMock()
+        client.get_torrents.return_value = [{
+            'hash': full_hash, 'name': 'Exact', 'state': 'uploading', 'progress': 1.0,
+            'save_path': '/media', 'content_path': '/media/x', 'dlspeed': 0,
+            'num_seeds': 1, 'num_complete': 1, 'num_leechs': 0, 'num_incomplete': 0
+        }]
+        client.get_trackers.return_value = []
+
+        with patch('builtins.print') as mock_print:
+            check_torrent_status.inspect_torrent(client, full_hash.upper())
+            assert any('Exact' in str(call) for call in mock_print.call_args_list)
+
+        client.get_torrents.assert_called_once_with(hashes=full_hash)
+
+    def test_inspect_torrent_lists_all_candidates(self):
+        """Test an ambiguous query lists every match instead of the first."""
+        client = MagicMock()
+        client.get_torrents.return_value = [
+            {'hash': 'h1', 'name': 'Show.S01E01', 'state': 'uploading'},
+            {'hash': 'h2', 'name': 'Show.S01E02', 'state': 'stalledDL'},
+            {'hash': 'h3', 'name': 'Movie', 'state': 'uploading'}
+        ]
+
+        with patch('builtins.print') as mock_print:
+            check_torrent_status.inspect_torrent(client, 'show s01')
+            calls_str = ' '.join(str(call) for call in mock_print.call_args_list)
+
+        assert 'Found 2 torrents' in calls_str
+        assert 'Show.S01E01' in calls_str and 'Show.S01E02' in calls_str
+        assert 'Movie' not in calls_str
+        assert 'Inspecting' not in calls_str
+        client.get_trackers.assert_not_called()
+
     def test_inspect_torrent_multiple_trackers(self):
         """Test inspect_torrent with multiple trackers."""
         client = MagicMock()
@@ -206,6 +290,34 @@ class TestAnalyzeStalled:
             check_torrent_status.analyze_stalled(client)
             assert any('Found 1 stalled' in str(call) for call in mock_print.call_args_list)
 
+    def test_analyze_stalled_reports_dead_duration_from_store(self, tmp_path):
+        """Test stored tracker history is reused and shown as a dead duration."""
+        store = TrackerHealthStore(str(tmp_path / 'health.sqlite'))
+        store.record({'abc': [{'url': 'udp://t', 'status': 4, 'msg': 'timed out'}]}, now=time.time() - 7200)
+        store.record({'abc': [{'url': 'udp://t', 'status': 4, 'msg': 'timed out'}]})
+        client = MagicMock()
+        client.get_torrents.return_value = [{
+            'name': 'Stalled1', 'state': 'stalledDL', 'hash': 'abc', 'dlspeed': 0,
+            'num_seeds': 0, 'num_complete': 0, 'num_leechs': 0, 'num_incomplete': 0,
+        }]
+
+        with patch('builtins.print') as mock_print:
+            check_torrent_status.analyze_stalled(client, store=store)
+            calls_str = ' '.join(str(call) for call in mock_print.call_args_list)
+
+        client.get_trackers.assert_not_called()
+        assert 'timed out (dead 2h' in calls_str
+
+    def test_analyze_stalled_filters_server_side(self):
+        """Test analyze_stalled asks the server for downloading torrents only."""
+        client = MagicMock()
+        client.get_torrents.return_value = []
+
+        with patch('builtins.print'):
+            check_torrent_status.analyze_stalled(client)
+
+        client.get_torrents.assert_called_once_with(filter_by='downloading')
+
     def test_analyze_stalled_no_stalled_torrents(self):
         """Test analyze_stalled with no stalled torrents."""
         client = MagicMock()
@@ -217,8 +329,8 @@ class TestAnalyzeStalled:
             check_torrent_status.analyze_stalled(client)
             assert any('Found 0 stalled' in str(call) for call in mock_print.call_args_list)
 
-    def test_analyze_stalled_no_trackers(self):
-        """Test analyze_stalled with no trackers."""
+    def test_analyze_stalled_skips_failed_lookups(self):
+        """Test torrents whose tracker lookup failed are reported, not listed."""
         client = MagicMock()
         client.get_torrents.return_value = [{
             'name': 'Stalled',
@@ -235,7 +347,8 @@ class TestAnalyzeStalled:
         with patch('builtins.print') as mock_print:
             check_torrent_status.analyze_stalled(client)
             calls_str = ' '.join(str(call) for call in mock_print.call_args_list)
-            assert 'No trackers' in calls_str
+            assert 'Skipping 1 torrents whose tracker lookup failed' in calls_str
+            assert 'No trackers' not in calls_str
 
     def test_analyze_stalled_working_trackers(self):
         """Test analyze_stalled with working trackers."""
@@ -362,3 +475,300 @@ class TestMain:
         check_torrent_status.main()
         args = mock_inspect.call_args[0]
         assert args[1] == 'test_hash'
+
+
+class TestWatch:
+    """Tests for the --watch view."""
+
+    def _client(self, *deltas):
+        client = MagicMock()
+        client.get_maindata.side_effect = list(deltas)
+        return client
+
+    def test_watch_redraws_only_changed_rows(self):
+        """Test a delta for one torrent rewrites its line and the status line only."""
+        client = self._client(
+            {'rid': 1, 'full_update': True, 'torrents': {
+                'a': {'name': 'Alpha', 'state': 'downloading', 'progress': 0.1, 'dlspeed': 10, 'eta': 60},
+                'b': {'name': 'Beta', 'state': 'uploading', 'progress': 1.0, 'dlspeed': 0, 'eta': 8640000},
+            }, 'server_state': {'dl_info_speed': 10}},
+            {'rid': 2, 'torrents': {'a': {'progress': 0.2}}, 'server_state': {'dl_info_speed': 20}},
+        )
+        mirror = TorrentStateMirror(client)
+        view = check_torrent_status.WatchView(mirror, out=io.StringIO(), height=40)
+
+        assert view.render(*mirror.sync()) == 5
+        out = io.StringIO()
+        view.out = out
+        assert view.render(*mirror.sync()) == 2
+        assert 'Alpha' in out.getvalue()
+        assert 'Beta' not in out.getvalue()
+
+    def test_watch_sorts_by_speed_descending(self):
+        """Test --sort speed puts the fastest torrent first."""
+        client = self._client({'rid': 1, 'full_update': True, 'torrents': {
+            'a': {'name': 'Slow', 'state': 'downloading', 'dlspeed': 1},
+            'b': {'name': 'Fast', 'state': 'downloading', 'dlspeed': 500},
+        }})
+        mirror = TorrentStateMirror(client)
+        view = check_torrent_status.WatchView(mirror, sort='speed', out=io.StringIO(), height=40)
+
+        lines = view.frame(*mirror.sync())
+
+        assert lines[3].startswith('Fast')
+        assert lines[4].startswith('Slow')
+
+    def test_watch_clears_removed_rows(self):
+        """Test rows for removed torrents are blanked."""
+        client = self._client(
+            {'rid': 1, 'full_update': True, 'torrents': {
+                'a': {'name': 'A', 'state': 'uploading'}, 'b': {'name': 'B', 'state': 'uploading'},
+            }},
+            {'rid': 2, 'torrents_removed': ['b']},
+        )
+        mirror = TorrentStateMirror(client)
+        view = check_torrent_status.WatchView(mirror, out=io.StringIO(), height=40)
+        view.render(*mirror.sync())
+        out = io.StringIO()
+        view.out = out
+
+        view.render(*mirror.sync())
+
+        assert '\x1b[5;1H\x1b[K' in out.getvalue()
+
+    def test_watch_polls_with_rid_cursor(self):
+        """Test watch keeps one mirror and sends the last rid each tick."""
+        client = self._client({'rid': 7, 'full_update': True, 'torrents': {}}, {'rid': 8})
+
+        with patch.object(check_torrent_status.time, 'sleep'):
+            check_torrent_status.watch(client, iterations=2, out=io.StringIO())
+
+        assert [c.args[0] for c in client.get_maindata.call_args_list] == [0, 7]
+
+    @patch('sys.argv', ['check_torrent_status.py', 'all', '--watch', '--sort', 'eta', '--interval', '5'])
+    @patch.object(check_torrent_status, 'watch')
+    @patch.object(check_torrent_status, 'Config')
+    @patch.object(check_torrent_status, 'QBitClient')
+    def test_main_watch(self, mock_client, mock_config, mock_watch):
+        """Test --watch runs the live view instead of a snapshot."""
+        check_torrent_status.main()
+        mock_watch.assert_called_once_with(mock_client.return_value, interval=5.0, sort='eta', reverse=False)
+
+
+class TestOutputFormats:
+    """Tests for --format on the status commands."""
+
+    def test_check_all_ndjson(self, capsys):
+        """Test 'all' streams raw torrent fields as NDJSON."""
+        client = MagicMock()
+        client.iter_torrents.return_value = iter([
+            {'hash': 'abc', 'name': 'A', 'state': 'stalledDL', 'progress': 0.25},
+        ])
+
+        check_torrent_status.check_all(client, fmt='ndjson')
+
+        record = json.loads(capsys.readouterr().out)
+        assert record == {'hash': 'abc', 'name': 'A', 'state': 'stalledDL', 'progress': 0.25, 'issue': 'Stalled'}
+
+    def test_analyze_stalled_csv(self, capsys):
+        """Test 'stalled' writes CSV rows with tracker status."""
+        client = MagicMock()
+        client.get_torrents.return_value = [{
+            'hash': 'abc', 'name': 'A', 'state': 'stalledDL', 'dlspeed': 0, 'num_seeds': 0,
+            'num_complete': 0, 'num_leechs': 1, 'num_incomplete': 2,
+        }]
+        client.get_trackers.return_value = [{'status': 2, 'msg': '', 'url': 'u', 'num_peers': 0}]
+
+        check_torrent_status.analyze_stalled(client, fmt='csv')
+
+        captured = capsys.readouterr()
+        lines = captured.out.splitlines()
+        assert lines[0].startswith('hash,name,state')
+        assert 'Working (1)' in lines[1]
+        assert 'Found 1 stalled torrents' in captured.err
+
+    def test_inspect_ndjson_includes_trackers(self, capsys):
+        """Test 'inspect' of one torrent emits a record with its trackers."""
+        client = MagicMock()
+        client.get_torrents.return_value = [{
+            'hash': 'a' * 40, 'name': 'A', 'state': 'uploading', 'progress': 1.0,
+            'save_path': '/d', 'content_path': '/d/A', 'dlspeed': 0, 'num_seeds': 1,
+            'num_complete': 2, 'num_leechs': 0, 'num_incomplete': 0,
+        }]
+        client.get_trackers.return_value = [{'url': 'udp://t', 'status': 2, 'msg': '', 'num_peers': 3}]
+
+        check_torrent_status.inspect_torrent(client, 'a' * 40, fmt='ndjson')
+
+        record = json.loads(capsys.readouterr().out)
+        assert record['save_path'] == '/d'
+        assert record['trackers'] == [{'url': 'udp://t', 'status': 2, 'msg': '', 'num_peers': 3}]
+
+    @patch('sys.argv', ['check_torrent_status.py', 'stalled', '--format', 'ndjson'])
+    @patch.object(check_torrent_status, 'analyze_stalled')
+    @patch.object(check_torrent_status, 'Config')
+    @patch.object(check_torrent_status, 'QBitClient')
+    def test_main_passes_format(self, mock_client, mock_config, mock_analyze):
+        """Test --format is forwarded to the command."""
+        check_torrent_status.main()
+        assert mock_analyze.call_args[1]['fmt'] == 'ndjson'
+
+    @patch('sys.argv', ['check_torrent_status.py', 'stalled', '--workers', '32'])
+    @patch.object(check_torrent_status, 'analyze_stalled')
+    @patch.object(check_torrent_status, 'Config')
+    @patch.object(check_torrent_status, 'QBitClient')
+    def test_main_sizes_pool_for_workers(self, mock_client, mock_config, mock_analyze):
+        """Test --workers also sizes the client's connection pool."""
+        check_torrent_status.main()
+        assert mock_client.call_args[1]['pool_size'] == 32
+        assert mock_analyze.call_args[1]['workers'] == 32
+
+
+class TestDiagnoseFiles:
+    """Tests for the per-file inventory of missing-files torrents."""
+
+    def _client(self):
+        client = MagicMock()
+        client.get_torrents.return_value = [
+            {'hash': 'abc', 'name': 'Show', 'state': 'missingFiles', 'save_path': '/media/downloads'},
+            {'hash': 'def', 'name': 'Error', 'state': 'error', 'save_path': '/media/downloads'},
+        ]
+        client.get_torrent_files.return_value = [
+            {'name': 'Show/ep1.mkv', 'size': 3, 'priority': 1},
+            {'name': 'Show/ep2.mkv', 'size': 5, 'priority': 1},
+            {'name': 'Show/skipped.nfo', 'size': 9, 'priority': 0},
+        ]
+        return client
+
+    def test_reports_missing_bytes_and_relocation(self, tmp_path, capsys):
+        """Test missing files are counted and a moved copy suggests a new save path."""
+        downloads = tmp_path / 'downloads'
+        (downloads / 'Show').mkdir(parents=True)
+        (downloads / 'Show' / 'ep1.mkv').write_bytes(b'x' * 3)
+        moved = tmp_path / 'archive' / 'Show'
+        moved.mkdir(parents=True)
+        (moved / 'ep2.mkv').write_bytes(b'y' * 5)
+        client = self._client()
+
+        check_torrent_status.diagnose_files(
+            client, path_map=[('/media/downloads', str(downloads))],
+            search=[str(tmp_path)], fmt='ndjson',
+        )
+
+        client.get_torrents.assert_called_once_with(filter_by='errored')
+        client.get_torrent_files.assert_called_once_with('abc')
+        record = json.loads(capsys.readouterr().out)
+        assert record['missing_files'] == 1
+        assert record['missing_bytes'] == 5
+        assert record['relocated_matches'] == 1
+        assert record['suggested_save_path'] == str(tmp_path / 'archive')
+
+    def test_no_missing_files_torrents(self):
+        """Test a message is shown when nothing is in missingFiles."""
+        client = MagicMock()
+        client.get_torrents.return_value = []
+
+        with patch('builtins.print') as mock_print:
+            check_torrent_status.diagnose_files(client)
+
+        assert any('No torrents with missing files' in str(call) for call in mock_print.call_args_list)
+
+    def test_parse_path_map(self):
+        """Test FROM=TO arguments are split and malformed ones rejected."""
+        assert check_torrent_status.parse_path_map(['/a=/b']) == [('/a', '/b')]
+        with pytest.raises(ValueError):
+            check_torrent_status.parse_path_map(['/a'])
+
+    @patch('sys.argv', ['check_torrent_status.py', 'files', '--path-map', '/media=/mnt'])
+    @patch.object(check_torrent_status, 'diagnose_files')
+    @patch.object(check_torrent_status, 'TorrentFilesCache')
+    @patch.object(check_torrent_status, 'Config')
+    @patch.object(check_torrent_status, 'QBitClient')
+    def test_main_files(self, mock_client, mock_config, mock_cache, mock_diagnose):
+        """Test the files action wires the cache and path map."""
+        check_torrent_status.main()
+        kwargs = mock_diagnose.call_args[1]
+        assert kwargs['path_map'] == [('/media', '/mnt')]
+        assert kwargs['cache'] is mock_cache.return_value
+
+
+class TestFindOrphans:
+    """Tests for the orphaned-data scanner."""
+
+    def test_reports_unreferenced_files_and_directories(self, tmp_path, capsys):
+        """Test files and whole directories no torrent claims are reported with sizes."""
+        root = tmp_path / 'downloads'
+        (root / 'Show').mkdir(parents=True)
+        (root / 'Show' / 'ep1.mkv').write_bytes(b'x' * 3)
+        (root / 'Show' / 'extra.txt').write_bytes(b'y' * 2)
+        (root / 'Old' / 'deep').mkdir(parents=True)
+        (root / 'Old' / 'a.bin').write_bytes(b'z' * 4)
+        (root / 'Old' / 'deep' / 'b.bin').write_bytes(b'z' * 6)
+        (root / 'movie.mkv.!qB').write_bytes(b'm')
+        client = MagicMock()
+        client.get_torrents.return_value = [
+            {'hash': 'abc', 'name': 'Show', 'save_path': '/media/downloads'},
+            {'hash': 'def', 'name': 'Movie', 'save_path': '/media/downloads'},
+        ]
+        client.get_torrent_files.side_effect = lambda h: {
+            'abc': [{'name': 'Show/ep1.mkv', 'size': 3}],
+            'def': [{'name': 'movie.mkv', 'size': 1}],
+        }[h]
+
+        check_torrent_status.find_orphans(
+            client, path_map=[('/media/downloads', str(root))], fmt='ndjson'
+        )
+
+        captured = capsys.readouterr()
+        records = [json.loads(line) for line in captured.out.splitlines()]
+        assert records == [
+            {'type': 'directory', 'path': str(root / 'Old'), 'size': 10, 'files': 2},
+            {'type': 'file', 'path': str(root / 'Show' / 'extra.txt'), 'size': 2, 'files': 1},
+        ]
+        assert '2 orphaned entries' in captured.err
+
+    def test_failed_file_lookup_claims_content_path(self, tmp_path, capsys):
+        """Test a torrent whose torrents/files call failed keeps its data out of the report."""
+        root = tmp_path / 'downloads'
+        (root / 'Show.S01').mkdir(parents=True)
+        (root / 'Show.S01' / 'ep1.mkv').write_bytes(b'x' * 3)
+        (root / 'Show.S01' / 'ep2.mkv.!qB').write_bytes(b'x')
+        (root / 'stray.bin').write_bytes(b'z' * 4)
+        client = MagicMock()
+        client.get_torrents.return_value = [
+            {'hash': 'abc', 'name': 'Show.S01', 'save_path': '/media/downloads',
+             'content_path': '/media/downloads/Show.S01'},
+        ]
+        client.get_torrent_files.return_value = []
+
+        check_torrent_status.find_orphans(
+            client, path_map=[('/media/downloads', str(root))], fmt='ndjson'
+        )
+
+        captured = capsys.readouterr()
+        records = [json.loads(line) for line in captured.out.splitlines()]
+        assert records == [{'type': 'file', 'path': str(root / 'stray.bin'), 'size': 4, 'files': 1}]
+        assert 'File lists unavailable for 1 torrents' in captured.err
+        assert 'Show.S01' in captured.err
+
+    def test_directory_totals(self):
+        """Test totals roll up through nested directories."""
+        listing = {'/r': {'a': None, 'f': 1}, '/r/a': {'g': 2, 'b': None}, '/r/a/b': {'h': 4}}
+
+        totals = check_torrent_status.directory_totals(listing)
+
+        assert totals['/r'] == (7, 3)
+        assert totals['/r/a/b'] == (4, 1)
+
+    @patch('sys.argv', ['check_torrent_status.py', 'orphans', '--root', '/mnt/data'])
+    @patch.object(check_torrent_status, 'find_orphans')
+    @patch.object(check_torrent_status, 'DirectoryCache')
+    @patch.object(check_torrent_status, 'TorrentFilesCache')
+    @patch.object(check_torrent_status, 'Config')
+    @patch.object(check_torrent_status, 'QBitClient')
+    def test_main_orphans(self, mock_client, mock_config, mock_files, mock_dirs, mock_find):
+        """Test the orphans action passes roots and both caches."""
+        check_torrent_status.main()
+        args, kwargs = mock_find.call_args
+        assert args[1] == ['/mnt/data']
+        assert kwargs['dir_cache'] is mock_dirs.return_value
+        assert kwargs['files_cache'] is mock_files.return_value
@@ -1,8 +1,10 @@
 """Tests for manage_torrents.py"""
+import hashlib
 import pytest
 import os
 from unittest.mock import patch, MagicMock
 from scripts.utilities import manage_torrents
+from scripts.common import TorrentTable
 
 
 class TestFixPaths:
@@ -25,7 +27,8 @@ class TestFixPaths:
         config.default_save_path = '/media/downloads'
         client = DummyClient()
 
-        with patch('builtins.print'):
+        with patch.object(manage_torrents, 'path_device', return_value=1), \
+                patch('builtins.print'):
             manage_torrents.fix_paths(client, config)
 
         assert ('abc', '/media/downloads') in client.locations
@@ -58,6 +61,87 @@ class TestFixPaths:
 
         client.set_location.assert_not_called()
 
+    def test_fix_paths_groups_renames_into_one_call(self):
+        """Test same-filesystem moves to one target share a setLocation call."""
+        client = MagicMock()
+        client.get_torrents.return_value = [
+            {'name': 'A', 'save_path': '/downloads/A', 'hash': 'abc'},
+            {'name': 'B', 'save_path': '/downloads/B', 'hash': 'def'},
+        ]
+        config = MagicMock()
+        config.default_save_path = '/media/downloads'
+
+        with patch.object(manage_torrents, 'path_device', return_value=1), \
+                patch('builtins.print') as mock_print:
+            manage_torrents.fix_paths(client, config)
+
+        client.set_location.assert_called_once_with('abc|def', '/media/downloads')
+        assert any('2 torrents' in str(call) for call in mock_print.call_args_list)
+
+    def test_fix_paths_dry_run_moves_nothing(self):
+        """Test --dry-run prints the plan without calling setLocation."""
+        client = MagicMock()
+        client.get_torrents.return_value = [
+            {'name': 'A', 'save_path': '/downloads/A', 'hash': 'abc', 'size': 1024},
+        ]
+        config = MagicMock()
+        config.default_save_path = '/media/downloads'
+        devices = {'/downloads/A': 1, '/media/downloads': 2}
+
+        with patch.object(manage_torrents, 'path_device', side_effect=lambda p, m: devices.get(p)), \
+                patch('builtins.print') as mock_print:
+            manage_torrents.fix_paths(client, config, dry_run=True)
+            calls_str = ' '.join(str(call) for call in mock_print.call_args_list)
+
+        client.set_location.assert_not_called()
+        assert 'Copy 1 torrents (1.0 KiB) to /media/downloads' in calls_str
+        assert 'would fix paths for 1 torrents' in calls_str
+
+    def test_fix_paths_maps_container_paths_for_device_check(self, tmp_path):
+        """Test --path-map resolves container paths, and unresolvable ones count as copies."""
+        (tmp_path / 'downloads').mkdir()
+        client = MagicMock()
+        client.get_torrents.return_value = [
+            {'name': 'A', 'save_path': '/data/downloads/A', 'hash': 'abc', 'size': 1},
+            {'name': 'B', 'save_path': '/elsewhere/B', 'hash': 'def', 'size': 1},
+        ]
+        config = MagicMock()
+        config.default_save_path = '/data/media'
+        planner = manage_torrents.RelocationPlanner(client, path_map=[('/data', str(tmp_path))])
+
+        planner.plan(client.get_torrents(), lambda t: config.default_save_path)
+
+        assert [t['hash'] for t in planner.renames['/data/media']] == ['abc']
+        assert [t['hash'] for _, t in planner.copies] == ['def']
+
+    def test_fix_paths_throttles_cross_device_moves(self):
+        """Test at most max_moving copies are in flight and each is tracked to completion."""
+        torrents = [
+            {'name': name, 'save_path': f'/downloads/{name}', 'hash': name, 'size': size}
+            for name, size in (('a', 1), ('b', 2), ('c', 3))
+        ]
+        client = MagicMock()
+        client.get_torrents.side_effect = [
+            torrents,
+            [{'hash': 'a', 'state': 'moving'}, {'hash': 'b', 'state': 'moving'}],
+            [{'hash': 'a', 'state': 'uploading'}, {'hash': 'b', 'state': 'moving'}],
+            [{'hash': 'b', 'state': 'uploading'}, {'hash': 'c', 'state': 'moving'}],
+            [{'hash': 'c', 'state': 'uploading'}],
+        ]
+        config = MagicMock()
+        config.default_save_path = '/media/downloads'
+
+        with patch.object(manage_torrents, 'path_device', side_effect=lambda p, m: p.startswith('/media')), \
+                patch.object(manage_torrents.time, 'sleep'), \
+                patch('builtins.print') as mock_print:
+            manage_torrents.fix_paths(client, config, max_moving=2)
+
+        assert [c.args for c in client.set_location.call_args_list] == [
+            ('a|b', '/media/downloads'),
+            ('c', '/media/downloads'),
+        ]
+        assert any('Moved 3/3 torrents' in str(call) for call in mock_print.call_args_list)
+
 
 class TestAddMissing:
     """Tests for add_missing function."""
@@ -65,8 +149,10 @@ class TestAddMissing:
     def test_add_missing_adds(self, tmp_path):
         """Test add_missing successfully adds torrent files."""
         class DummyClient:
-            def add_torrent_file(self, f, p):
-                return True
+            def get_torrents(self):
+                return []
+            def add_torrent_files(self, paths, **kwargs):
+                return {path: "added" for path in paths}
 
         config = MagicMock()
         config.default_scan_path = str(tmp_path)
@@ -80,6 +166,30 @@ class TestAddMissing:
             manage_torrents.add_missing(DummyClient(), config)
             assert any('Processed' in str(call) for call in mock_print.call_args_list)
 
+    def test_add_missing_skips_loaded_hashes(self, tmp_path):
+        """Test only torrents whose infohash is not loaded get uploaded."""
+        loaded = tmp_path / 'loaded.torrent'
+        loaded.write_bytes(b'd4:infod4:name6:loaded12:piece lengthi16384e6:pieces0:ee')
+        new = tmp_path / 'new.torrent'
+        new.write_bytes(b'd4:infod4:name3:new12:piece lengthi16384e6:pieces0:ee')
+        loaded_hash = hashlib.sha1(b'd4:name6:loaded12:piece lengthi16384e6:pieces0:e').hexdigest()
+
+        client = MagicMock()
+        client.get_torrents.return_value = [{'hash': loaded_hash}]
+        client.add_torrent_files.return_value = {str(new): 'added'}
+        config = MagicMock()
+        config.default_scan_path = str(tmp_path)
+        config.default_save_path = '/media/downloads'
+
+        with patch('builtins.print') as mock_print:
+            manage_torrents.add_missing(client, config)
+            calls_str = ' '.join(str(call) for call in mock_print.call_args_list)
+
+        client.add_torrent_files.assert_called_once_with(
+            [str(new)], save_path='/media/downloads', category=None, tags=None
+        )
+        assert '1 already loaded, adding 1' in calls_str
+
     def test_add_missing_no_scan_path(self):
         """Test add_missing with no scan path configured."""
         client = MagicMock()
@@ -117,14 +227,15 @@ class TestAddMissing:
         (custom_path / 'test.torrent').write_text('data')
 
         client = MagicMock()
-        client.add_torrent_file.return_value = True
+        client.add_torrent_files.side_effect = lambda paths, **kw: {p: 'added' for p in paths}
         config = MagicMock()
         config.default_save_path = '/media/downloads'
 
         with patch('builtins.print'):
             manage_torrents.add_missing(client, config, scan_path=str(custom_path))
 
-        client.add_torrent_file.assert_called_once()
+        client.add_torrent_files.assert_called_once()
+        assert client.add_torrent_files.call_args[0][0] == [str(custom_path / 'test.torrent')]
 
     def test_add_missing_some_fail(self, tmp_path):
         """Test add_missing when some additions fail."""
@@ -132,8 +243,10 @@ class TestAddMissing:
         (tmp_path / 'fail.torrent').write_text('y')
 
         client = MagicMock()
-        # First call succeeds, second fails
-        client.add_torrent_file.side_effect = [True, False]
+        client.add_torrent_files.return_value = {
+            str(tmp_path / 'success.torrent'): 'added',
+            str(tmp_path / 'fail.torrent'): 'failed',
+        }
 
         config = MagicMock()
         config.default_scan_path = str(tmp_path)
@@ -142,6 +255,24 @@ class TestAddMissing:
         with patch('builtins.print') as mock_print:
             manage_torrents.add_missing(client, config)
             assert any('1 .torrent files' in str(call) for call in mock_print.call_args_list)
+            assert any('Failed to add fail.torrent' in str(call) for call in mock_print.call_args_list)
+
+    def test_add_missing_passes_category_and_tags(self, tmp_path):
+        """Test category and tags are forwarded to the batch upload."""
+        (tmp_path / 'a.torrent').write_text('x')
+        client = MagicMock()
+        client.get_torrents.return_value = []
+        client.add_torrent_files.return_value = {}
+        config = MagicMock()
+        config.default_scan_path = str(tmp_path)
+        config.default_save_path = '/media/downloads'
+
+        with patch('builtins.print'):
+            manage_torrents.add_missing(client, config, category='tv', tags='import,batch')
+
+        kwargs = client.add_torrent_files.call_args[1]
+        assert kwargs['category'] == 'tv'
+        assert kwargs['tags'] == 'import,batch'
 
 
 class TestRecheckAll:
@@ -156,10 +287,51 @@ class TestRecheckAll:
         ]
 
         with patch('builtins.print'):
-            manage_torrents.recheck_all(client)
+            manage_torrents.recheck_all(client, max_active=0)
 
         client.recheck_torrent.assert_called_once_with('abc|def')
 
+    @patch('scripts.utilities.manage_torrents.time.sleep')
+    def test_recheck_all_throttles_per_device(self, mock_sleep, tmp_path):
+        """Test the scheduler keeps at most max_active torrents checking per device."""
+        client = MagicMock()
+        client.get_torrents.side_effect = [
+            [
+                {'hash': 'big', 'size': 300, 'save_path': str(tmp_path)},
+                {'hash': 'small', 'size': 100, 'save_path': str(tmp_path)},
+                {'hash': 'mid', 'size': 200, 'save_path': str(tmp_path)}
+            ],
+            [{'hash': 'small', 'state': 'checkingUP', 'progress': 0.5}],
+            [{'hash': 'small', 'state': 'uploading', 'progress': 1.0}],
+            [{'hash': 'mid', 'state': 'checkingUP', 'progress': 0.1}],
+            [{'hash': 'mid', 'state': 'stalledUP', 'progress': 1.0}],
+            [{'hash': 'big', 'state': 'checkingDL', 'progress': 0.2}],
+            [{'hash': 'big', 'state': 'pausedDL', 'progress': 0.2}]
+        ]
+
+        with patch('builtins.print') as mock_print:
+            manage_torrents.recheck_all(client, max_active=1, order='size', poll_interval=0)
+            calls_str = ' '.join(str(call) for call in mock_print.call_args_list)
+
+        batches = [c[0][0] for c in client.recheck_torrent.call_args_list]
+        assert batches == ['small', 'mid', 'big']
+        assert 'Rechecked 3/3 torrents' in calls_str
+        assert 'Recheck finished' in calls_str
+
+    def test_recheck_scheduler_groups_by_device(self, tmp_path):
+        """Test torrents on different devices get separate queues."""
+        scheduler = manage_torrents.RecheckScheduler(MagicMock(), order='priority')
+        with patch.object(manage_torrents, 'path_device', side_effect=lambda p, m: p):
+            queued = scheduler.plan([
+                {'hash': 'a', 'save_path': '/disk1', 'priority': 2},
+                {'hash': 'b', 'save_path': '/disk2', 'priority': 0},
+                {'hash': 'c', 'save_path': '/disk1', 'priority': 1}
+            ])
+
+        assert queued == 3
+        assert [t['hash'] for t in reversed(scheduler.queues['/disk1'])] == ['c', 'a']
+        assert [t['hash'] for t in scheduler.queues['/disk2']] == ['b']
+
     def test_recheck_all_empty_torrents(self):
         """Test recheck_all with no torrents."""
         client = MagicMock()
@@ -237,6 +409,23 @@ class TestDeleteBroken:
 
         client.delete_torrents.assert_not_called()
 
+    def test_delete_broken_skips_failed_tracker_lookups(self):
+        """Test a failed torrents/trackers call never marks a torrent for deletion."""
+        client = MagicMock()
+        client.get_torrents.return_value = [
+            {'hash': 'abc', 'name': 'Broken', 'state': 'stalledDL'},
+            {'hash': 'def', 'name': 'Unknown', 'state': 'stalledDL'}
+        ]
+        client.get_trackers.side_effect = lambda h: [{'status': 4}] if h == 'abc' else []
+
+        with patch('builtins.print') as mock_print:
+            manage_torrents.delete_broken(client, delete_files=True)
+            calls_str = ' '.join(str(call) for call in mock_print.call_args_list)
+
+        client.delete_torrents.assert_called_once_with('abc', True)
+        assert 'Skipping 1 torrents whose tracker lookup failed' in calls_str
+        assert 'Unknown' in calls_str
+
     def test_delete_broken_with_delete_files(self):
         """Test delete_broken with delete_files flag."""
         client = MagicMock()
@@ -267,6 +456,115 @@ class TestDeleteBroken:
 
         # Should only analyze stalled ones
         assert client.get_trackers.call_count == 2
+        client.get_torrents.assert_called_once_with(filter_by='downloading')
+
+
+    def test_delete_broken_with_torrent_table(self):
+        """Test delete_broken works against a compact TorrentTable."""
+        client = MagicMock()
+        client.get_torrents.return_value = TorrentTable(torrents=[
+            {'hash': 'abc', 'name': 'Stalled', 'state': 'stalledDL', 'magnet_uri': 'x'},
+            {'hash': 'def', 'name': 'Seeding', 'state': 'uploading'}
+        ])
+        client.get_trackers.return_value = [{'status': 4}]
+
+        with patch('builtins.print'):
+            manage_torrents.delete_broken(client)
+
+        client.get_trackers.assert_called_once_with('abc')
+        assert client.delete_torrents.call_args[0][0] == 'abc'
+
+
+    def test_delete_broken_observe_uses_progress_trend(self):
+        """Test --observe picks torrents with flat progress regardless of state."""
+        samples = [
+            [{'hash': 'flat', 'name': 'Flat', 'state': 'downloading', 'progress': 0.3},
+             {'hash': 'moving', 'name': 'Moving', 'state': 'stalledDL', 'progress': 0.1}],
+            [{'hash': 'flat', 'name': 'Flat', 'state': 'stalledDL', 'progress': 0.3},
+             {'hash': 'moving', 'name': 'Moving', 'state': 'stalledDL', 'progress': 0.2}],
+        ]
+        client = MagicMock()
+        client.get_torrents.side_effect = samples
+        client.get_trackers.return_value = [{'url': 'udp://t', 'status': 4}]
+
+        clock = [0.0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        with patch.object(manage_torrents.time, 'monotonic', side_effect=lambda: clock[0]), \
+                patch.object(manage_torrents.time, 'sleep', side_effect=sleep), \
+                patch('builtins.print'):
+            manage_torrents.delete_broken(client, observe_minutes=10, poll_interval=600)
+
+        client.delete_torrents.assert_called_once_with('flat', False)
+
+    def test_delete_broken_observe_skips_paused_and_queued(self):
+        """Test --observe never judges downloads that are idle on purpose."""
+        sample = [
+            {'hash': 'paused', 'name': 'Paused', 'state': 'pausedDL', 'progress': 0.3},
+            {'hash': 'queued', 'name': 'Queued', 'state': 'queuedDL', 'progress': 0.1},
+            {'hash': 'resumed', 'name': 'Resumed', 'state': 'stalledDL', 'progress': 0.5},
+            {'hash': 'dead', 'name': 'Dead', 'state': 'stalledDL', 'progress': 0.2},
+        ]
+        later = [dict(t) for t in sample]
+        later[2]['state'] = 'stalledDL'
+        sample[2] = dict(sample[2], state='stoppedDL')
+        client = MagicMock()
+        client.get_torrents.side_effect = [sample, later]
+        client.get_trackers.return_value = [{'url': 'udp://t', 'status': 4}]
+
+        clock = [0.0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        with patch.object(manage_torrents.time, 'monotonic', side_effect=lambda: clock[0]), \
+                patch.object(manage_torrents.time, 'sleep', side_effect=sleep), \
+                patch('builtins.print'):
+            manage_torrents.delete_broken(client, delete_files=True, observe_minutes=10, poll_interval=600)
+
+        client.delete_torrents.assert_called_once_with('dead', True)
+
+    def test_delete_broken_observe_spans_window_despite_poll_latency(self):
+        """Test a slow first poll still leaves samples spanning the whole window."""
+        clock = [0.0]
+        latencies = iter([1.5, 0.2, 0.2, 0.2])
+
+        def get_torrents(filter_by=None):
+            clock[0] += next(latencies)
+            return [{'hash': 'flat', 'name': 'Flat', 'state': 'stalledDL', 'progress': 0.3}]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        client = MagicMock()
+        client.get_torrents.side_effect = get_torrents
+        client.get_trackers.return_value = [{'url': 'udp://t', 'status': 4}]
+
+        with patch.object(manage_torrents.time, 'monotonic', side_effect=lambda: clock[0]), \
+                patch.object(manage_torrents.time, 'sleep', side_effect=sleep), \
+                patch('builtins.print'):
+            manage_torrents.delete_broken(client, observe_minutes=10, poll_interval=300)
+
+        client.delete_torrents.assert_called_once_with('flat', False)
+
+    def test_delete_broken_requires_dead_days_history(self):
+        """Test --dead-days keeps torrents whose trackers only just failed."""
+        client = MagicMock()
+        client.get_torrents.return_value = [
+            {'hash': 'old', 'name': 'Old', 'state': 'stalledDL'},
+            {'hash': 'new', 'name': 'New', 'state': 'stalledDL'},
+        ]
+        client.get_trackers.return_value = [{'url': 'udp://t', 'status': 4}]
+        store = MagicMock()
+        store.fresh.return_value = {}
+        store.dead_for.side_effect = lambda h: 4 * 86400 if h == 'old' else 3600
+
+        with patch('builtins.print'):
+            manage_torrents.delete_broken(client, store=store, dead_days=3)
+
+        client.delete_torrents.assert_called_once_with('old', False)
 
 
 class TestMain:
@@ -281,6 +579,15 @@ class TestMain:
         manage_torrents.main()
         mock_fix.assert_called_once()
 
+    @patch('sys.argv', ['manage_torrents.py', 'fix-paths', '--dry-run', '--max-moving', '4'])
+    @patch.object(manage_torrents, 'fix_paths')
+    @patch.object(manage_torrents, 'Config')
+    @patch.object(manage_torrents, 'QBitClient')
+    def test_main_fix_paths_options(self, mock_client, mock_config, mock_fix):
+        """Test fix-paths forwards the dry-run and throttle options."""
+        manage_torrents.main()
+        mock_fix.assert_called_once_with(mock_client.return_value, mock_config.return_value, True, 4, 10, path_map=[])
+
     @patch('sys.argv', ['manage_torrents.py', 'recheck'])
     @patch.object(manage_torrents, 'recheck_all')
     @patch.object(manage_torrents, 'Config')
@@ -289,6 +596,16 @@ class TestMain:
         """Test main with recheck command."""
         manage_torrents.main()
         mock_recheck.assert_called_once()
+        assert mock_recheck.call_args[0][1:] == (2, 'size', 10)
+
+    @patch('sys.argv', ['manage_torrents.py', 'recheck', '--path-map', '/data=/mnt/data'])
+    @patch.object(manage_torrents, 'recheck_all')
+    @patch.object(manage_torrents, 'Config')
+    @patch.object(manage_torrents, 'QBitClient')
+    def test_main_recheck_path_map(self, mock_client, mock_config, mock_recheck):
+        """Test recheck forwards --path-map for the device lookup."""
+        manage_torrents.main()
+        assert mock_recheck.call_args.kwargs == {'path_map': [('/data', '/mnt/data')]}
 
     @patch('sys.argv', ['manage_torrents.py', 'announce'])
     @patch.object(manage_torrents, 'announce_all')
@@ -320,6 +637,15 @@ class TestMain:
         args = mock_delete.call_args[0]
         assert args[1] == True
 
+    @patch('sys.argv', ['manage_torrents.py', 'delete-broken', '--workers', '32'])
+    @patch.object(manage_torrents, 'delete_broken')
+    @patch.object(manage_torrents, 'Config')
+    @patch.object(manage_torrents, 'QBitClient')
+    def test_main_delete_broken_sizes_pool(self, mock_client, mock_config, mock_delete):
+        """Test delete-broken --workers also sizes the client's connection pool."""
+        manage_torrents.main()
+        assert mock_client.call_args[1]['pool_size'] == 32
+
     @patch('sys.argv', ['manage_torrents.py', 'add-missing'])
     @patch.object(manage_torrents, 'add_missing')
     @patch.object(manage_torrents, 'Config')
@@ -340,3 +666,12 @@ class TestMain:
         assert args[2] == '/custom/path'
 
 
+
+    @patch('sys.argv', ['manage_torrents.py', 'delete-broken', '--workers', '4'])
+    @patch.object(manage_torrents, 'delete_broken')
+    @patch.object(manage_torrents, 'Config')
+    @patch.object(manage_torrents, 'QBitClient')
+    def test_main_delete_broken_workers(self, mock_client, mock_config, mock_delete):
+        """Test main passes --workers to delete_broken."""
+        manage_torrents.main()
+        assert mock_delete.call_args[1]['workers'] == 4
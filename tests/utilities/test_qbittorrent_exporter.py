@@ -0,0 +1,120 @@
+"""Tests for qbittorrent_exporter.py"""
+import threading
+import urllib.request
+from unittest.mock import patch, MagicMock
+from scripts.utilities import qbittorrent_exporter
+
+
+def make_collector(*deltas):
+    client = MagicMock()
+    client.get_maindata.side_effect = list(deltas)
+    return client, qbittorrent_exporter.MetricsCollector(client)
+
+
+FULL_UPDATE = {
+    'rid': 1,
+    'full_update': True,
+    'torrents': {
+        'a': {'state': 'downloading', 'category': 'tv', 'tracker': 'udp://tracker.one:1337/announce',
+              'dlspeed': 100, 'upspeed': 10, 'progress': 0.5, 'availability': 0.5,
+              'num_complete': 0, 'num_incomplete': 4},
+        'b': {'state': 'uploading', 'category': 'tv', 'tracker': 'https://tracker.two/announce',
+              'dlspeed': 0, 'upspeed': 50, 'progress': 1.0, 'availability': -1,
+              'num_complete': 8, 'num_incomplete': 1},
+    },
+    'server_state': {'dl_info_speed': 100, 'up_info_speed': 60, 'connection_status': 'connected'},
+}
+
+
+class TestHelpers:
+    """Tests for label helpers."""
+
+    def test_tracker_host(self):
+        """Test tracker URLs are reduced to their host."""
+        assert qbittorrent_exporter.tracker_host('udp://tracker.one:1337/announce') == 'tracker.one'
+        assert qbittorrent_exporter.tracker_host('') == ''
+
+    def test_escape_label(self):
+        """Test quotes, backslashes and newlines are escaped."""
+        assert qbittorrent_exporter.escape_label('a"b\\c\n') == 'a\\"b\\\\c\\n'
+
+
+class TestMetricsCollector:
+    """Tests for MetricsCollector aggregation."""
+
+    def test_full_update_aggregates(self):
+        """Test a full snapshot fills per-state, per-category and swarm metrics."""
+        _, collector = make_collector(FULL_UPDATE)
+        collector.refresh()
+        text = collector.snapshot.decode()
+
+        assert 'qbittorrent_up 1' in text
+        assert 'qbittorrent_torrents{state="downloading"} 1' in text
+        assert 'qbittorrent_category_torrents{category="tv"} 2' in text
+        assert 'qbittorrent_category_upload_bytes_per_second{category="tv"} 60' in text
+        assert 'qbittorrent_tracker_download_bytes_per_second{tracker="tracker.one"} 100' in text
+        assert 'qbittorrent_swarm_seeds 8' in text
+        assert 'qbittorrent_torrents_without_seeds 1' in text
+        assert 'qbittorrent_torrents_unavailable 1' in text
+        assert 'qbittorrent_connected{status="connected"} 1' in text
+
+    def test_delta_updates_only_changed_contributions(self):
+        """Test partial deltas move a torrent between states and drop removed ones."""
+        _, collector = make_collector(
+            FULL_UPDATE,
+            {'rid': 2, 'torrents': {'a': {'state': 'stalledDL', 'dlspeed': 0}}},
+            {'rid': 3, 'torrents_removed': ['b']},
+        )
+        collector.refresh()
+        collector.refresh()
+        text = collector.snapshot.decode()
+        assert 'qbittorrent_torrents{state="downloading"}' not in text
+        assert 'qbittorrent_torrents{state="stalledDL"} 1' in text
+        assert 'qbittorrent_category_download_bytes_per_second{category="tv"} 0' in text
+
+        collector.refresh()
+        text = collector.snapshot.decode()
+        assert 'tracker.two' not in text
+        assert 'qbittorrent_category_torrents{category="tv"} 1' in text
+
+    def test_failed_sync_marks_down(self):
+        """Test a sync that does not advance rid counts as an error."""
+        _, collector = make_collector({})
+        with patch('builtins.print'):
+            collector.refresh()
+        text = collector.snapshot.decode()
+
+        assert 'qbittorrent_up 0' in text
+        assert 'qbittorrent_exporter_sync_errors_total 1' in text
+
+    def test_refresh_sends_rid_cursor(self):
+        """Test refreshes continue from the last rid."""
+        client, collector = make_collector(FULL_UPDATE, {'rid': 2})
+        collector.refresh()
+        collector.refresh()
+
+        assert [c.args[0] for c in client.get_maindata.call_args_list] == [0, 1]
+
+
+class TestMetricsHandler:
+    """Tests for the HTTP handler."""
+
+    def test_serves_cached_snapshot(self):
+        """Test /metrics returns the snapshot without calling qBittorrent."""
+        client, collector = make_collector()
+        collector.snapshot = b'qbittorrent_up 1\n'
+        server = qbittorrent_exporter.ThreadingHTTPServer(
+            ('127.0.0.1', 0), qbittorrent_exporter.make_handler(collector)
+        )
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = f'http://127.0.0.1:{server.server_address[1]}/metrics'
+            with urllib.request.urlopen(url, timeout=5) as response:
+                assert response.read() == b'qbittorrent_up 1\n'
+                assert response.headers['Content-Type'].startswith('text/plain')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        client.get_maindata.assert_not_called()
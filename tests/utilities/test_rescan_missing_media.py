@@ -100,7 +100,8 @@ class TestCheckCommandStatus:
         assert msg == ""
 
     @responses.activate
-    def test_check_status_failure(self):
+    @patch("scripts.utilities.rescan_missing_media.time.sleep")
+    def test_check_status_failure(self, mock_sleep):
         """Test handling API error when checking status."""
         responses.add(
             responses.GET,
@@ -1,8 +1,11 @@
+import json
 import pytest
+import responses
 from unittest.mock import patch, MagicMock
 from scripts.utilities import sync_api_keys
 
-def test_fix_indexers_updates(monkeypatch):
+@responses.activate
+def test_fix_indexers_updates():
     dummy_indexer = {
         'id': 1,
         'name': 'Prowlarr',
@@ -12,29 +15,22 @@ def test_fix_indexers_updates(monkeypatch):
         ],
         'implementation': 'Torznab'
     }
-    called = {}
-    def dummy_get(url, headers):
-        class Resp:
-            def raise_for_status(self): pass
-            def json(self): return [dummy_indexer]
-        called['get'] = True
-        return Resp()
-    def dummy_put(url, headers, json):
-        called['put'] = True
-        class Resp:
-            def raise_for_status(self): pass
-            status_code = 200
-            text = ''
-        return Resp()
-    def dummy_post(url, headers, json):
-        called['post'] = True
-        class Resp:
-            status_code = 200
-            text = ''
-        return Resp()
-    monkeypatch.setattr(sync_api_keys.requests, 'get', dummy_get)
-    monkeypatch.setattr(sync_api_keys.requests, 'put', dummy_put)
-    monkeypatch.setattr(sync_api_keys.requests, 'post', dummy_post)
+    responses.add(responses.GET, 'http://sonarr:8989/api/v3/indexer', json=[dummy_indexer])
+    responses.add(responses.PUT, 'http://sonarr:8989/api/v3/indexer/1', json={})
+    responses.add(responses.POST, 'http://sonarr:8989/api/v3/indexer/test', json={})
     with patch('builtins.print'):
-        sync_api_keys.fix_indexers('Sonarr', 'url', 'API', 'CORRECT')
-    assert called.get('put') and called.get('post')
+        sync_api_keys.fix_indexers('Sonarr', 'http://sonarr:8989', 'API', 'CORRECT')
+    methods = [c.request.method for c in responses.calls]
+    assert methods == ['GET', 'PUT', 'POST']
+    sent = json.loads(responses.calls[1].request.body)
+    assert {f['name']: f['value'] for f in sent['fields']}['apiKey'] == 'CORRECT'
+    assert responses.calls[0].request.headers['X-Api-Key'] == 'API'
+
+def test_fix_indexers_uses_shared_client():
+    client = MagicMock()
+    client.get_json.return_value = []
+    with patch.object(sync_api_keys, 'arr_client', return_value=client) as factory, \
+         patch('builtins.print'):
+        sync_api_keys.fix_indexers('Radarr', 'http://radarr:7878', 'API', 'CORRECT')
+    factory.assert_called_once_with('http://radarr:7878', 'API')
+    client.get_json.assert_called_once_with('indexer')